@@ -0,0 +1,102 @@
+"""Compare citation-to-source matching against the full corpus scan it replaced.
+
+Builds ``--documents`` synthetic markdown documents and answers ``--queries``
+simulated responses, each citing a few URLs and quoting a few phrases. Reports,
+as JSON, the one-off ``SourceIndex`` build time and per-query latency of:
+
+- ``corpus_scan``: every citation searched for in every loaded document, as
+  ``process_query`` used to do
+- ``context_match``: ``match_citations`` over the ``--context`` documents sent
+  as context, with path and URL citations resolved through the index
+
+    python benchmarks/bench_citations.py --documents 10000 --context 5
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import List
+
+from refassist.batch import percentiles
+from refassist.citations import SourceIndex, match_citations
+
+WORDS = (
+    "index query vector chunk embedding duckdb batch option config server client "
+    "token stream cache latency thread process worker schema table column parser"
+).split()
+
+
+def synthetic_documents(count: int, words: int, seed: int) -> List[tuple]:
+    rng = random.Random(seed)
+    return [
+        (
+            f"/srv/docs/section_{i % 50}/page_{i}.md",
+            " ".join(rng.choices(WORDS, k=words)) + f" anchor_{i}.",
+        )
+        for i in range(count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=10_000)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--context", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed + 1)
+    documents = synthetic_documents(args.documents, args.words, args.seed)
+
+    start = time.perf_counter()
+    index = SourceIndex(file for file, _ in documents)
+    build = time.perf_counter() - start
+
+    scan, matched, agree = [], [], 0
+    for _ in range(args.queries):
+        context = rng.sample(documents, args.context)
+        cited = rng.sample(context, 2)
+        citations = [
+            "https://docs.example.com/"
+            + file.removeprefix("/srv/docs/").removesuffix(".md")
+            for file, _ in cited
+        ]
+        citations.append(context[0][1].rsplit(" ", 1)[1])  # a quoted anchor
+        citations.append("https://unrelated.example.org/blog/post")
+
+        start = time.perf_counter()
+        scanned = [
+            file
+            for file, text in documents
+            if any(citation in text for citation in citations)
+        ]
+        scan.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        found = match_citations(
+            citations,
+            [(file, None, text) for file, text in context],
+            index,
+            [file for file, _ in context],
+        )
+        matched.append(time.perf_counter() - start)
+
+        agree += {match.file for match in found} >= set(scanned)
+
+    report = {
+        "config": vars(args),
+        "index": {"build_s": build, "keys": len(index)},
+        "corpus_scan_s": percentiles(scan),
+        "context_match_s": percentiles(matched),
+        "speedup_p50": percentiles(scan)["p50"] / percentiles(matched)["p50"],
+        # Path citations never matched the old text scan, so the new matcher
+        # should find a superset of its sources
+        "superset_of_scan": agree / args.queries,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Compare embedding backends on the CPU: torch, ONNX Runtime and ONNX int8.
+
+Each backend embeds the same synthetic chunks. Reports single-text latency
+percentiles, batched throughput and how closely its vectors agree with the
+torch backend (cosine similarity per text), printed as JSON. Needs the model
+weights and, for the ONNX backends, onnxruntime.
+
+    python benchmarks/bench_embedding_backends.py --texts 512 --threads 4
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from refassist.ml.embedding import EMBEDDING_BACKENDS
+from refassist.ml.vectordb import EMBED_BATCH_SIZE
+from refassist.ml.workers import load_cpu_embedding_model
+
+WORDS = (
+    "index query vector chunk embedding duckdb batch option config server client "
+    "token stream cache latency thread process worker schema table column"
+).split()
+TOLERANCE = 0.99
+
+
+def synthetic_texts(count: int, words: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=words)) for _ in range(count)]
+
+
+def measure(model, texts: List[str], queries: List[str]) -> Dict[str, object]:
+    model.get_text_embedding_batch(texts[:8])  # warm up
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.get_text_embedding(query)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    vectors = np.asarray(model.get_text_embedding_batch(texts), dtype=np.float32)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "latency_ms_p50": float(np.percentile(latencies, 50) * 1000),
+        "latency_ms_p95": float(np.percentile(latencies, 95) * 1000),
+        "texts_per_sec": len(texts) / elapsed,
+        "vectors": vectors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--words", type=int, default=160)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+
+        torch.set_num_threads(args.threads)
+
+    texts = synthetic_texts(args.texts, args.words, args.seed)
+    queries = synthetic_texts(args.queries, 12, args.seed + 1)
+
+    report, reference = [], None
+    for backend in EMBEDDING_BACKENDS:
+        model = load_cpu_embedding_model(args.batch_size, backend, args.threads)
+        row = measure(model, texts, queries)
+        vectors = row.pop("vectors")
+        if reference is None:
+            reference = vectors
+
+        # Both sides are normalized, so the row-wise dot product is the cosine
+        agreement = np.sum(vectors * reference, axis=1)
+        row.update(
+            {
+                "backend": backend,
+                "cosine_to_torch_min": float(agreement.min()),
+                "cosine_to_torch_mean": float(agreement.mean()),
+                "within_tolerance": bool(agreement.min() >= TOLERANCE),
+            }
+        )
+        report.append(row)
+
+    torch_row = report[0]
+    for row in report:
+        row["throughput_speedup"] = row["texts_per_sec"] / torch_row["texts_per_sec"]
+
+    print(
+        json.dumps(
+            {
+                "texts": args.texts,
+                "words_per_text": args.words,
+                "batch_size": args.batch_size,
+                "threads": args.threads,
+                "tolerance": TOLERANCE,
+                "results": report,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
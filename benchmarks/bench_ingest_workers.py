@@ -0,0 +1,140 @@
+"""Measure how chunking and embedding throughput scale with worker processes.
+
+Ingests a synthetic corpus into an in-memory VectorDB once in-process and then
+with 1, 2, 4, ... worker processes, printing chunks/sec for each stage as JSON.
+By default a deterministic, CPU-bound stand-in replaces the embedding model so
+the benchmark runs without downloading weights; pass ``--real-model`` to use
+the HuggingFace model instead.
+
+    python benchmarks/bench_ingest_workers.py --documents 400 --max-workers 8
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import zlib
+from functools import partial
+from typing import List, Optional
+
+from llama_index.core import Document
+
+from refassist.ml.vectordb import EMBEDDING_DIM, VectorDB
+from refassist.ml.workers import IngestPool, load_cpu_embedding_model
+
+WORDS = (
+    "index query vector chunk embedding duckdb batch option config server client "
+    "token stream cache latency thread process worker schema table column"
+).split()
+
+
+class SyntheticEmbedding:
+    """Pure-Python embedding stand-in: costs CPU per token and holds the GIL"""
+
+    def __init__(self, rounds: int = 8) -> None:
+        self.rounds = rounds
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * EMBEDDING_DIM
+        for token in text.split():
+            seed = zlib.crc32(token.encode())
+            for i in range(self.rounds):
+                seed = (seed * 1103515245 + 12345) & 0x7FFFFFFF
+                vector[seed % EMBEDDING_DIM] += 1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def get_text_embedding_batch(self, texts: List[str], **kwargs) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+
+class BenchVectorDB(VectorDB):
+    def __init__(self, model_factory, **kwargs) -> None:
+        super().__init__(None, **kwargs)
+        self.model_factory = model_factory
+
+    def _setup_embedding_model(self):
+        return self.model_factory()
+
+
+def synthetic_corpus(documents: int, words: int, seed: int = 0) -> List[Document]:
+    rng = random.Random(seed)
+    return [
+        Document(
+            text=" ".join(
+                f"{' '.join(rng.choices(WORDS, k=11))}." for _ in range(words // 12)
+            ),
+            metadata={"file_path": f"docs/page_{i}.md"},
+        )
+        for i in range(documents)
+    ]
+
+
+def run(corpus: List[Document], workers: int, model_factory) -> dict:
+    pool: Optional[IngestPool] = None
+    if workers:
+        pool = IngestPool(
+            chunk_workers=workers,
+            embed_workers=workers,
+            torch_threads=1,
+            model_factory=model_factory,
+        )
+        # Start every process up front so spawn and model load aren't timed
+        pool.split([("warm up", {})] * workers)
+        for future in [pool.submit_embedding(["warm up"]) for _ in range(workers)]:
+            future.result()
+
+    db = BenchVectorDB(model_factory, ingest_pool=pool)
+    db.connect(in_memory=True)
+    try:
+        start = time.perf_counter()
+        db.process_documents_memory(corpus)
+        chunked = time.perf_counter()
+        db.create_embeddings_memory()
+        embedded = time.perf_counter()
+        chunks = db.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+    finally:
+        db.close()
+        if pool:
+            pool.close()
+
+    return {
+        "workers": workers,
+        "chunks": chunks,
+        "chunk_per_s": chunks / (chunked - start),
+        "embed_per_s": chunks / (embedded - chunked),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=400)
+    parser.add_argument("--words", type=int, default=3000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--real-model", action="store_true")
+    args = parser.parse_args()
+
+    model_factory = (
+        partial(load_cpu_embedding_model, 64) if args.real_model else SyntheticEmbedding
+    )
+    corpus = synthetic_corpus(args.documents, args.words)
+
+    counts = [0]
+    while counts[-1] < args.max_workers:
+        counts.append(min(max(counts[-1] * 2, 1), args.max_workers))
+
+    results = [run(corpus, workers, model_factory) for workers in counts]
+    baseline = results[0]
+    for result in results:
+        result["chunk_speedup"] = result["chunk_per_s"] / baseline["chunk_per_s"]
+        result["embed_speedup"] = result["embed_per_s"] / baseline["embed_per_s"]
+
+    print(json.dumps({"cpu_count": os.cpu_count(), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
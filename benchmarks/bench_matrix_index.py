@@ -0,0 +1,143 @@
+"""Compare the memory-mapped matrix search backend against DuckDB.
+
+Stores synthetic clustered vectors (see ``bench_quantization.py``) in a
+database file, then reports as JSON, for DuckDB and for the ``matrix`` backend
+in each precision:
+
+- ``export_s``: first connect, which writes the matrix snapshot
+- ``connect_s``: a later connect, which only maps the existing snapshot
+- ``latency_ms``: ``rag_query`` per question, one at a time
+- ``batch_latency_ms``: ``rag_query_batch`` per question, ``--batch`` at once
+- ``recall@k`` against ``rag_query(exact=True)`` and the snapshot size
+
+    python benchmarks/bench_matrix_index.py --vectors 100000 --batch 32
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from bench_quantization import (
+    BenchVectorDB,
+    normalize,
+    populate,
+    synthetic_vectors,
+)
+from refassist.ml.matrix_index import MATRIX_DTYPES
+from refassist.ml.vectordb import EMBEDDING_DIM
+
+
+def measure(
+    db: BenchVectorDB,
+    queries: List[str],
+    query_vectors: np.ndarray,
+    top_k: int,
+    batch: int,
+    truth: List[set],
+) -> dict:
+    start = time.perf_counter()
+    results = [
+        {m["chunk_id"] for m in db.rag_query(query, top_k=top_k)} for query in queries
+    ]
+    latency = (time.perf_counter() - start) / len(queries)
+
+    start = time.perf_counter()
+    for offset in range(0, len(queries), batch):
+        db.rag_query_batch(
+            queries[offset : offset + batch],
+            top_k=top_k,
+            query_embeddings=query_vectors[offset : offset + batch].tolist(),
+        )
+    batch_latency = (time.perf_counter() - start) / len(queries)
+
+    return {
+        "latency_ms": latency * 1000,
+        "batch_latency_ms": batch_latency * 1000,
+        f"recall@{top_k}": float(
+            np.mean([len(r & t) / top_k for r, t in zip(results, truth)])
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = synthetic_vectors(args.vectors, args.topics, rng)
+    picks = rng.integers(0, len(vectors), args.queries)
+    noise = normalize(rng.standard_normal((args.queries, EMBEDDING_DIM)))
+    query_vectors = normalize(vectors[picks] + 0.3 * noise).astype(np.float32)
+    queries = [f"query {i}" for i in range(args.queries)]
+    BenchVectorDB.model.vectors = dict(zip(queries, query_vectors.tolist()))
+
+    report = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "bench.db")
+        db = BenchVectorDB(db_path)
+        db.connect()
+        try:
+            populate(db, vectors)
+            truth = [
+                {m["chunk_id"] for m in db.rag_query(q, top_k=args.top_k, exact=True)}
+                for q in queries
+            ]
+            report.append(
+                {
+                    "backend": "duckdb",
+                    **measure(db, queries, query_vectors, args.top_k, args.batch, truth),
+                }
+            )
+        finally:
+            db.close()
+
+        for dtype in MATRIX_DTYPES:
+            db = BenchVectorDB(db_path, search_backend="matrix", matrix_dtype=dtype)
+            start = time.perf_counter()
+            db.connect()
+            export = time.perf_counter() - start
+            db.close()
+
+            start = time.perf_counter()
+            db.connect()
+            connect = time.perf_counter() - start
+            try:
+                row = measure(db, queries, query_vectors, args.top_k, args.batch, truth)
+            finally:
+                db.close()
+
+            size = sum(
+                path.stat().st_size
+                for path in Path(f"{db_path}.vectors").glob(f"*-{dtype}.npy")
+            )
+            report.append(
+                {
+                    "backend": f"matrix ({dtype})",
+                    "export_s": export,
+                    "connect_s": connect,
+                    "snapshot_mb": size / 2**20,
+                    **row,
+                }
+            )
+
+    print(
+        json.dumps(
+            {"vectors": len(vectors), "config": vars(args), "results": report},
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Compare MMR-diversified retrieval with plain top-k on a redundant corpus.
+
+Ingests the synthetic corpus from ``bench_pipeline.py`` plus ``--copies``
+versioned copies of every page (``v1/``, ``v2/``...) with a word changed per
+section, the way versioned documentation repeats itself. For every query,
+retrieves ``--top-k`` chunks plainly and with MMR, and reports, as JSON:
+
+- ``latency_s``: ``rag_query`` time per query for both
+- ``context_tokens``: tokens packed into the prompt for both
+- ``distinct_pages``: pages the matches come from, counting the versioned
+  copies of a page once
+- ``target_recall``: how often the chunk a query was written for (the one
+  carrying its ``flag_*`` token) makes it into the context
+
+    python benchmarks/bench_mmr.py --chunks 2000 --copies 2 --mmr-lambda 0.5
+"""
+
+import argparse
+import json
+import platform
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from llama_index.core import Document
+
+from bench_pipeline import (
+    BenchVectorDB,
+    git_commit,
+    synthetic_corpus,
+    synthetic_queries,
+)
+from refassist.batch import percentiles
+from refassist.context import ContextBuilder
+from refassist.ml.diversity import COLLAPSE_MODES, MMR_CANDIDATES, MMR_LAMBDA
+
+
+def mean(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def versioned_copies(documents: List[Document], copies: int, seed: int) -> List[Document]:
+    """Copies of every page under ``v<n>/`` with one word changed per section"""
+    rng = random.Random(seed + 2)
+    versions = []
+    for version in range(1, copies + 1):
+        for doc in documents:
+            sections = doc.text.split("\n\n")
+            for i, section in enumerate(sections):
+                words = section.split(" ")
+                words[rng.randrange(len(words))] = f"v{version}"
+                sections[i] = " ".join(words)
+            versions.append(
+                Document(
+                    text="\n\n".join(sections),
+                    metadata={"file_path": f"v{version}/{doc.metadata['file_path']}"},
+                )
+            )
+    return versions
+
+
+def page(file: str) -> str:
+    return file.split("/", 1)[1] if file.startswith("v") else file
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--copies", type=int, default=2)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=MMR_CANDIDATES)
+    parser.add_argument("--mmr-lambda", type=float, default=MMR_LAMBDA)
+    parser.add_argument("--collapse", choices=COLLAPSE_MODES, default="none")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.chunks, BenchVectorDB.chunk_size, args.seed)
+    queries = synthetic_queries(args.queries, len(corpus), args.seed)
+    corpus += versioned_copies(corpus, args.copies, args.seed)
+    builder = ContextBuilder()
+
+    results = {
+        name: {"latency": [], "tokens": [], "pages": [], "hits": 0}
+        for name in ("top_k", "mmr")
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = BenchVectorDB(str(Path(tmp) / "bench.db"))
+        db.connect()
+        try:
+            db.process_documents(corpus)
+            db.create_embeddings()
+
+            for query in queries:
+                target = query.split()[-1]
+                for name, options in (
+                    ("top_k", {}),
+                    (
+                        "mmr",
+                        {
+                            "mmr_lambda": args.mmr_lambda,
+                            "mmr_candidates": args.candidates,
+                            "collapse": args.collapse,
+                        },
+                    ),
+                ):
+                    start = time.perf_counter()
+                    matches = db.rag_query(query, top_k=args.top_k, **options)
+                    result = results[name]
+                    result["latency"].append(time.perf_counter() - start)
+
+                    packed = builder.from_matches(matches)
+                    result["tokens"].append(packed.tokens_used)
+                    result["pages"].append(len({page(m["file"]) for m in matches}))
+                    result["hits"] += target in packed.text
+        finally:
+            db.close()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        **{
+            metric: {name: summarise(result) for name, result in results.items()}
+            for metric, summarise in (
+                ("latency_s", lambda r: percentiles(r["latency"])),
+                ("context_tokens", lambda r: mean(r["tokens"])),
+                ("distinct_pages", lambda r: mean(r["pages"])),
+                ("target_recall", lambda r: r["hits"] / len(queries)),
+            )
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
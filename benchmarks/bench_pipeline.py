@@ -0,0 +1,301 @@
+"""Benchmark the RAG pipeline end to end on a synthetic markdown corpus.
+
+Generates a reproducible corpus sized to roughly ``--chunks`` chunks, ingests it
+into a fresh DuckDB file and reports, as JSON:
+
+- ``process_documents``: documents and chunks per second
+- ``create_embeddings``: chunks per second
+- ``rag_query``: latency percentiles and queries per second
+- ``process_query``: end-to-end QueryHandler latency percentiles against a
+  local stand-in for the Perplexity API, with per-stage timings
+
+Everything runs offline. Embeddings come from a deterministic hashing model
+that is cheap enough for the pipeline around it to dominate, and the HNSW
+extension is used only if DuckDB can load it without a download, falling back
+to the exact scan otherwise. Pass ``--output`` to also write the report to a
+file, so runs can be diffed across commits.
+
+    python benchmarks/bench_pipeline.py --chunks 10000 --queries 200
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from llama_index.core import Document
+
+from refassist.batch import percentiles
+from refassist.client import PerplexityClient
+from refassist.ml.vectordb import EMBEDDING_DIM, VectorDB
+from refassist.query import QueryHandler
+from refassist.log import logger
+
+WORDS = (
+    "index query vector chunk embedding duckdb batch option config server client "
+    "token stream cache latency thread process worker schema table column parser "
+    "request response retry timeout manifest splitter overlap budget context"
+).split()
+CHUNKS_PER_DOCUMENT = 4
+
+
+class HashingEmbedding:
+    """Deterministic bag-of-words embedding: crc32 token buckets, normalized"""
+
+    def _embed(self, text: str) -> np.ndarray:
+        buckets = [zlib.crc32(token.encode()) % EMBEDDING_DIM for token in text.split()]
+        vector = np.bincount(buckets, minlength=EMBEDDING_DIM).astype(np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
+
+    def get_text_embedding_batch(self, texts: List[str], **kwargs) -> List[List[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+
+class BenchVectorDB(VectorDB):
+    model = HashingEmbedding()
+    chunk_size = 256
+
+    def _setup_embedding_model(self):
+        return self.model
+
+    def _setup_node_parser(self):
+        from llama_index.core.node_parser import SentenceSplitter
+
+        return SentenceSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_size // 5,
+            separator=" ",
+            paragraph_separator="\n\n",
+        )
+
+    def _load_extension(self) -> None:
+        # Only use vss if it is already installed; never download it
+        try:
+            self.conn.load_extension("vss")
+            self.conn.execute("SET GLOBAL hnsw_enable_experimental_persistence = true;")
+            self.hnsw = True
+        except Exception:
+            logger.warning("vss extension unavailable, benchmarking the exact scan")
+            self.hnsw = False
+
+    def _create_vector_index(self) -> None:
+        if self.hnsw:
+            super()._create_vector_index()
+
+    def compact_vector_index(self) -> None:
+        if self.hnsw:
+            super().compact_vector_index()
+
+
+class StubPerplexity(ThreadingHTTPServer):
+    """Minimal OpenAI-compatible chat completions endpoint with fixed latency"""
+
+    daemon_threads = True
+
+    def __init__(self, delay: float) -> None:
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.delay = delay
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StubPerplexity
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.server.delay)
+        prompt = len(body["messages"][-1]["content"]) // 4
+        payload = json.dumps(
+            {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": "Stub answer."},
+                    }
+                ],
+                "citations": [],
+                "usage": {
+                    "prompt_tokens": prompt,
+                    "completion_tokens": 3,
+                    "total_tokens": prompt + 3,
+                },
+            }
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def synthetic_corpus(chunks: int, chunk_size: int, seed: int) -> List[Document]:
+    """Markdown pages of a few sections each, about ``chunks`` chunks in total"""
+    rng = random.Random(seed)
+    sentences_per_section = max(1, chunk_size // 12)
+    documents = []
+    for i in range(max(1, -(-chunks // CHUNKS_PER_DOCUMENT))):
+        sections = [f"# Page {i}"]
+        for j in range(CHUNKS_PER_DOCUMENT):
+            sentences = " ".join(
+                f"{' '.join(rng.choices(WORDS, k=9))} flag_{i}_{j}."
+                for _ in range(sentences_per_section)
+            )
+            sections.append(f"## Section {j}\n\n{sentences}")
+        documents.append(
+            Document(
+                text="\n\n".join(sections), metadata={"file_path": f"docs/page_{i}.md"}
+            )
+        )
+    return documents
+
+
+def synthetic_queries(count: int, pages: int, seed: int) -> List[str]:
+    rng = random.Random(seed + 1)
+    return [
+        f"{' '.join(rng.choices(WORDS, k=4))} "
+        f"flag_{rng.randrange(pages)}_{rng.randrange(CHUNKS_PER_DOCUMENT)}"
+        for _ in range(count)
+    ]
+
+
+def timed(function, items) -> List[float]:
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        function(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def end_to_end(db: VectorDB, queries: List[str], delay: float, top_k: int) -> dict:
+    server = StubPerplexity(delay)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        async with PerplexityClient("benchmark", base_url=server.base_url) as client:
+            handler = QueryHandler(client=client, documents=[], store_docs=True)
+            handler.rag_service.vector_db = db
+            # Hashed bag-of-words vectors rarely clear the production 0.7
+            # threshold, so retrieve a fixed top-k to keep the prompt realistic
+            handler.rag_service.query = lambda text: db.rag_query(text, top_k=top_k)
+
+            await handler.process_query(queries[0])  # warm up the connection
+            totals, stages = [], {}
+            for query in queries:
+                start = time.perf_counter()
+                result = await handler.process_query(query)
+                totals.append(time.perf_counter() - start)
+                for stage, seconds in result.timings.items():
+                    stages.setdefault(stage, []).append(seconds)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {
+        "queries": len(queries),
+        "llm_delay_s": delay,
+        "latency_s": percentiles(totals),
+        "stages_s": {stage: percentiles(values) for stage, values in stages.items()},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=BenchVectorDB.chunk_size)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--llm-delay", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the JSON report here")
+    args = parser.parse_args()
+
+    BenchVectorDB.chunk_size = args.chunk_size
+    corpus = synthetic_corpus(args.chunks, args.chunk_size, args.seed)
+    queries = synthetic_queries(args.queries, len(corpus), args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = BenchVectorDB(str(Path(tmp) / "bench.db"))
+        db.connect()
+        try:
+            start = time.perf_counter()
+            db.process_documents(corpus)
+            processed = time.perf_counter()
+            db.create_embeddings()
+            embedded = time.perf_counter()
+            chunks = db.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+            db.rag_query(queries[0], top_k=args.top_k)  # warm up
+            query_latencies = timed(lambda q: db.rag_query(q, top_k=args.top_k), queries)
+            e2e = asyncio.run(end_to_end(db, queries, args.llm_delay, args.top_k))
+        finally:
+            db.close()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "corpus": {"documents": len(corpus), "chunks": chunks},
+        "hnsw": db.hnsw,
+        "process_documents": {
+            "seconds": processed - start,
+            "documents_per_s": len(corpus) / (processed - start),
+            "chunks_per_s": chunks / (processed - start),
+        },
+        "create_embeddings": {
+            "seconds": embedded - processed,
+            "chunks_per_s": chunks / (embedded - processed),
+        },
+        "rag_query": {
+            "latency_s": percentiles(query_latencies),
+            "queries_per_s": len(queries) / sum(query_latencies),
+        },
+        "process_query": e2e,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
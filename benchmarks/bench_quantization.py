@@ -0,0 +1,188 @@
+"""Compare quantized vector search against the exact scan.
+
+For each quantization mode, reports payload size, mean query latency and
+recall@k against ``rag_query(exact=True)``, printed as JSON. By default the
+corpus is synthetic: normalized vectors drawn around a set of topic centroids,
+which clusters them the way real embeddings cluster. Pass ``--db-path`` to
+measure an existing index instead; its embeddings are copied read-only into
+memory and queried with perturbed copies of stored vectors.
+
+    python benchmarks/bench_quantization.py --vectors 50000 --top-k 10
+"""
+
+import argparse
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from refassist.ml.quantization import QUANTIZATION_MODES, RESCORE_FACTOR
+from refassist.ml.vectordb import EMBEDDING_DIM, VectorDB
+
+
+class LookupEmbedding:
+    """Returns prepared query vectors, keyed by the query text"""
+
+    def __init__(self) -> None:
+        self.vectors: Dict[str, List[float]] = {}
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self.vectors[text]
+
+
+class BenchVectorDB(VectorDB):
+    model = LookupEmbedding()
+
+    def _setup_embedding_model(self):
+        return self.model
+
+    # The HNSW extension is irrelevant here and may not be installable offline
+    def _load_extension(self) -> None:
+        pass
+
+    def _create_vector_index(self) -> None:
+        pass
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_vectors(count: int, topics: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = normalize(rng.standard_normal((topics, EMBEDDING_DIM)))
+    assignment = rng.integers(0, topics, count)
+    noise = normalize(rng.standard_normal((count, EMBEDDING_DIM)))
+    return normalize(centroids[assignment] + 0.6 * noise).astype(np.float32)
+
+
+def load_vectors(db_path: str) -> np.ndarray:
+    import duckdb
+
+    conn = duckdb.connect()
+    conn.execute(f"ATTACH '{db_path}' AS source (READ_ONLY)")
+    table = conn.execute("SELECT embedding FROM source.embeddings").fetch_arrow_table()
+    conn.close()
+    return np.asarray(
+        table.column("embedding").combine_chunks().flatten(), dtype=np.float32
+    ).reshape(-1, EMBEDDING_DIM)
+
+
+def build(vectors: np.ndarray, mode: str, rescore_factor: int) -> BenchVectorDB:
+    db = BenchVectorDB(None, quantization=mode, rescore_factor=rescore_factor)
+    db.connect(in_memory=True)
+    populate(db, vectors)
+    return db
+
+
+def populate(db: BenchVectorDB, vectors: np.ndarray) -> None:
+    """Store one document and chunk per vector"""
+    ids = pa.array(np.arange(1, len(vectors) + 1, dtype=np.int32))
+    db._insert_arrow(
+        "documents", pa.table({"id": ids, "file": [f"doc_{i}" for i in range(len(ids))]})
+    )
+    db._insert_arrow(
+        "chunks",
+        pa.table(
+            {
+                "id": ids,
+                "doc_id": ids,
+                "chunk_text": [""] * len(ids),
+                "chunk_index": pa.array(np.zeros(len(ids), dtype=np.int32)),
+            }
+        ),
+    )
+    embeddings = pa.table(
+        {
+            "chunk_id": ids,
+            "embedding": pa.FixedSizeListArray.from_arrays(
+                pa.array(vectors.ravel()), EMBEDDING_DIM
+            ),
+        }
+    )
+    db._insert_arrow("embeddings", embeddings)
+    db._bump_embedding_version()
+    if db.quantized_index:
+        db.quantized_index.add(embeddings)
+
+
+def measure(
+    db: BenchVectorDB, queries: List[str], top_k: int, truth: Optional[List[set]]
+) -> Tuple[dict, List[set]]:
+    exact = db.quantized_index is None
+    start = time.perf_counter()
+    results = [
+        {m["chunk_id"] for m in db.rag_query(q, top_k=top_k, exact=exact)}
+        for q in queries
+    ]
+    latency = (time.perf_counter() - start) / len(queries)
+
+    if db.quantized_index:
+        payload = db.quantized_index.footprint()["code_bytes"]
+    else:
+        count = db.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        payload = count * EMBEDDING_DIM * 4
+
+    recall = 1.0
+    if truth is not None:
+        recall = float(np.mean([len(r & t) / top_k for r, t in zip(results, truth)]))
+
+    return {
+        "mode": db.quantization if not exact else "exact",
+        "payload_mb": payload / 2**20,
+        "latency_ms": latency * 1000,
+        f"recall@{top_k}": recall,
+    }, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=RESCORE_FACTOR)
+    parser.add_argument("--db-path", help="Measure this index, not synthetic data")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.db_path:
+        vectors = load_vectors(args.db_path)
+    else:
+        vectors = synthetic_vectors(args.vectors, args.topics, rng)
+
+    # Queries are stored vectors nudged off their original position
+    picks = rng.integers(0, len(vectors), args.queries)
+    noise = normalize(rng.standard_normal((args.queries, EMBEDDING_DIM)))
+    query_vectors = normalize(vectors[picks] + 0.3 * noise)
+    queries = [f"query {i}" for i in range(args.queries)]
+    BenchVectorDB.model.vectors = dict(zip(queries, query_vectors.tolist()))
+
+    report, truth = [], None
+    for mode in QUANTIZATION_MODES:
+        db = build(vectors, mode, args.rescore_factor)
+        try:
+            row, results = measure(db, queries, args.top_k, truth)
+        finally:
+            db.close()
+        if truth is None:
+            truth = results
+        report.append(row)
+
+    print(
+        json.dumps(
+            {
+                "vectors": len(vectors),
+                "queries": args.queries,
+                "rescore_factor": args.rescore_factor,
+                "results": report,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Measure what cross-encoder reranking costs in latency and saves in prompt size.
+
+Ingests the synthetic corpus from ``bench_pipeline.py`` and, for every query,
+compares plain top-k retrieval with a larger candidate pool reranked down to
+``--keep`` chunks. Reports, as JSON:
+
+- ``added_latency_s``: reranking time per query, cold and with warm scores
+- ``context_tokens``: tokens packed into the prompt with and without reranking
+- ``target_recall``: how often the chunk a query was written for (the one
+  carrying its ``flag_*`` token) makes it into the context
+
+Run with ``--budget`` set low to see how the latency cap degrades ranking.
+The cross-encoder is downloaded on first use.
+
+    python benchmarks/bench_rerank.py --chunks 2000 --candidates 20 --keep 3
+"""
+
+import argparse
+import json
+import platform
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from bench_pipeline import (
+    BenchVectorDB,
+    git_commit,
+    synthetic_corpus,
+    synthetic_queries,
+)
+from refassist.batch import percentiles
+from refassist.context import ContextBuilder
+from refassist.ml.rerank import (
+    RERANK_BATCH_SIZE,
+    RERANK_CANDIDATES,
+    RERANK_MODEL,
+    RERANK_TOP_K,
+    Reranker,
+)
+
+
+def mean(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5, help="Plain retrieval depth")
+    parser.add_argument("--candidates", type=int, default=RERANK_CANDIDATES)
+    parser.add_argument("--keep", type=int, default=RERANK_TOP_K)
+    parser.add_argument("--batch-size", type=int, default=RERANK_BATCH_SIZE)
+    parser.add_argument("--budget", type=float, default=float("inf"))
+    parser.add_argument("--model", default=RERANK_MODEL)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.chunks, BenchVectorDB.chunk_size, args.seed)
+    queries = synthetic_queries(args.queries, len(corpus), args.seed)
+    reranker = Reranker(
+        args.model,
+        top_k=args.keep,
+        candidates=args.candidates,
+        batch_size=args.batch_size,
+        budget=args.budget,
+    )
+    reranker.model  # load before timing
+    builder = ContextBuilder()
+
+    baseline_tokens, reranked_tokens = [], []
+    baseline_hits, reranked_hits = 0, 0
+    cold, warm = [], []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = BenchVectorDB(str(Path(tmp) / "bench.db"))
+        db.connect()
+        try:
+            db.process_documents(corpus)
+            db.create_embeddings()
+
+            for query in queries:
+                target = query.split()[-1]
+                baseline = builder.from_matches(db.rag_query(query, top_k=args.top_k))
+                baseline_tokens.append(baseline.tokens_used)
+                baseline_hits += target in baseline.text
+
+                candidates = db.rag_query(query, top_k=args.candidates)
+                start = time.perf_counter()
+                kept = reranker.rerank(query, candidates)
+                cold.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                reranker.rerank(query, candidates)
+                warm.append(time.perf_counter() - start)
+
+                reranked = builder.from_matches(kept)
+                reranked_tokens.append(reranked.tokens_used)
+                reranked_hits += target in reranked.text
+        finally:
+            db.close()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {**vars(args), "budget": str(args.budget)},
+        "added_latency_s": {"cold": percentiles(cold), "cached": percentiles(warm)},
+        "context_tokens": {
+            "top_k": mean(baseline_tokens),
+            "reranked": mean(reranked_tokens),
+            "saved_pct": 100 * (1 - sum(reranked_tokens) / max(sum(baseline_tokens), 1)),
+        },
+        "target_recall": {
+            "top_k": baseline_hits / len(queries),
+            "reranked": reranked_hits / len(queries),
+        },
+        "reranker": reranker.stats(),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
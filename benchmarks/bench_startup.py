@@ -0,0 +1,68 @@
+"""Measure CLI startup: importing ``refassist.main`` and building a basic-mode
+QueryHandler, each in a fresh interpreter so nothing is already imported.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+HEAVY_MODULES = ("torch", "transformers", "llama_index", "sympy")
+
+PROBE = f"""
+import json, resource, sys, time
+start = time.perf_counter()
+import refassist.main
+imported = time.perf_counter()
+from refassist.client import PerplexityClient
+from refassist.query import QueryHandler
+QueryHandler(PerplexityClient(api_key="benchmark"), documents=[])
+ready = time.perf_counter()
+print(json.dumps({{
+    "import_s": imported - start,
+    "ready_s": ready - start,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": str(SRC)},
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    print(
+        json.dumps(
+            {
+                "runs": args.runs,
+                "import_s_median": statistics.median(r["import_s"] for r in runs),
+                "ready_s_median": statistics.median(r["ready_s"] for r in runs),
+                "max_rss_mb_median": statistics.median(r["max_rss_mb"] for r in runs),
+                "heavy_modules": sorted({m for r in runs for m in r["heavy_modules"]}),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+from typing import Dict, List, Optional, Union
+from dataclasses import asdict
+from pathlib import Path
+import asyncio
+import csv
+import json
+import math
+import time
+
+from refassist.client import MAX_CONCURRENCY
+from refassist.query import QueryHandler
+from refassist.log import logger
+
+QUESTION_FIELDS = ("question", "query")
+PERCENTILES = (50, 90, 99)
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+
+def read_questions(path: Union[str, Path]) -> List[Dict[str, str]]:
+    """Load questions from a JSONL or CSV file as {"id", "question"} records.
+
+    JSONL lines may be plain strings or objects; CSV files need a header row.
+    Either way the question is read from a ``question`` or ``query`` field and
+    an ``id`` field is kept when present, defaulting to the question's position.
+    """
+    path = Path(path)
+
+    if path.suffix == ".csv":
+        with path.open(newline="", encoding="utf-8") as f:
+            rows: List[Union[str, dict]] = list(csv.DictReader(f))
+    else:
+        with path.open(encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    questions = []
+    for i, row in enumerate(rows):
+        if isinstance(row, str):
+            row = {"question": row}
+        question = next((row[key] for key in QUESTION_FIELDS if row.get(key)), None)
+        if not question:
+            raise ValueError(f"{path}: entry {i + 1} has no question")
+        questions.append({"id": str(row.get("id") or i), "question": question})
+
+    if not questions:
+        raise ValueError(f"No questions found in {path}")
+    return questions
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Nearest-rank percentiles and the mean of a list of durations"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    summary = {
+        f"p{p}": ordered[max(math.ceil(p * len(ordered) / 100), 1) - 1]
+        for p in PERCENTILES
+    }
+    summary["mean"] = sum(ordered) / len(ordered)
+    return summary
+
+
+async def run_batch(
+    query_handler: QueryHandler,
+    questions: List[Dict[str, str]],
+    output_path: Union[str, Path],
+    concurrency: int = MAX_CONCURRENCY,
+    code_examples: bool = False,
+) -> dict:
+    """Answer every question and write one JSON line per result.
+
+    Contexts for all questions are retrieved up front with a single batched
+    query embedding pass; the LLM calls then run with at most ``concurrency``
+    in flight. Results are written as they complete, each carrying the
+    question's ``id``. Returns a summary with throughput, per-stage latency
+    percentiles and token usage.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    start = time.perf_counter()
+    texts = [entry["question"] for entry in questions]
+    all_matches = query_handler.retrieve_batch(texts)
+    retrieval_time = time.perf_counter() - start
+    logger.info(f"Retrieved contexts for {len(texts)} questions in {retrieval_time:.2f}s")
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(entry: Dict[str, str], matches: Optional[List[dict]]) -> dict:
+        async with semaphore:
+            try:
+                result = await query_handler.process_query(
+                    entry["question"], code_examples=code_examples, matches=matches
+                )
+                return {**entry, **asdict(result)}
+            except Exception as e:
+                return {**entry, "error": str(e)}
+
+    stages: Dict[str, List[float]] = {}
+    usage = dict.fromkeys(USAGE_FIELDS, 0)
+    failed = cache_hits = 0
+
+    with Path(output_path).open("w", encoding="utf-8") as output:
+        tasks = [answer(entry, matches) for entry, matches in zip(questions, all_matches)]
+        for task in asyncio.as_completed(tasks):
+            record = await task
+            output.write(json.dumps(record) + "\n")
+
+            if "error" in record:
+                failed += 1
+                continue
+            if record["cache_hit"]:
+                cache_hits += 1
+            for stage, seconds in record["timings"].items():
+                stages.setdefault(stage, []).append(seconds)
+            for field in USAGE_FIELDS:
+                usage[field] += record["usage"].get(field, 0)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "questions": len(questions),
+        "failed": failed,
+        "cache_hits": cache_hits,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "questions_per_sec": len(questions) / max(elapsed, 1e-9),
+        "batch_retrieval_s": retrieval_time,
+        "latency_s": {stage: percentiles(values) for stage, values in stages.items()},
+        "usage": usage,
+    }
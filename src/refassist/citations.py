@@ -0,0 +1,86 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urlsplit
+import posixpath
+
+from refassist.models import SourceMatch
+
+# (file, chunk id, text) of a piece of context; the id is None in basic mode
+Section = Tuple[str, Optional[int], str]
+
+
+def reference_parts(reference: str) -> List[str]:
+    """Lower-cased path components of a file path or URL"""
+    if "://" in reference:
+        reference = urlsplit(reference).path
+    return [
+        part
+        for part in reference.replace("\\", "/").lower().split("/")
+        if part not in ("", ".")
+    ]
+
+
+class SourceIndex:
+    """Resolves citations that name a document by its path or URL.
+
+    Every path is indexed under each of its trailing component suffixes, with
+    and without the file extension, so ``https://host/docs/guide/install`` and
+    ``guide/install.md`` both resolve to ``/repo/docs/guide/install.md`` with
+    one dict lookup. A citation must match a whole suffix, so a bare
+    ``index.html`` on some other site does not resolve to every local index.
+    """
+
+    def __init__(self, files: Iterable[str] = ()) -> None:
+        self._files: Dict[str, List[str]] = {}
+        for file in files:
+            self.add(file)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def add(self, file: str) -> None:
+        parts = reference_parts(file)
+        for i in range(len(parts)):
+            suffix = "/".join(parts[i:])
+            for key in (suffix, posixpath.splitext(suffix)[0]):
+                files = self._files.setdefault(key, [])
+                if file not in files:
+                    files.append(file)
+
+    def lookup(self, citation: str) -> List[str]:
+        """Files whose path ends with the path the citation names"""
+        key = "/".join(reference_parts(citation))
+        if not key:
+            return []
+        return self._files.get(key) or self._files.get(posixpath.splitext(key)[0], [])
+
+
+def match_citations(
+    citations: Sequence[str],
+    sections: Iterable[Section],
+    index: SourceIndex,
+    context_files: Iterable[str],
+) -> List[SourceMatch]:
+    """Trace each citation to the context documents it names or quotes.
+
+    Only documents that were sent as context are considered: path matches are
+    filtered to ``context_files`` and text matches are searched for in the
+    ``sections`` of context alone, never the whole corpus.
+    """
+    citations = [citation for citation in dict.fromkeys(citations) if citation]
+    if not citations:
+        return []
+
+    allowed: Set[str] = set(context_files)
+    sections = list(sections)
+    found: List[SourceMatch] = []
+    for citation in citations:
+        found.extend(
+            SourceMatch(citation, file)
+            for file in index.lookup(citation)
+            if file in allowed
+        )
+        for file, chunk_id, text in sections:
+            offset = text.find(citation)
+            if offset >= 0:
+                found.append(SourceMatch(citation, file, chunk_id, offset))
+    return found
@@ -1,34 +1,143 @@
-from openai import OpenAI
+from typing import Optional, List, Dict, Callable, Awaitable, TypeVar
+import asyncio
+import random
+
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError
 from openai.types.chat import ChatCompletion
 
 from refassist.models.PerplexityResponse import PerplexityResponse
 from refassist.log import logger
 
+BASE_URL = "https://api.perplexity.ai"
+MAX_CONCURRENCY = 8
+REQUEST_TIMEOUT = 60.0
+CONNECT_TIMEOUT = 5.0
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+# Upper bound on any wait between retries, including a server's Retry-After
+MAX_RETRY_DELAY = 30.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+TEMPERATURE = 0.2
+
+T = TypeVar("T")
+
 
 class PerplexityClient:
-    def __init__(self, api_key: str) -> None:
-        self.client = OpenAI(api_key=api_key, base_url="https://api.perplexity.ai")
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = BASE_URL,
+        max_concurrency: int = MAX_CONCURRENCY,
+        timeout: float = REQUEST_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        retry_backoff: float = RETRY_BACKOFF,
+        max_retry_delay: float = MAX_RETRY_DELAY,
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        # One pooled, keep-alive HTTP client shared by every request. The
+        # semaphore bounds in-flight requests to the size of the pool.
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+            timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+        )
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.http_client,
+            max_retries=0,
+        )
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_delay = max_retry_delay
+        self._semaphore = asyncio.Semaphore(max_concurrency)
 
         self.model = "sonar-pro"
 
+    async def __aenter__(self) -> "PerplexityClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP connections"""
+        await self.client.close()
+
+    @staticmethod
+    def _build_messages(query: str, context: str) -> List[Dict[str, str]]:
+        return [
+            {
+                "role": "system",
+                "content": (
+                    "You are a technical documentation assistant. "
+                    "Provide clear, accurate responses based on the "
+                    "provided documentation context. Include relevant "
+                    "code examples when appropriate."
+                ),
+            },
+            {"role": "user", "content": f"Context: {context}\n\nQuestion: {query}"},
+        ]
+
+    def _retry_delay(self, attempt: int, error: Exception) -> Optional[float]:
+        """Seconds to wait before retrying, or None if the error is final"""
+        if attempt >= self.max_retries:
+            return None
+
+        if isinstance(error, APIStatusError):
+            if error.status_code not in RETRYABLE_STATUS_CODES:
+                return None
+            retry_after = error.response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.max_retry_delay)
+                except ValueError:
+                    pass
+        elif not isinstance(error, APIConnectionError):
+            return None
+
+        return min(
+            self.retry_backoff * (2**attempt) * (1 + random.random()),
+            self.max_retry_delay,
+        )
+
+    async def _with_retries(
+        self,
+        request: Callable[[], Awaitable[T]],
+        can_retry: Callable[[], bool] = lambda: True,
+    ) -> T:
+        """Run a request under the concurrency limit, retrying transient failures"""
+        attempt = 0
+
+        async with self._semaphore:
+            while True:
+                try:
+                    return await request()
+
+                except Exception as e:
+                    delay = self._retry_delay(attempt, e) if can_retry() else None
+                    if delay is None:
+                        raise
+
+                    attempt += 1
+                    logger.warning(
+                        f"Perplexity query failed ({e}), retrying in {delay:.2f}s "
+                        f"(attempt {attempt}/{self.max_retries})"
+                    )
+                    await asyncio.sleep(delay)
+
     async def query_document(
-        self, query: str, context: str, temperature: float = 0.2
+        self, query: str, context: str, temperature: float = TEMPERATURE
     ) -> PerplexityResponse:
-        try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a technical documentation assistant. "
-                        "Provide clear, accurate responses based on the "
-                        "provided documentation context. Include relevant "
-                        "code examples when appropriate."
-                    ),
-                },
-                {"role": "user", "content": f"Context: {context}\n\nQuestion: {query}"},
-            ]
-
-            response: ChatCompletion = self.client.chat.completions.create(
+        messages = self._build_messages(query, context)
+
+        async def request() -> PerplexityResponse:
+            response: ChatCompletion = await self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=temperature,
@@ -37,12 +146,61 @@ class PerplexityClient:
 
             return PerplexityResponse(
                 content=response.choices[0].message.content,
-                citations=response.model_extra.citations
-                if hasattr(response.model_extra, "citations")
-                else [],
-                usage=response.usage.model_dump(),
+                citations=(response.model_extra or {}).get("citations", []),
+                usage=response.usage.model_dump() if response.usage else {},
             )
 
+        try:
+            return await self._with_retries(request)
         except Exception as e:
             logger.error(f"Perplexity query failed: {str(e)}")
             raise
+
+    async def stream_document(
+        self,
+        query: str,
+        context: str,
+        on_token: Callable[[str], None],
+        temperature: float = TEMPERATURE,
+    ) -> PerplexityResponse:
+        """Stream the answer, calling ``on_token`` with each piece of text as it
+        arrives, and return the assembled response once the stream ends.
+
+        Transient failures are only retried before the first token is emitted.
+        """
+        messages = self._build_messages(query, context)
+        started = False
+
+        async def request() -> PerplexityResponse:
+            nonlocal started
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                top_p=0.9,
+                stream=True,
+            )
+
+            content: List[str] = []
+            citations: List[str] = []
+            usage: Dict[str, int] = {}
+
+            async for chunk in stream:
+                citations = (chunk.model_extra or {}).get("citations", citations)
+                if chunk.usage:
+                    usage = chunk.usage.model_dump()
+                if chunk.choices and chunk.choices[0].delta.content:
+                    token = chunk.choices[0].delta.content
+                    started = True
+                    content.append(token)
+                    on_token(token)
+
+            return PerplexityResponse(
+                content="".join(content), citations=citations, usage=usage
+            )
+
+        try:
+            return await self._with_retries(request, can_retry=lambda: not started)
+        except Exception as e:
+            logger.error(f"Perplexity streaming query failed: {str(e)}")
+            raise
@@ -0,0 +1,161 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+from refassist.models import Document, PackedContext
+
+TOKEN_BUDGET = 6000
+CHARS_PER_TOKEN = 4
+MIN_OVERLAP = 8
+SEPARATOR = "\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English prose and code)"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def relevance(match: dict) -> float:
+    """Ranking key for a retrieved chunk: its fused score if it has one"""
+    score = match.get("score")
+    return score if score is not None else match["similarity"]
+
+
+def merge_overlap(first: str, second: str) -> str:
+    """Join two consecutive chunks, dropping the text they share.
+
+    The splitter's overlap means ``second`` starts with a suffix of ``first``;
+    its length is the final value of the KMP prefix function over
+    ``second + sentinel + tail of first``.
+    """
+    combined = f"{second}\x00{first[-len(second) :]}"
+    prefix = [0] * len(combined)
+    for i in range(1, len(combined)):
+        k = prefix[i - 1]
+        while k and combined[i] != combined[k]:
+            k = prefix[k - 1]
+        if combined[i] == combined[k]:
+            k += 1
+        prefix[i] = k
+
+    overlap = prefix[-1]
+    if overlap < MIN_OVERLAP:
+        return f"{first} {second}"
+    return first + second[overlap:]
+
+
+class ContextBuilder:
+    """Packs the most relevant text into a prompt without exceeding a token budget.
+
+    Matched chunks are grouped into runs of adjacent ``chunk_index`` values per
+    document, merged with their overlap removed, and added best-first until the
+    budget is used up. Files holding deduplicated copies of a chunk are named
+    in its source line, so they can be cited too.
+    """
+
+    def __init__(self, token_budget: int = TOKEN_BUDGET) -> None:
+        if token_budget < 1:
+            raise ValueError("token_budget must be at least 1")
+        self.token_budget = token_budget
+
+    def from_matches(self, matches: List[dict]) -> PackedContext:
+        """Pack retrieved chunks, ranked by fused score or similarity"""
+        spans = self._merge_spans(self._deduplicate(matches))
+        spans.sort(key=lambda span: span[0], reverse=True)
+        return self._pack(
+            (file, text, chunk_ids, also) for _, file, text, chunk_ids, also in spans
+        )
+
+    def from_documents(self, documents: List[Document]) -> PackedContext:
+        """Pack whole documents in order, for when nothing has been retrieved"""
+        return self._pack((str(doc.path), doc.content, [], []) for doc in documents)
+
+    @staticmethod
+    def _deduplicate(matches: List[dict]) -> List[dict]:
+        """Drop repeated chunk text, keeping the best-scoring copy"""
+        seen: Set[str] = set()
+        unique = []
+        for match in sorted(matches, key=relevance, reverse=True):
+            if match["chunk_text"] in seen:
+                continue
+            seen.add(match["chunk_text"])
+            unique.append(match)
+        return unique
+
+    @staticmethod
+    def _merge_spans(
+        matches: List[dict],
+    ) -> List[Tuple[float, str, str, List[int], List[str]]]:
+        """Merge neighbouring chunks of the same document.
+
+        Each span is (score, file, text, chunk ids, files with duplicates).
+        """
+        by_doc: Dict[int, List[dict]] = {}
+        for match in matches:
+            by_doc.setdefault(match["doc_id"], []).append(match)
+
+        spans = []
+        for doc_matches in by_doc.values():
+            doc_matches.sort(key=lambda m: m["chunk_index"])
+            current: Optional[List[dict]] = None
+            for match in doc_matches:
+                if current and match["chunk_index"] == current[-1]["chunk_index"] + 1:
+                    current.append(match)
+                    continue
+                if current:
+                    spans.append(ContextBuilder._span(current))
+                current = [match]
+            if current:
+                spans.append(ContextBuilder._span(current))
+
+        return spans
+
+    @staticmethod
+    def _span(matches: List[dict]) -> Tuple[float, str, str, List[int], List[str]]:
+        text = matches[0]["chunk_text"]
+        for match in matches[1:]:
+            text = merge_overlap(text, match["chunk_text"])
+        return (
+            max(relevance(match) for match in matches),
+            matches[0]["file"],
+            text,
+            [match["chunk_id"] for match in matches],
+            list(
+                dict.fromkeys(
+                    file for match in matches for file in match.get("duplicate_files", ())
+                )
+            ),
+        )
+
+    def _pack(self, sections) -> PackedContext:
+        parts: List[str] = []
+        files: List[str] = []
+        chunk_ids: List[int] = []
+        tokens_used = 0
+
+        for file, text, ids, also in sections:
+            source = f"{file} (also in {', '.join(also)})" if also else file
+            section = f"Source: {source}\n{text}"
+            separator_cost = estimate_tokens(SEPARATOR) if parts else 0
+            remaining = self.token_budget - tokens_used - separator_cost
+
+            truncated = estimate_tokens(section) > remaining
+            if truncated:
+                # Fill what is left with the head of the section, then stop
+                section = section[: max(remaining, 0) * CHARS_PER_TOKEN]
+                if not section:
+                    break
+
+            parts.append(section)
+            files.append(file)
+            chunk_ids.extend(ids)
+            tokens_used += estimate_tokens(section) + separator_cost
+
+            if truncated:
+                break
+
+        return PackedContext(
+            text=SEPARATOR.join(parts),
+            tokens_used=tokens_used,
+            token_budget=self.token_budget,
+            files=list(dict.fromkeys(files)),
+            chunk_ids=chunk_ids,
+        )
@@ -1,45 +1,123 @@
-from typing import List, Union
+from typing import Iterable, Iterator, List, Tuple, Union
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import os
+
 from refassist.log import logger
 from refassist.models import Document
 
+LOAD_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+PREFETCH = 64
+
+FileEntry = Tuple[Path, int, float]
+
 
 class DocumentLoader:
     SUPPORTED_EXTENSIONS = {".md", ".txt", ".rst"}
+    IGNORED_DIRS = {
+        ".git",
+        ".hg",
+        ".svn",
+        ".venv",
+        "venv",
+        "node_modules",
+        "__pycache__",
+        ".tox",
+        ".mypy_cache",
+        ".pytest_cache",
+    }
 
     @staticmethod
     def load_documentation(path: Union[str, Path]) -> List[Document]:
+        """Load every supported file under ``path`` into memory"""
+        path = Path(path)
+
+        if path.is_file() and path.suffix not in DocumentLoader.SUPPORTED_EXTENSIONS:
+            raise ValueError(f"File {path} is not supported")
+
+        documents = list(DocumentLoader.stream_documentation(path))
+
+        if not documents:
+            raise ValueError(f"No supported files found in {path}")
+
+        return documents
+
+    @staticmethod
+    def stream_documentation(
+        path: Union[str, Path], workers: int = LOAD_WORKERS, prefetch: int = PREFETCH
+    ) -> Iterator[Document]:
+        """Yield the supported files under ``path`` as they are read.
+
+        Files are read on a thread pool, but at most ``prefetch`` documents are
+        held in memory at once, so large trees can be streamed into the index.
+        """
+        return DocumentLoader.stream_files(
+            DocumentLoader.scan(path), workers=workers, prefetch=prefetch
+        )
+
+    @staticmethod
+    def scan(path: Union[str, Path]) -> Iterator[FileEntry]:
+        """Yield (path, size, mtime) for supported files without reading them"""
         path = Path(path)
 
         if not path.exists():
             logger.error(f"File {path} does not exist")
             raise FileNotFoundError(f"File {path} does not exist")
 
-        documents: List[Document] = []
-
         if path.is_file():
             if path.suffix in DocumentLoader.SUPPORTED_EXTENSIONS:
-                documents.append(DocumentLoader._load_file(path))
-            else:
-                raise ValueError(f"File {path} is not supported")
-        elif path.is_dir():
-            for file_path in path.rglob("*"):
-                if file_path.suffix in DocumentLoader.SUPPORTED_EXTENSIONS:
-                    documents.append(DocumentLoader._load_file(file_path))
+                stat = path.stat()
+                yield path, stat.st_size, stat.st_mtime
+            return
 
-        if not documents:
-            raise ValueError(f"No supported files found in {path}")
+        # os.scandir returns file types with the directory listing, so only
+        # supported files cost a stat call, and ignored trees are never entered
+        pending = [path]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in DocumentLoader.IGNORED_DIRS:
+                                pending.append(Path(entry.path))
+                        elif os.path.splitext(entry.name)[1] in (
+                            DocumentLoader.SUPPORTED_EXTENSIONS
+                        ):
+                            stat = entry.stat()
+                            yield Path(entry.path), stat.st_size, stat.st_mtime
+            except PermissionError as e:
+                logger.warning(f"Skipping unreadable directory {directory}: {e}")
 
-        return documents
+    @staticmethod
+    def stream_files(
+        entries: Iterable[FileEntry],
+        workers: int = LOAD_WORKERS,
+        prefetch: int = PREFETCH,
+    ) -> Iterator[Document]:
+        """Read scanned files on a thread pool, yielding documents in scan order"""
+        executor = ThreadPoolExecutor(max_workers=workers)
+        window: deque = deque()
+        try:
+            for entry in entries:
+                window.append(executor.submit(DocumentLoader._load_file, *entry))
+                if len(window) >= prefetch:
+                    yield window.popleft().result()
+            while window:
+                yield window.popleft().result()
+        finally:
+            # Don't read ahead for a consumer that has stopped iterating
+            executor.shutdown(cancel_futures=True)
 
     @staticmethod
-    def _load_file(path: Path) -> Document:
+    def _load_file(path: Path, size: int, mtime: float) -> Document:
         try:
             content = path.read_text(encoding="utf-8")
             return Document(
                 content=content,
                 path=path,
-                metadata={"size": path.stat().st_size, "modified": path.stat().st_mtime},
+                metadata={"size": size, "modified": mtime},
             )
         except Exception as e:
             logger.error(f"Error loading file at {path}: {e}")
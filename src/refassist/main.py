@@ -1,16 +1,27 @@
 import asyncio
+import json
 import typer
 from typing_extensions import Annotated
 import os
 from pathlib import Path
 from rich.console import Console
+from rich.live import Live
+from rich.markdown import Markdown
 from rich.prompt import Prompt
 from rich import print as rprint
 from dotenv import dotenv_values
 
-from refassist.client import PerplexityClient
+from refassist.batch import read_questions, run_batch
+from refassist.client import PerplexityClient, MAX_CONCURRENCY, REQUEST_TIMEOUT
 from refassist.loader import DocumentLoader
 from refassist.query import QueryHandler
+from refassist.context import TOKEN_BUDGET
+from refassist.response_cache import RESPONSE_CACHE_TTL
+from refassist.server import HOST, PORT, serve as run_server
+from refassist.metrics import metrics as stage_metrics
+from refassist.ml.vectordb import EMBED_BATCH_SIZE
+from refassist.ml.rerank import RERANK_BUDGET, RERANK_CANDIDATES, RERANK_TOP_K
+from refassist.ml.diversity import MMR_LAMBDA
 from refassist.log import logger
 
 config = dotenv_values(Path(__file__).parent.parent.with_name(".env"))
@@ -18,7 +29,11 @@ config = dotenv_values(Path(__file__).parent.parent.with_name(".env"))
 console = Console()
 
 
-async def interactive_mode(query_handler: QueryHandler):
+async def interactive_mode(query_handler: QueryHandler, stream: bool = True):
+    if query_handler.store_docs:
+        with console.status("[bold green]Syncing documentation index...[/]"):
+            await query_handler.initialize()
+
     while True:
         query = Prompt.ask(
             "\n[bold blue]Ask a question about the documentation"
@@ -28,19 +43,30 @@ async def interactive_mode(query_handler: QueryHandler):
         if query.lower() in ("exit", "quit"):
             break
 
-        if query_handler.store_docs:
-            await query_handler.initialize()
-
         code_example = "code" in query.lower() or "example" in query.lower()
 
         try:
-            with console.status("[bold green]Processing query..."):
-                result = await query_handler.process_query(
-                    query, code_examples=code_example
-                )
+            if stream:
+                rprint("\n[bold green]Query result:[/]")
+                tokens = []
 
-            rprint("\n[bold green]Query result:[/]")
-            rprint(result.answer)
+                with Live(console=console, refresh_per_second=12) as live:
+
+                    def render(token: str) -> None:
+                        tokens.append(token)
+                        live.update(Markdown("".join(tokens)))
+
+                    result = await query_handler.process_query(
+                        query, code_examples=code_example, on_token=render
+                    )
+            else:
+                with console.status("[bold green]Processing query..."):
+                    result = await query_handler.process_query(
+                        query, code_examples=code_example
+                    )
+
+                rprint("\n[bold green]Query result:[/]")
+                rprint(result.answer)
 
             if result.code_examples:
                 rprint("\n[bold yellow]Code examples:[/]")
@@ -53,10 +79,53 @@ async def interactive_mode(query_handler: QueryHandler):
                 for source in result.sources:
                     rprint(f"- {source}")
 
+            timings = result.timings
+            context_usage = (
+                f"context {result.context_tokens}/{result.token_budget} tokens"
+            )
+            if result.cache_hit:
+                context_usage += f", {result.cache_hit} cache hit"
+            if "time_to_first_token" in timings:
+                rprint(
+                    f"\n[dim]First token {timings['time_to_first_token']:.2f}s, "
+                    f"total {timings['total']:.2f}s, {context_usage}[/]"
+                )
+            else:
+                rprint(f"\n[dim]Total {timings['total']:.2f}s, {context_usage}[/]")
+
         except Exception as e:
             logger.error(f"Error: {e}")
             rprint("\n[bold red]An error occurred. Please try again.[/]")
 
+    await query_handler.client.aclose()
+    query_handler.close()
+
+
+async def batch_mode(
+    query_handler: QueryHandler, questions_path: str, output_path: str, concurrency: int
+):
+    questions = read_questions(questions_path)
+
+    try:
+        if query_handler.store_docs:
+            with console.status("[bold green]Syncing documentation index...[/]"):
+                await query_handler.initialize()
+
+        with console.status(f"[bold green]Answering {len(questions)} questions...[/]"):
+            summary = await run_batch(
+                query_handler, questions, output_path, concurrency=concurrency
+            )
+    finally:
+        await query_handler.client.aclose()
+        query_handler.close()
+
+    rprint(
+        f"\n[bold green]Answered {summary['questions'] - summary['failed']}/"
+        f"{summary['questions']} questions in {summary['elapsed_s']:.2f}s "
+        f"({summary['questions_per_sec']:.2f}/s), results in {output_path}[/]"
+    )
+    rprint(json.dumps(summary, indent=2))
+
 
 def main(
     file: Annotated[str, typer.Option(help="Path to a file or directory.")] = "",
@@ -78,6 +147,218 @@ def main(
     db_path: Annotated[
         str, typer.Option("--db-path", help="Where to store the db file.")
     ] = None,
+    embed_batch_size: Annotated[
+        int,
+        typer.Option(
+            "--embed-batch-size",
+            help="How many chunks to embed per model forward pass.",
+        ),
+    ] = EMBED_BATCH_SIZE,
+    chunk_workers: Annotated[
+        int,
+        typer.Option(
+            "--chunk-workers",
+            help="Processes used to split documents into chunks (0 = in-process).",
+        ),
+    ] = 0,
+    embed_workers: Annotated[
+        int,
+        typer.Option(
+            "--embed-workers",
+            help="Processes used to compute embeddings (0 = in-process).",
+        ),
+    ] = 0,
+    torch_threads: Annotated[
+        int,
+        typer.Option(
+            "--torch-threads",
+            help="Torch threads per embedding worker (default: cores / workers).",
+        ),
+    ] = None,
+    quantization: Annotated[
+        str,
+        typer.Option(
+            "--quantization",
+            help="Compact vector codes for search: 'none', 'int8' or 'binary'.",
+        ),
+    ] = "none",
+    embedding_backend: Annotated[
+        str,
+        typer.Option(
+            "--embedding-backend",
+            help="Embedding runtime: 'torch', 'onnx' or 'onnx-int8' (CPU only).",
+        ),
+    ] = "torch",
+    dedup: Annotated[
+        str,
+        typer.Option(
+            "--dedup",
+            help="Collapse repeated chunks at ingest: 'none', 'exact' or 'near'.",
+        ),
+    ] = "none",
+    search_backend: Annotated[
+        str,
+        typer.Option(
+            "--search-backend",
+            help="Vector search engine: 'duckdb' or 'matrix' (memory-mapped NumPy).",
+        ),
+    ] = "duckdb",
+    matrix_dtype: Annotated[
+        str,
+        typer.Option(
+            "--matrix-dtype",
+            help="Precision of the 'matrix' backend's vectors: 'float32' or 'float16'.",
+        ),
+    ] = "float32",
+    max_concurrency: Annotated[
+        int,
+        typer.Option(
+            "--max-concurrency",
+            help="Maximum number of simultaneous Perplexity API requests.",
+        ),
+    ] = MAX_CONCURRENCY,
+    timeout: Annotated[
+        float,
+        typer.Option("--timeout", help="Perplexity API request timeout in seconds."),
+    ] = REQUEST_TIMEOUT,
+    stream: Annotated[
+        bool,
+        typer.Option(
+            "--stream/--no-stream",
+            help="Whether to print the answer as it is generated.",
+        ),
+    ] = True,
+    token_budget: Annotated[
+        int,
+        typer.Option(
+            "--token-budget",
+            help="Maximum number of context tokens sent with each question.",
+        ),
+    ] = TOKEN_BUDGET,
+    cache: Annotated[
+        bool,
+        typer.Option(
+            "--cache/--no-cache",
+            help="Whether to reuse answers to repeated questions.",
+        ),
+    ] = False,
+    cache_path: Annotated[
+        str,
+        typer.Option(
+            "--cache-path",
+            help="DuckDB file for cached answers (default: the RAG database, or memory).",
+        ),
+    ] = None,
+    semantic_cache_threshold: Annotated[
+        float,
+        typer.Option(
+            "--semantic-cache-threshold",
+            help="Also reuse answers to questions at least this similar (0-1).",
+        ),
+    ] = None,
+    cache_ttl: Annotated[
+        float,
+        typer.Option("--cache-ttl", help="Seconds a cached answer stays valid."),
+    ] = RESPONSE_CACHE_TTL,
+    retrieval: Annotated[
+        str,
+        typer.Option(
+            "--retrieval",
+            help="Retrieval mode for RAG: 'vector' or 'hybrid' (BM25 + vector).",
+        ),
+    ] = "vector",
+    vector_weight: Annotated[
+        float,
+        typer.Option("--vector-weight", help="Weight of vector matches in hybrid mode."),
+    ] = 1.0,
+    lexical_weight: Annotated[
+        float,
+        typer.Option("--lexical-weight", help="Weight of BM25 matches in hybrid mode."),
+    ] = 1.0,
+    rerank: Annotated[
+        bool,
+        typer.Option(
+            "--rerank/--no-rerank",
+            help="Rerank retrieved chunks with a cross-encoder before answering.",
+        ),
+    ] = False,
+    rerank_candidates: Annotated[
+        int,
+        typer.Option("--rerank-candidates", help="Chunks retrieved for reranking."),
+    ] = RERANK_CANDIDATES,
+    rerank_top_k: Annotated[
+        int,
+        typer.Option("--rerank-top-k", help="Chunks kept after reranking."),
+    ] = RERANK_TOP_K,
+    rerank_budget: Annotated[
+        float,
+        typer.Option(
+            "--rerank-budget",
+            help="Seconds reranking may take per question before it stops scoring.",
+        ),
+    ] = RERANK_BUDGET,
+    mmr: Annotated[
+        bool,
+        typer.Option(
+            "--mmr/--no-mmr",
+            help="Pick vector matches by maximal marginal relevance for variety.",
+        ),
+    ] = False,
+    mmr_lambda: Annotated[
+        float,
+        typer.Option(
+            "--mmr-lambda",
+            help="Relevance vs. variety trade-off for --mmr (1.0 is plain top-k).",
+        ),
+    ] = MMR_LAMBDA,
+    mmr_collapse: Annotated[
+        str,
+        typer.Option(
+            "--mmr-collapse",
+            help="With --mmr, keep one chunk per 'doc', drop 'neighbours', or 'none'.",
+        ),
+    ] = "none",
+    batch: Annotated[
+        str,
+        typer.Option(
+            "--batch",
+            help="Answer the questions in this JSONL or CSV file instead of prompting.",
+        ),
+    ] = "",
+    output: Annotated[
+        str,
+        typer.Option("--output", help="Where --batch writes its JSONL results."),
+    ] = "results.jsonl",
+    serve: Annotated[
+        bool,
+        typer.Option(
+            "--serve/--no-serve",
+            help="Serve queries over HTTP instead of prompting.",
+        ),
+    ] = False,
+    watch: Annotated[
+        bool,
+        typer.Option(
+            "--watch/--no-watch",
+            help="Re-index changed files in the background (needs --store-files).",
+        ),
+    ] = False,
+    metrics: Annotated[
+        bool,
+        typer.Option(
+            "--metrics/--no-metrics",
+            help="Collect per-stage latency and token metrics.",
+        ),
+    ] = False,
+    metrics_file: Annotated[
+        str,
+        typer.Option(
+            "--metrics-file",
+            help="Write metrics in Prometheus text format here on exit.",
+        ),
+    ] = "",
+    host: Annotated[str, typer.Option("--host", help="Address to serve on.")] = HOST,
+    port: Annotated[int, typer.Option("--port", help="Port to serve on.")] = PORT,
 ) -> None:
     api_key = api_key or os.getenv("PERPLEXITY_API_KEY") or config["PERPLEXITY_API_KEY"]
 
@@ -87,33 +368,84 @@ def main(
     if not file:
         raise typer.BadParameter("File or directory is required")
 
+    if metrics or metrics_file:
+        stage_metrics.enable()
+
     try:
-        with console.status("[bold green]Loading documentation...[/]"):
-            documents = DocumentLoader.load_documentation(path=file)
+        # With --store-files the RAG pipeline streams the files into its index
+        # itself, so they are only loaded up front for basic mode
+        documents = []
+        if not store_files:
+            with console.status("[bold green]Loading documentation...[/]"):
+                documents = DocumentLoader.load_documentation(path=file)
 
-        rprint(f"\n[bold green]Retrieved {len(documents)} documents.[/]")
+            rprint(f"\n[bold green]Retrieved {len(documents)} documents.[/]")
 
-        client = PerplexityClient(api_key)
+        client = PerplexityClient(
+            api_key, max_concurrency=max_concurrency, timeout=timeout
+        )
 
         no_rag = not any([store_files, in_memory, db_path])
 
         if no_rag:
             query_handler = QueryHandler(
-                client=client, documents=documents, store_docs=False
+                client=client,
+                documents=documents,
+                store_docs=False,
+                token_budget=token_budget,
+                cache_responses=cache,
+                cache_path=cache_path,
+                semantic_cache_threshold=semantic_cache_threshold,
+                cache_ttl=cache_ttl,
             )
         else:
             query_handler = QueryHandler(
                 client=client,
                 documents=documents,
+                documents_path=file,
                 db_path=db_path,
                 in_memory=in_memory,
                 store_docs=store_files,
+                embed_batch_size=embed_batch_size,
+                chunk_workers=chunk_workers,
+                embed_workers=embed_workers,
+                torch_threads=torch_threads,
+                quantization=quantization,
+                embedding_backend=embedding_backend,
+                dedup=dedup,
+                search_backend=search_backend,
+                matrix_dtype=matrix_dtype,
+                token_budget=token_budget,
+                cache_responses=cache,
+                cache_path=cache_path,
+                semantic_cache_threshold=semantic_cache_threshold,
+                cache_ttl=cache_ttl,
+                retrieval=retrieval,
+                vector_weight=vector_weight,
+                lexical_weight=lexical_weight,
+                rerank=rerank,
+                rerank_top_k=rerank_top_k,
+                rerank_candidates=rerank_candidates,
+                rerank_budget=rerank_budget,
+                mmr=mmr,
+                mmr_lambda=mmr_lambda,
+                mmr_collapse=mmr_collapse,
+                watch=watch,
             )
 
-        rprint("\n[bold]Welcome to the Documentation Assistant![/bold]")
-        rprint("Ask questions about the documentation or type 'exit' to quit.")
+        if batch:
+            asyncio.run(batch_mode(query_handler, batch, output, max_concurrency))
+        elif serve:
+            rprint(f"\n[bold green]Serving on http://{host}:{port}[/]")
+            run_server(query_handler, host=host, port=port)
+        else:
+            rprint("\n[bold]Welcome to the Documentation Assistant![/bold]")
+            rprint("Ask questions about the documentation or type 'exit' to quit.")
+
+            asyncio.run(interactive_mode(query_handler, stream=stream))
 
-        asyncio.run(interactive_mode(query_handler))
+        if metrics_file:
+            Path(metrics_file).write_text(stage_metrics.render_prometheus())
 
     except Exception as e:
         logger.error(f"Error: {e}")
@@ -0,0 +1,171 @@
+from typing import Dict, List, Optional, Tuple
+from contextlib import nullcontext
+from bisect import bisect_left
+import threading
+import time
+
+PREFIX = "refassist"
+LATENCY_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+USAGE_KINDS = ("prompt_tokens", "completion_tokens")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_NOOP = nullcontext()
+
+
+class _Span:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics: "Metrics", stage: str) -> None:
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """Per-stage latency histograms and counters, exported as Prometheus text.
+
+    Collection is off until ``enable`` is called; while off, ``span`` hands
+    back a shared no-op context manager and the recording methods return
+    straight away, so instrumented code pays for little more than a call.
+    Updates take a lock, as stages are recorded from server worker threads.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.enabled = False
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, List[float]] = {}
+        self._sums: Dict[str, float] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._sums.clear()
+            self._counters.clear()
+
+    def span(self, stage: str):
+        """Context manager timing the enclosed block as ``stage``"""
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, stage)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            counts = self._histograms.get(stage)
+            if counts is None:
+                counts = self._histograms[stage] = [0] * (len(self.buckets) + 1)
+            counts[bisect_left(self.buckets, seconds)] += 1
+            self._sums[stage] = self._sums.get(stage, 0.0) + seconds
+
+    def incr(self, name: str, value: float = 1, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def record_query(
+        self,
+        timings: Dict[str, float],
+        usage: Dict[str, int],
+        cache_hit: Optional[str],
+        chunks: int,
+    ) -> None:
+        """Record the stages and counters of one answered query"""
+        if not self.enabled:
+            return
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+        self.incr("queries")
+        self.incr("chunks_retrieved", chunks)
+        for kind in USAGE_KINDS:
+            self.incr("tokens", usage.get(kind, 0), kind=kind.removesuffix("_tokens"))
+        if cache_hit:
+            self.incr("cache_hits", layer=cache_hit)
+
+    def snapshot(self) -> dict:
+        """Counters and per-stage count/sum as plain data"""
+        with self._lock:
+            return {
+                "stages": {
+                    stage: {"count": sum(counts), "sum_s": self._sums[stage]}
+                    for stage, counts in self._histograms.items()
+                },
+                "counters": {
+                    _series(name, labels): value
+                    for (name, labels), value in self._counters.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """Render everything in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            if self._histograms:
+                name = f"{PREFIX}_stage_seconds"
+                lines += [
+                    f"# HELP {name} Time spent in each query stage.",
+                    f"# TYPE {name} histogram",
+                ]
+                for stage, counts in sorted(self._histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip((*self.buckets, "+Inf"), counts):
+                        cumulative += count
+                        lines.append(
+                            f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+                        )
+                    lines.append(f'{name}_sum{{stage="{stage}"}} {self._sums[stage]}')
+                    lines.append(f'{name}_count{{stage="{stage}"}} {cumulative}')
+
+            for counter in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {PREFIX}_{counter}_total counter")
+                for (name, labels), value in sorted(self._counters.items()):
+                    if name == counter:
+                        lines.append(f"{PREFIX}_{_series(name, labels)} {_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _number(value: float) -> str:
+    """Exact rendering of a sample value, without exponents for whole numbers"""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _series(name: str, labels: Labels) -> str:
+    if not labels:
+        return f"{name}_total"
+    rendered = ",".join(f'{key}="{value}"' for key, value in labels)
+    return f"{name}_total{{{rendered}}}"
+
+
+metrics = Metrics()
@@ -0,0 +1,307 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import zlib
+
+import numpy as np
+import pyarrow as pa
+from duckdb import DuckDBPyConnection
+
+from refassist.log import logger
+
+DEDUP_MODES = ("none", "exact", "near")
+SHINGLE_SIZE = 5
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+NEAR_DUPLICATE_THRESHOLD = 0.9
+# Fixed so that signatures stored by one run stay comparable in the next
+MINHASH_SEED = 1
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """crc32 of every run of ``size`` consecutive words, lower-cased"""
+    words = text.lower().split()
+    grams = {" ".join(words[i : i + size]) for i in range(max(len(words) - size, 0) + 1)}
+    return np.fromiter(
+        (zlib.crc32(gram.encode("utf-8")) for gram in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+
+
+class MinHasher:
+    """MinHash signatures, whose agreement estimates Jaccard similarity.
+
+    Each of the ``permutations`` hash functions is ``(a * x + b) mod p`` with
+    32-bit ``a`` and ``b``, so the products of 32-bit shingle hashes never
+    overflow uint64.
+    """
+
+    def __init__(
+        self, permutations: int = MINHASH_PERMUTATIONS, seed: int = MINHASH_SEED
+    ) -> None:
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _MAX_HASH, permutations, dtype=np.uint64)
+        self.b = rng.integers(0, _MAX_HASH, permutations, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashed = (shingles(text)[:, None] * self.a + self.b) % _PRIME
+        return (hashed & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        return float(np.mean(first == second))
+
+
+class ChunkDeduplicator:
+    """Maps new chunks onto identical or near-identical chunks already indexed.
+
+    Versioned trees (``v1/``, ``v2/``...) repeat most of their paragraphs. A
+    chunk whose text hash matches an indexed chunk, or, in ``near`` mode,
+    whose MinHash signature agrees with one on at least ``threshold`` of its
+    positions, becomes a duplicate of that canonical chunk. It keeps its row
+    in ``chunks``, so its file can still be cited, but gets no embedding, no
+    postings and no quantized code of its own.
+
+    Canonical chunks are kept in ``chunk_signatures`` and, for lookups, in
+    memory: an exact map of text hashes plus LSH buckets over ``LSH_BANDS``
+    bands of each signature, so a new chunk is only compared against chunks
+    that share a band with it.
+    """
+
+    def __init__(
+        self,
+        conn: DuckDBPyConnection,
+        mode: str,
+        dim: int,
+        threshold: float = NEAR_DUPLICATE_THRESHOLD,
+    ) -> None:
+        if mode not in DEDUP_MODES[1:]:
+            raise ValueError(f"mode must be one of {', '.join(DEDUP_MODES[1:])}")
+        self.conn = conn
+        self.mode = mode
+        self.dim = dim
+        self.threshold = threshold
+        self.hasher = MinHasher() if mode == "near" else None
+        self._by_hash: Dict[str, int] = {}
+        self._hashes: Dict[int, str] = {}
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def initialize_schema(self) -> None:
+        """Create the signature table and load the canonical chunks"""
+        try:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_signatures (
+                    chunk_id INT PRIMARY KEY,
+                    text_hash TEXT,
+                    signature BLOB
+                );
+            """)
+            self.load()
+        except Exception as e:
+            logger.error(f"Failed to initialize chunk deduplication: {e}")
+            raise
+
+    def load(self) -> None:
+        """Rebuild the in-memory lookups from the database.
+
+        Chunks indexed while deduplication was off, or before near-duplicate
+        signatures were kept, are signed here once.
+        """
+        try:
+            self.conn.execute("""
+                DELETE FROM chunk_signatures
+                WHERE chunk_id NOT IN (SELECT id FROM chunks)""")
+            unsigned = self.conn.execute(f"""
+                SELECT c.id, c.chunk_text
+                FROM chunks c
+                LEFT JOIN chunk_signatures s ON s.chunk_id = c.id
+                WHERE c.id NOT IN (SELECT chunk_id FROM chunk_duplicates)
+                    AND (s.chunk_id IS NULL
+                        {"OR s.signature IS NULL" if self.hasher else ""})
+            """).fetchall()
+            if unsigned:
+                ids = [chunk_id for chunk_id, _ in unsigned]
+                self.conn.execute(
+                    "DELETE FROM chunk_signatures WHERE chunk_id IN (SELECT unnest(?))",
+                    [ids],
+                )
+                self._store(ids, [text for _, text in unsigned])
+
+            self._by_hash.clear()
+            self._hashes.clear()
+            self._signatures.clear()
+            self._buckets.clear()
+            for chunk_id, text_hash, signature in self.conn.execute(
+                "SELECT chunk_id, text_hash, signature FROM chunk_signatures"
+            ).fetchall():
+                if signature is not None:
+                    signature = np.frombuffer(signature, dtype=np.uint32)
+                self._register(chunk_id, text_hash, signature)
+        except Exception as e:
+            logger.error(f"Failed to load chunk signatures: {e}")
+            raise
+
+    def _bands(self, signature: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+        for band, rows in enumerate(np.array_split(signature, LSH_BANDS)):
+            yield band, rows.tobytes()
+
+    def _register(
+        self, chunk_id: int, text_hash: str, signature: Optional[np.ndarray]
+    ) -> None:
+        self._by_hash.setdefault(text_hash, chunk_id)
+        self._hashes[chunk_id] = text_hash
+        if signature is not None and self.hasher:
+            self._signatures[chunk_id] = signature
+            for key in self._bands(signature):
+                self._buckets.setdefault(key, []).append(chunk_id)
+
+    def _unregister(self, chunk_id: int) -> None:
+        text_hash = self._hashes.pop(chunk_id, None)
+        if text_hash is not None and self._by_hash.get(text_hash) == chunk_id:
+            del self._by_hash[text_hash]
+        signature = self._signatures.pop(chunk_id, None)
+        if signature is not None:
+            for key in self._bands(signature):
+                bucket = self._buckets[key]
+                bucket.remove(chunk_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def _nearest(self, signature: np.ndarray) -> Optional[int]:
+        """The most similar canonical chunk at or above the threshold"""
+        candidates = {
+            chunk_id
+            for key in self._bands(signature)
+            for chunk_id in self._buckets.get(key, ())
+        }
+        best, best_similarity = None, self.threshold
+        for chunk_id in candidates:
+            similarity = MinHasher.similarity(signature, self._signatures[chunk_id])
+            if similarity >= best_similarity:
+                best, best_similarity = chunk_id, similarity
+        return best
+
+    def assign(self, chunk_ids: List[int], texts: List[str]) -> List[Optional[int]]:
+        """The canonical chunk each new chunk duplicates, or None if it is new.
+
+        New canonical chunks are registered as they are seen, so repeats
+        within the same batch are caught too.
+        """
+        canonical_ids: List[Optional[int]] = []
+        new_ids, new_hashes, new_signatures = [], [], []
+
+        for chunk_id, text in zip(chunk_ids, texts):
+            text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            canonical = self._by_hash.get(text_hash)
+            signature = None
+            if canonical is not None:
+                self.exact_duplicates += 1
+            elif self.hasher:
+                signature = self.hasher.signature(text)
+                canonical = self._nearest(signature)
+                if canonical is not None:
+                    self.near_duplicates += 1
+
+            if canonical is None:
+                self._register(chunk_id, text_hash, signature)
+                new_ids.append(chunk_id)
+                new_hashes.append(text_hash)
+                new_signatures.append(signature)
+            canonical_ids.append(canonical)
+
+        self._insert(new_ids, new_hashes, new_signatures)
+        return canonical_ids
+
+    def adopt(self, chunk_ids: List[int], texts: List[str]) -> None:
+        """Register chunks promoted to canonical when their original was removed"""
+        for chunk_id in chunk_ids:
+            self._unregister(chunk_id)
+        self.conn.execute(
+            "DELETE FROM chunk_signatures WHERE chunk_id IN (SELECT unnest(?))",
+            [chunk_ids],
+        )
+        hashes, signatures = self._store(chunk_ids, texts)
+        for chunk_id, text_hash, signature in zip(chunk_ids, hashes, signatures):
+            self._register(chunk_id, text_hash, signature)
+            # The removed original may still hold the hash until it is
+            # unregistered, which must then leave the promoted chunk in place
+            self._by_hash[text_hash] = chunk_id
+
+    def _store(
+        self, chunk_ids: List[int], texts: List[str]
+    ) -> Tuple[List[str], List[Optional[np.ndarray]]]:
+        hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        signatures = [
+            self.hasher.signature(text) if self.hasher else None for text in texts
+        ]
+        self._insert(chunk_ids, hashes, signatures)
+        return hashes, signatures
+
+    def _insert(
+        self,
+        chunk_ids: List[int],
+        hashes: List[str],
+        signatures: List[Optional[np.ndarray]],
+    ) -> None:
+        if not chunk_ids:
+            return
+        rows = pa.table(
+            {
+                "chunk_id": pa.array(chunk_ids, type=pa.int32()),
+                "text_hash": hashes,
+                "signature": pa.array(
+                    [None if s is None else s.tobytes() for s in signatures],
+                    type=pa.binary(),
+                ),
+            }
+        )
+        self.conn.register("_chunk_signatures_batch", rows)
+        try:
+            self.conn.execute("""
+                INSERT INTO chunk_signatures (chunk_id, text_hash, signature)
+                SELECT chunk_id, text_hash, signature FROM _chunk_signatures_batch""")
+        except Exception as e:
+            logger.error(f"Failed to store chunk signatures: {e}")
+            raise
+        finally:
+            self.conn.unregister("_chunk_signatures_batch")
+
+    def remove_documents(self, doc_ids: List[int]) -> None:
+        """Forget every canonical chunk of the given documents"""
+        try:
+            removed = self.conn.execute(
+                """
+                DELETE FROM chunk_signatures WHERE chunk_id IN (
+                    SELECT id FROM chunks WHERE doc_id IN (SELECT unnest(?))
+                )
+                RETURNING chunk_id""",
+                [doc_ids],
+            ).fetchall()
+            for (chunk_id,) in removed:
+                self._unregister(chunk_id)
+        except Exception as e:
+            logger.error(f"Failed to remove chunk signatures: {e}")
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        """Duplicates found since this deduplicator was created"""
+        return {
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+        }
+
+    def savings(self, since: Dict[str, int]) -> Dict[str, int]:
+        """Duplicates found, and embedding storage saved, since ``since``"""
+        exact = self.exact_duplicates - since["exact_duplicates"]
+        near = self.near_duplicates - since["near_duplicates"]
+        return {
+            "duplicate_chunks": exact,
+            "near_duplicate_chunks": near,
+            "embeddings_saved": exact + near,
+            "embedding_bytes_saved": (exact + near) * self.dim * 4,
+        }
@@ -0,0 +1,59 @@
+from typing import List, Optional
+
+import numpy as np
+
+MMR_LAMBDA = 0.5
+MMR_CANDIDATES = 20
+COLLAPSE_MODES = ("none", "doc", "neighbours")
+
+
+def mmr_select(
+    relevance: np.ndarray,
+    vectors: np.ndarray,
+    top_k: int,
+    mmr_lambda: float = MMR_LAMBDA,
+    doc_ids: Optional[np.ndarray] = None,
+    chunk_indexes: Optional[np.ndarray] = None,
+    collapse: str = "none",
+) -> List[int]:
+    """Pick up to ``top_k`` candidates by maximal marginal relevance.
+
+    Each step takes the candidate maximising
+    ``mmr_lambda * relevance - (1 - mmr_lambda) * redundancy``, where
+    redundancy is its highest similarity to anything already picked; 1.0 is
+    plain top-k and lower values favour variety. ``vectors`` must be
+    normalized. Redundancy is kept as one array updated with a single
+    matrix-vector product per pick, so a step is O(candidates * dim).
+
+    ``collapse`` additionally drops, after each pick, the other candidates
+    from the same document (``doc``) or its directly neighbouring chunks
+    (``neighbours``), which the splitter's overlap makes near copies.
+    Returns positions into the candidate arrays, in selection order.
+    """
+    if collapse not in COLLAPSE_MODES:
+        raise ValueError(f"collapse must be one of {', '.join(COLLAPSE_MODES)}")
+    if collapse != "none" and doc_ids is None:
+        raise ValueError("collapse needs doc_ids")
+    if collapse == "neighbours" and chunk_indexes is None:
+        raise ValueError("collapsing neighbours needs chunk_indexes")
+
+    available = np.ones(len(relevance), dtype=bool)
+    redundancy = np.zeros(len(relevance), dtype=np.float32)
+    selected: List[int] = []
+
+    while len(selected) < top_k and available.any():
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        best = int(np.argmax(np.where(available, scores, -np.inf)))
+        selected.append(best)
+        available[best] = False
+
+        if collapse == "doc":
+            available &= doc_ids != doc_ids[best]
+        elif collapse == "neighbours":
+            available &= ~(
+                (doc_ids == doc_ids[best])
+                & (np.abs(chunk_indexes - chunk_indexes[best]) <= 1)
+            )
+        np.maximum(redundancy, vectors @ vectors[best], out=redundancy)
+
+    return selected
@@ -0,0 +1,184 @@
+from typing import Any, Iterator, List, Optional
+from contextlib import contextmanager
+from pathlib import Path
+import os
+import tempfile
+
+import numpy as np
+
+from refassist.log import logger
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_CACHE_DIR = (
+    Path(os.getenv("REFASSIST_CACHE_DIR", Path.home() / ".cache" / "refassist")) / "onnx"
+)
+ONNX_OPSET = 17
+MAX_SEQUENCE_LENGTH = 512
+
+
+def cache_model_name(model_name: str, backend: str) -> str:
+    """Key embeddings are cached under for a model served by ``backend``.
+
+    The ONNX export reproduces the torch vectors to within float error, so
+    both share cache entries; int8 weights shift them slightly more and are
+    kept apart.
+    """
+    return f"{model_name}:int8" if backend == "onnx-int8" else model_name
+
+
+def load_embedding_model(
+    backend: str,
+    model_name: str,
+    embed_batch_size: int,
+    device: Optional[str] = None,
+    threads: Optional[int] = None,
+) -> Any:
+    """Load ``model_name`` on the given backend.
+
+    ``device`` only applies to torch; the ONNX backends always run on the CPU,
+    with ``threads`` intra-op threads when given.
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"backend must be one of {', '.join(EMBEDDING_BACKENDS)}")
+
+    if backend == "torch":
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+        return HuggingFaceEmbedding(
+            model_name=model_name, device=device, embed_batch_size=embed_batch_size
+        )
+
+    return OnnxEmbedding(
+        model_name,
+        embed_batch_size=embed_batch_size,
+        quantize=backend == "onnx-int8",
+        threads=threads,
+    )
+
+
+class OnnxEmbedding:
+    """The HuggingFace embedding model run through ONNX Runtime on the CPU.
+
+    The model is exported from its torch weights once and kept under
+    ``cache_dir``; with ``quantize`` the export is additionally passed through
+    dynamic int8 quantization. Vectors are pooled from the CLS token and
+    normalized exactly as ``HuggingFaceEmbedding`` does for BGE models, so
+    they can be mixed with vectors the torch backend has already stored.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        embed_batch_size: int,
+        quantize: bool = False,
+        threads: Optional[int] = None,
+        cache_dir: Path = ONNX_CACHE_DIR,
+        max_length: int = MAX_SEQUENCE_LENGTH,
+    ) -> None:
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError(
+                "The onnx embedding backends need onnxruntime: "
+                "install refassist with the 'onnx' extra"
+            ) from e
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.embed_batch_size = embed_batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+        model_path = self.export(model_name, self.tokenizer, cache_dir, quantize)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+
+        logger.info(f"Loading ONNX embedding model {model_path}")
+        self.session = ort.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    @staticmethod
+    def export(model_name: str, tokenizer: Any, cache_dir: Path, quantize: bool) -> Path:
+        """Path of the ONNX model, exporting (and quantizing) it on first use"""
+        target = Path(cache_dir) / model_name.replace("/", "--")
+        target.mkdir(parents=True, exist_ok=True)
+
+        fp32_path = target / "model.onnx"
+        if not fp32_path.exists():
+            import torch
+            from transformers import AutoModel
+
+            logger.info(f"Exporting {model_name} to ONNX")
+            model = AutoModel.from_pretrained(model_name).eval()
+            sample = tokenizer(["export"], return_tensors="pt")
+            input_names = list(sample.keys())
+            dynamic_axes = {
+                name: {0: "batch", 1: "sequence"}
+                for name in [*input_names, "last_hidden_state"]
+            }
+            # Written to a temporary file first, as embedding workers may race
+            # to export the same model
+            with _staging(fp32_path) as staging:
+                torch.onnx.export(
+                    model,
+                    tuple(sample[name] for name in input_names),
+                    staging,
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes=dynamic_axes,
+                    opset_version=ONNX_OPSET,
+                )
+
+        if not quantize:
+            return fp32_path
+
+        int8_path = target / "model_int8.onnx"
+        if not int8_path.exists():
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            logger.info(f"Quantizing {model_name} to int8")
+            with _staging(int8_path) as staging:
+                quantize_dynamic(fp32_path, staging, weight_type=QuantType.QInt8)
+        return int8_path
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(None, feeds)[0]
+
+        cls = hidden[:, 0].astype(np.float32)
+        norms = np.linalg.norm(cls, axis=1, keepdims=True)
+        return cls / np.maximum(norms, 1e-12)
+
+    def get_text_embedding_batch(self, texts: List[str], **kwargs) -> List[List[float]]:
+        embeddings: List[List[float]] = []
+        for offset in range(0, len(texts), self.embed_batch_size):
+            batch = texts[offset : offset + self.embed_batch_size]
+            embeddings.extend(self._embed_batch(batch).tolist())
+        return embeddings
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+@contextmanager
+def _staging(path: Path) -> Iterator[str]:
+    """Temporary file next to ``path`` that replaces it only on success"""
+    fd, staging = tempfile.mkstemp(suffix=".onnx", dir=path.parent)
+    os.close(fd)
+    try:
+        yield staging
+        os.replace(staging, path)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
@@ -0,0 +1,162 @@
+from datetime import datetime
+from typing import List, Dict, Set
+import hashlib
+
+import pyarrow as pa
+from duckdb import DuckDBPyConnection
+
+from refassist.log import logger
+
+EMBED_CACHE_SIZE = 100_000
+
+
+class EmbeddingCache:
+    """Content-addressed embedding store kept alongside the RAG tables.
+
+    Entries are keyed by (model name, SHA-256 of the chunk text), so identical
+    chunks are only ever embedded once per model, whichever document, version
+    or rebuild they come from. The table is capped at ``max_entries`` rows and
+    the least recently used entries are evicted first. Use is timed by the
+    wall clock rather than DuckDB's ``now()``, which stays at the start of the
+    transaction for a whole sync.
+    """
+
+    def __init__(
+        self,
+        conn: DuckDBPyConnection,
+        model_name: str,
+        embedding_type: str,
+        max_entries: int = EMBED_CACHE_SIZE,
+    ) -> None:
+        self.conn = conn
+        self.model_name = model_name
+        self.embedding_type = embedding_type
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def initialize_schema(self) -> None:
+        """Create the cache table"""
+        try:
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    model TEXT,
+                    text_hash TEXT,
+                    embedding {self.embedding_type},
+                    last_used TIMESTAMP,
+                    PRIMARY KEY (model, text_hash)
+                );
+            """)
+        except Exception as e:
+            logger.error(f"Failed to initialize embedding cache: {e}")
+            raise
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """Compute the cache key for a chunk's text"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def lookup(self, text_hashes: List[str]) -> Set[str]:
+        """Return the hashes already cached, marking them as recently used"""
+        try:
+            unique_hashes = list(set(text_hashes))
+            found = {
+                row[0]
+                for row in self.conn.execute(
+                    """
+                    UPDATE embedding_cache SET last_used = ?
+                    WHERE model = ? AND text_hash IN (SELECT unnest(?))
+                    RETURNING text_hash""",
+                    [datetime.now(), self.model_name, unique_hashes],
+                ).fetchall()
+            }
+
+            hits = sum(1 for text_hash in text_hashes if text_hash in found)
+            self.hits += hits
+            self.misses += len(text_hashes) - hits
+            return found
+
+        except Exception as e:
+            logger.error(f"Failed to look up cached embeddings: {e}")
+            raise
+
+    def store(self, text_hashes: List[str], embeddings: List[List[float]]) -> None:
+        """Add freshly computed embeddings to the cache"""
+        if not text_hashes:
+            return
+
+        entries = pa.table(
+            {
+                "text_hash": text_hashes,
+                "embedding": pa.array(embeddings, type=pa.list_(pa.float32())),
+            }
+        )
+        self.conn.register("_embedding_cache_entries", entries)
+        try:
+            self.conn.execute(
+                """
+                INSERT INTO embedding_cache (model, text_hash, embedding, last_used)
+                SELECT ?, text_hash, embedding, ? FROM _embedding_cache_entries
+                ON CONFLICT DO NOTHING""",
+                [self.model_name, datetime.now()],
+            )
+        except Exception as e:
+            logger.error(f"Failed to store embeddings in cache: {e}")
+            raise
+        finally:
+            self.conn.unregister("_embedding_cache_entries")
+
+    def embeddings_for(self, chunk_ids: List[int], text_hashes: List[str]) -> pa.Table:
+        """Resolve chunk ids to their cached embeddings as an Arrow table"""
+        chunks = pa.table(
+            {
+                "chunk_id": pa.array(chunk_ids, type=pa.int32()),
+                "text_hash": text_hashes,
+            }
+        )
+        self.conn.register("_embedding_cache_chunks", chunks)
+        try:
+            return self.conn.execute(
+                """
+                SELECT b.chunk_id, c.embedding
+                FROM _embedding_cache_chunks b
+                JOIN embedding_cache c
+                    ON c.model = ? AND c.text_hash = b.text_hash""",
+                [self.model_name],
+            ).fetch_arrow_table()
+        except Exception as e:
+            logger.error(f"Failed to read cached embeddings: {e}")
+            raise
+        finally:
+            self.conn.unregister("_embedding_cache_chunks")
+
+    def evict(self) -> int:
+        """Drop least recently used entries beyond the size cap"""
+        try:
+            count = self.conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[
+                0
+            ]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return 0
+
+            self.conn.execute(
+                """
+                DELETE FROM embedding_cache
+                WHERE (model, text_hash) IN (
+                    SELECT (model, text_hash) FROM embedding_cache
+                    ORDER BY last_used
+                    LIMIT ?
+                )""",
+                [excess],
+            )
+            logger.info(f"Evicted {excess} embeddings from cache")
+            return excess
+
+        except Exception as e:
+            logger.error(f"Failed to evict cached embeddings: {e}")
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss counters since this cache was created"""
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,157 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import re
+
+from duckdb import DuckDBPyConnection
+
+from refassist.log import logger
+
+TOKEN_PATTERN = r"[a-z0-9_]+"
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens, keeping identifiers like snake_case names whole"""
+    return re.findall(TOKEN_PATTERN, text.lower())
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[List[int]], weights: Sequence[float], k: int = RRF_K
+) -> List[Tuple[int, float]]:
+    """Fuse ranked id lists into one, scoring each id by sum(weight / (k + rank))"""
+    scores: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """BM25 index over ``chunks.chunk_text`` stored as plain DuckDB tables.
+
+    Postings live in ``chunk_terms`` and chunk lengths in ``chunk_lengths``, so
+    adding or removing chunks only touches their own rows. DuckDB's ``fts``
+    extension would have to rebuild its whole index after every change.
+    """
+
+    def __init__(
+        self, conn: DuckDBPyConnection, k1: float = BM25_K1, b: float = BM25_B
+    ) -> None:
+        self.conn = conn
+        self.k1 = k1
+        self.b = b
+
+    def initialize_schema(self) -> None:
+        """Create the postings tables and index any chunks that predate them"""
+        try:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_terms (
+                    chunk_id INT,
+                    term TEXT,
+                    tf INT
+                );
+                CREATE INDEX IF NOT EXISTS chunk_terms_term_idx ON chunk_terms (term);
+                CREATE TABLE IF NOT EXISTS chunk_lengths (
+                    chunk_id INT PRIMARY KEY,
+                    length INT
+                );
+            """)
+            self.index_chunks()
+        except Exception as e:
+            logger.error(f"Failed to initialize lexical index: {e}")
+            raise
+
+    def index_chunks(self, chunk_ids: Optional[List[int]] = None) -> None:
+        """Add postings for the given chunks, or for every chunk not yet indexed.
+
+        Duplicate chunks are left out; their canonical chunk is searched instead.
+        """
+        if chunk_ids is None:
+            selection = (
+                "id NOT IN (SELECT chunk_id FROM chunk_lengths) "
+                "AND id NOT IN (SELECT chunk_id FROM chunk_duplicates)"
+            )
+            params: list = []
+        else:
+            selection = "id IN (SELECT unnest(?))"
+            params = [chunk_ids]
+
+        try:
+            self.conn.execute(
+                f"""
+                CREATE OR REPLACE TEMP TABLE _new_terms AS
+                SELECT id AS chunk_id, term, COUNT(*)::INT AS tf
+                FROM (
+                    SELECT id, unnest(regexp_extract_all(lower(chunk_text), ?)) AS term
+                    FROM chunks
+                    WHERE {selection}
+                )
+                GROUP BY ALL""",
+                [TOKEN_PATTERN, *params],
+            )
+            self.conn.execute("""
+                INSERT INTO chunk_terms SELECT chunk_id, term, tf FROM _new_terms;
+                INSERT INTO chunk_lengths
+                SELECT chunk_id, SUM(tf)::INT FROM _new_terms GROUP BY chunk_id;
+                DROP TABLE _new_terms;
+            """)
+        except Exception as e:
+            logger.error(f"Failed to index chunks: {e}")
+            raise
+
+    def remove_documents(self, doc_ids: List[int]) -> None:
+        """Drop postings for every chunk of the given documents"""
+        try:
+            for table in ("chunk_terms", "chunk_lengths"):
+                self.conn.execute(
+                    f"""
+                    DELETE FROM {table} WHERE chunk_id IN (
+                        SELECT id FROM chunks WHERE doc_id IN (SELECT unnest(?))
+                    )""",
+                    [doc_ids],
+                )
+        except Exception as e:
+            logger.error(f"Failed to remove chunks from lexical index: {e}")
+            raise
+
+    def search(self, query_text: str, top_k: int = 20) -> List[Tuple[int, float]]:
+        """Return (chunk_id, BM25 score) for the best matching chunks"""
+        terms = list(set(tokenize(query_text)))
+        if not terms:
+            return []
+
+        try:
+            return self.conn.execute(
+                """
+                WITH query_terms AS (SELECT unnest(?::TEXT[]) AS term),
+                stats AS (
+                    SELECT COUNT(*) AS n, AVG(length) AS avgdl FROM chunk_lengths
+                ),
+                postings AS (
+                    SELECT t.chunk_id, t.term, t.tf
+                    FROM chunk_terms t
+                    JOIN query_terms q ON q.term = t.term
+                ),
+                df AS (
+                    SELECT term, COUNT(*) AS df FROM postings GROUP BY term
+                )
+                SELECT
+                    p.chunk_id,
+                    SUM(
+                        ln(1 + (stats.n - df.df + 0.5) / (df.df + 0.5))
+                        * p.tf * (? + 1)
+                        / (p.tf + ? * (1 - ? + ? * l.length / stats.avgdl))
+                    ) AS score
+                FROM postings p
+                JOIN df ON df.term = p.term
+                JOIN chunk_lengths l ON l.chunk_id = p.chunk_id
+                CROSS JOIN stats
+                GROUP BY p.chunk_id
+                ORDER BY score DESC
+                LIMIT ?""",
+                [terms, self.k1, self.k1, self.b, self.b, top_k],
+            ).fetchall()
+        except Exception as e:
+            logger.error(f"Failed to run lexical search: {e}")
+            raise
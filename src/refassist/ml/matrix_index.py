@@ -0,0 +1,198 @@
+from pathlib import Path
+from typing import List, Optional, Tuple
+import os
+
+import numpy as np
+from duckdb import DuckDBPyConnection
+
+from refassist.log import logger
+
+SEARCH_BACKENDS = ("duckdb", "matrix")
+MATRIX_DTYPES = ("float32", "float16")
+# Rows scored per matrix product, which bounds the float32 copy a float16
+# snapshot needs and the size of the score matrix
+MATRIX_BLOCK_ROWS = 65_536
+
+
+class MatrixIndex:
+    """The embeddings as one normalized matrix, searched in process.
+
+    The ``embeddings`` table is exported to ``vectors-*.npy``, a contiguous
+    ``float32`` or ``float16`` matrix with one normalized row per chunk, and
+    ``chunk_ids-*.npy``, the chunk id of each row in ascending order. Both are
+    memory-mapped rather than read, so startup does no copying and every
+    process serving the same database shares one copy in the page cache.
+    Search is a matrix product against the query vectors followed by
+    ``argpartition`` for the top rows, so a batch of queries costs one pass
+    over the matrix.
+
+    Files are named after the database's ``embedding_version``, which every
+    write to ``embeddings`` bumps. ``refresh`` compares it with the loaded
+    snapshot and exports a new one when they differ; superseded files are
+    removed. Without a ``directory`` the snapshot is simply kept in memory.
+    """
+
+    def __init__(
+        self,
+        conn: DuckDBPyConnection,
+        dim: int,
+        directory: Optional[str] = None,
+        dtype: str = "float32",
+    ) -> None:
+        if dtype not in MATRIX_DTYPES:
+            raise ValueError(f"dtype must be one of {', '.join(MATRIX_DTYPES)}")
+        self.conn = conn
+        self.dim = dim
+        self.directory = Path(directory) if directory else None
+        self.dtype = dtype
+        self.version: Optional[Tuple[str, int]] = None
+        # Swapped as a whole so that searches never see a half-loaded pair
+        self._snapshot: Tuple[np.ndarray, np.ndarray] = (
+            np.empty((0, dim), dtype=dtype),
+            np.empty(0, dtype=np.int32),
+        )
+
+    def __len__(self) -> int:
+        return len(self._snapshot[1])
+
+    def _paths(self, version: Tuple[str, int]) -> Tuple[Path, Path]:
+        stem = f"{version[0]}-{version[1]}-{self.dtype}"
+        return (
+            self.directory / f"vectors-{stem}.npy",
+            self.directory / f"chunk_ids-{stem}.npy",
+        )
+
+    @staticmethod
+    def _current_version(conn: DuckDBPyConnection) -> Tuple[str, int]:
+        snapshot_id, version = conn.execute(
+            "SELECT snapshot_id, version FROM embedding_version"
+        ).fetchone()
+        return snapshot_id, version
+
+    def refresh(self) -> None:
+        """Load the snapshot matching the current embeddings, exporting it if needed"""
+        try:
+            version = self._current_version(self.conn)
+            if version == self.version:
+                return
+
+            if self.directory is None:
+                vectors, chunk_ids, version = self._read()
+            else:
+                try:
+                    vectors, chunk_ids = self._map(version)
+                except FileNotFoundError:
+                    version = self._export()
+                    vectors, chunk_ids = self._map(version)
+
+            self._snapshot = (vectors, chunk_ids)
+            self.version = version
+            logger.info(
+                f"Loaded {len(chunk_ids)} vectors as a {self.dtype} matrix "
+                f"(version {version[1]})"
+            )
+        except Exception as e:
+            logger.error(f"Failed to load vector matrix: {e}")
+            raise
+
+    def _map(self, version: Tuple[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+        vectors_path, ids_path = self._paths(version)
+        # Vectors first: a snapshot is only complete once they exist
+        vectors = np.load(vectors_path, mmap_mode="r")
+        return vectors, np.load(ids_path, mmap_mode="r")
+
+    def _read(self) -> Tuple[np.ndarray, np.ndarray, Tuple[str, int]]:
+        """Normalized vectors, their chunk ids and the version they belong to"""
+        # A transaction on a separate cursor keeps the version and rows
+        # consistent with each other while writers carry on
+        cursor = self.conn.cursor()
+        try:
+            cursor.begin()
+            version = self._current_version(cursor)
+            table = cursor.execute(
+                "SELECT chunk_id, embedding FROM embeddings ORDER BY chunk_id"
+            ).fetch_arrow_table()
+            cursor.commit()
+        finally:
+            cursor.close()
+
+        vectors = np.asarray(
+            table.column("embedding").combine_chunks().flatten(), dtype=np.float32
+        ).reshape(-1, self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.maximum(norms, 1e-12)).astype(self.dtype)
+        chunk_ids = table.column("chunk_id").to_numpy().astype(np.int32)
+        return vectors, chunk_ids, version
+
+    def _export(self) -> Tuple[str, int]:
+        """Write the current embeddings to snapshot files, returning their version"""
+        vectors, chunk_ids, version = self._read()
+        vectors_path, ids_path = self._paths(version)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # The vectors file is written last, so its presence marks a complete
+        # snapshot; renames keep other processes from mapping partial files
+        for path, array in ((ids_path, chunk_ids), (vectors_path, vectors)):
+            partial = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(partial, "wb") as f:
+                np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+            os.replace(partial, path)
+
+        for path in self.directory.glob(f"*-{self.dtype}.npy"):
+            if path not in (vectors_path, ids_path):
+                try:
+                    # Processes still mapping an old snapshot keep their pages
+                    path.unlink()
+                except OSError:
+                    pass
+
+        logger.info(f"Exported {len(chunk_ids)} vectors to {vectors_path}")
+        return version
+
+    def search(self, queries: np.ndarray, top_k: int) -> List[List[Tuple[int, float]]]:
+        """The ``top_k`` (chunk_id, similarity) pairs for each query vector"""
+        self.refresh()
+        vectors, chunk_ids = self._snapshot
+
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.maximum(
+            np.linalg.norm(queries, axis=1, keepdims=True), 1e-12
+        )
+        k = min(top_k, len(chunk_ids))
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(chunk_ids), MATRIX_BLOCK_ROWS):
+            block = np.asarray(
+                vectors[start : start + MATRIX_BLOCK_ROWS], dtype=np.float32
+            )
+            block_rows = np.arange(start, start + len(block))
+            # The best rows so far compete with the block's in one partition
+            scores = np.concatenate([best_scores, queries @ block.T], axis=1)
+            rows = np.concatenate(
+                [best_rows, np.broadcast_to(block_rows, (len(queries), len(block)))],
+                axis=1,
+            )
+            if scores.shape[1] > k:
+                keep = np.argpartition(scores, -k, axis=1)[:, -k:]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [
+            [
+                (int(chunk_id), float(score))
+                for chunk_id, score in zip(chunk_ids[rows], scores)
+            ]
+            for rows, scores in zip(best_rows, best_scores)
+        ]
+
+    def vectors_for(self, chunk_ids: List[int]) -> np.ndarray:
+        """Loaded rows of the given chunks, in order, as float32"""
+        vectors, ids = self._snapshot
+        rows = np.searchsorted(ids, chunk_ids)
+        return np.asarray(vectors[rows], dtype=np.float32)
@@ -0,0 +1,157 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+from duckdb import DuckDBPyConnection
+
+from refassist.log import logger
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+RESCORE_FACTOR = 8
+INT8_MAX = 127
+
+
+class QuantizedIndex:
+    """Compact copies of the embeddings used to shortlist search candidates.
+
+    ``int8`` stores each vector as 384 signed bytes, scaled by a factor that is
+    calibrated on the first vectors indexed, and scores candidates against the
+    unquantized query. ``binary`` keeps one sign bit per dimension in a BIT
+    column and ranks candidates by Hamming distance. The full-precision vectors
+    stay in ``embeddings`` so that the shortlist can be re-scored exactly.
+    """
+
+    def __init__(self, conn: DuckDBPyConnection, mode: str, dim: int) -> None:
+        if mode not in QUANTIZATION_MODES[1:]:
+            raise ValueError(f"mode must be one of {', '.join(QUANTIZATION_MODES[1:])}")
+        self.conn = conn
+        self.mode = mode
+        self.dim = dim
+        self.table = f"embedding_codes_{mode}"
+        self.scale: Optional[float] = None
+
+    @property
+    def code_type(self) -> str:
+        return f"TINYINT[{self.dim}]" if self.mode == "int8" else "BIT"
+
+    @property
+    def code_bytes(self) -> int:
+        """Bytes per stored code"""
+        return self.dim if self.mode == "int8" else self.dim // 8
+
+    def initialize_schema(self) -> None:
+        """Create the code table and encode any embeddings that predate it"""
+        try:
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    chunk_id INT PRIMARY KEY,
+                    code {self.code_type}
+                );
+                CREATE TABLE IF NOT EXISTS quantization_params (
+                    mode TEXT PRIMARY KEY,
+                    scale DOUBLE
+                );
+            """)
+            row = self.conn.execute(
+                "SELECT scale FROM quantization_params WHERE mode = ?", [self.mode]
+            ).fetchone()
+            self.scale = row[0] if row else None
+
+            self.add(
+                self.conn.execute(f"""
+                    SELECT chunk_id, embedding FROM embeddings
+                    WHERE chunk_id NOT IN (SELECT chunk_id FROM {self.table})
+                """).fetch_arrow_table()
+            )
+        except Exception as e:
+            logger.error(f"Failed to initialize {self.mode} quantized index: {e}")
+            raise
+
+    def add(self, embeddings: pa.Table) -> None:
+        """Encode and store codes for a table of (chunk_id, embedding)"""
+        if not embeddings.num_rows:
+            return
+
+        vectors = np.asarray(
+            embeddings.column("embedding").combine_chunks().flatten(), dtype=np.float32
+        ).reshape(-1, self.dim)
+
+        if self.mode == "int8":
+            if self.scale is None:
+                self._calibrate(vectors)
+            codes = pa.FixedSizeListArray.from_arrays(
+                pa.array(self.quantize_int8(vectors).ravel()), self.dim
+            )
+            select = f"code::{self.code_type}"
+        else:
+            codes = pa.array(self.sign_bits(vectors))
+            select = "code::BIT"
+
+        self.conn.register(
+            "_embedding_codes_batch",
+            pa.table({"chunk_id": embeddings.column("chunk_id"), "code": codes}),
+        )
+        try:
+            self.conn.execute(f"""
+                INSERT OR REPLACE INTO {self.table}
+                SELECT chunk_id, {select} FROM _embedding_codes_batch
+            """)
+        except Exception as e:
+            logger.error(f"Failed to store {self.mode} codes: {e}")
+            raise
+        finally:
+            self.conn.unregister("_embedding_codes_batch")
+
+    def _calibrate(self, vectors: np.ndarray) -> None:
+        """Fix the int8 scale so the largest component seen maps to 127"""
+        self.scale = INT8_MAX / max(float(np.abs(vectors).max()), 1e-12)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO quantization_params VALUES (?, ?)",
+            [self.mode, self.scale],
+        )
+
+    def quantize_int8(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(vectors * self.scale), -INT8_MAX, INT8_MAX).astype(np.int8)
+
+    @staticmethod
+    def sign_bits(vectors: np.ndarray) -> List[str]:
+        """One '0'/'1' string per vector, the form DuckDB casts to BIT"""
+        bits = np.where(vectors > 0, ord("1"), ord("0")).astype(np.uint8)
+        return [row.tobytes().decode("ascii") for row in bits]
+
+    def remove_documents(self, doc_ids: List[int]) -> None:
+        """Drop codes for every chunk of the given documents"""
+        try:
+            self.conn.execute(
+                f"""
+                DELETE FROM {self.table} WHERE chunk_id IN (
+                    SELECT id FROM chunks WHERE doc_id IN (SELECT unnest(?))
+                )""",
+                [doc_ids],
+            )
+        except Exception as e:
+            logger.error(f"Failed to remove {self.mode} codes: {e}")
+            raise
+
+    def candidates_sql(self, query_embedding: List[float], limit: int) -> str:
+        """A query selecting the ``limit`` chunk ids nearest to the query by code"""
+        if self.mode == "int8":
+            vector = f"[{', '.join(map(repr, query_embedding))}]::FLOAT[{self.dim}]"
+            distance = f"-array_inner_product(code::FLOAT[{self.dim}], {vector})"
+        else:
+            bits = self.sign_bits(np.asarray([query_embedding], dtype=np.float32))[0]
+            distance = f"bit_count(xor(code, '{bits}'::BIT))"
+
+        return f"""
+            SELECT chunk_id FROM {self.table}
+            ORDER BY {distance}
+            LIMIT {int(limit)}"""
+
+    def footprint(self) -> Dict[str, int]:
+        """Stored vector count and payload bytes of the codes vs. float32 vectors"""
+        count = self.conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {
+            "vectors": count,
+            "code_bytes": count * self.code_bytes,
+            "float32_bytes": count * self.dim * 4,
+        }
@@ -1,71 +1,340 @@
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional, Dict, TYPE_CHECKING
+from datetime import datetime
 from pathlib import Path
+import copy
+import threading
+import time
 
-from llama_index.core import SimpleDirectoryReader, Document
-from refassist.ml.vectordb import VectorDB
+from refassist.loader import DocumentLoader
+from refassist.models import Document as SourceDocument
+from refassist.ml.vectordb import VectorDB, EMBED_BATCH_SIZE
+from refassist.ml.workers import IngestPool
+from refassist.ml.rerank import (
+    Reranker,
+    RERANK_BUDGET,
+    RERANK_CANDIDATES,
+    RERANK_TOP_K,
+)
+from refassist.ml.diversity import COLLAPSE_MODES, MMR_CANDIDATES, MMR_LAMBDA
+from refassist.metrics import metrics
 from refassist.log import logger
 
+if TYPE_CHECKING:
+    from llama_index.core import Document
+
+RETRIEVAL_MODES = ("vector", "hybrid")
+SIMILARITY_THRESHOLD = 0.7
+
 
 class RAGService:
-    def __init__(self, db_path: Optional[str] = None):
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        embed_batch_size: int = EMBED_BATCH_SIZE,
+        retrieval: str = "vector",
+        vector_weight: float = 1.0,
+        lexical_weight: float = 1.0,
+        chunk_workers: int = 0,
+        embed_workers: int = 0,
+        torch_threads: Optional[int] = None,
+        quantization: str = "none",
+        embedding_backend: str = "torch",
+        dedup: str = "none",
+        rerank: bool = False,
+        rerank_top_k: int = RERANK_TOP_K,
+        rerank_candidates: int = RERANK_CANDIDATES,
+        rerank_budget: float = RERANK_BUDGET,
+        mmr: bool = False,
+        mmr_lambda: float = MMR_LAMBDA,
+        mmr_candidates: int = MMR_CANDIDATES,
+        mmr_collapse: str = "none",
+        search_backend: str = "duckdb",
+        matrix_dtype: str = "float32",
+    ):
+        if retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"retrieval must be one of {', '.join(RETRIEVAL_MODES)}")
+        if mmr_collapse not in COLLAPSE_MODES:
+            raise ValueError(f"mmr_collapse must be one of {', '.join(COLLAPSE_MODES)}")
+        self.retrieval = retrieval
+        # Diversification only applies to vector retrieval, which has the
+        # candidates' embeddings at hand
+        self.mmr_lambda = mmr_lambda if mmr else None
+        self.mmr_candidates = mmr_candidates
+        self.mmr_collapse = mmr_collapse
+        self.vector_weight = vector_weight
+        self.lexical_weight = lexical_weight
+        self.reranker: Optional[Reranker] = None
+        if rerank:
+            self.reranker = Reranker(
+                top_k=rerank_top_k, candidates=rerank_candidates, budget=rerank_budget
+            )
+
         if not db_path:
             # Figure out a better place for this
             db_path = Path(__file__).parent / "app.db"
-        self.vector_db = VectorDB(db_path)
+
+        # Worker processes are only worth their startup cost for large ingests,
+        # so they are off unless asked for
+        self.ingest_pool: Optional[IngestPool] = None
+        if chunk_workers or embed_workers:
+            self.ingest_pool = IngestPool(
+                chunk_workers=chunk_workers,
+                embed_workers=embed_workers,
+                torch_threads=torch_threads,
+                embed_batch_size=embed_batch_size,
+                embedding_backend=embedding_backend,
+            )
+
+        self.vector_db = VectorDB(
+            db_path,
+            embed_batch_size=embed_batch_size,
+            ingest_pool=self.ingest_pool,
+            quantization=quantization,
+            embedding_backend=embedding_backend,
+            dedup=dedup,
+            search_backend=search_backend,
+            matrix_dtype=matrix_dtype,
+        )
+        self.in_memory = False
+        self._document_hashes: Dict[str, str] = {}
+        # Shared with cursor views, so that they never write concurrently
+        self._sync_lock = threading.Lock()
 
     def initialize(self, documents_path: str, in_memory: bool = False) -> None:
         """Initialize the RAG service with documents."""
         try:
             # Connect to vector database
             self.vector_db.connect(in_memory=in_memory)
-
-            # Load documents
-            documents = self._load_documents(documents_path)
+            self.in_memory = in_memory
 
             # Process documents and create embeddings
             # Split to save on processing if we're just
             # doing it in memory
             if in_memory:
-                self.vector_db.process_documents_memory(documents)
-                self.vector_db.close()
+                self._document_hashes = {}
+                self.vector_db.process_documents_memory(
+                    self._record_hashes(
+                        DocumentLoader.stream_documentation(documents_path),
+                        self._document_hashes,
+                    )
+                )
+                self.vector_db.create_embeddings_memory()
             else:
-                self.vector_db.process_documents(documents)
-                self.vector_db.create_embeddings()
+                self.sync(documents_path)
 
         except Exception as e:
             logger.error(f"Failed to initialize RAG service: {e}")
             raise
 
-    def query(self, query_text: str, top_k: int = 5) -> List[dict]:
-        """Query the RAG system with a question."""
+    def sync(self, documents_path: str) -> Dict[str, int]:
+        """Incrementally bring the persistent index in line with the files on disk.
+
+        Files are compared against the manifest by size and mtime first, so
+        only new or modified files are read, chunked and embedded. Files that
+        have disappeared are removed from the index. All changes are applied
+        in one transaction, and syncs from different cursors are serialized.
+        With deduplication on, the stats also count the duplicate chunks found
+        and the embeddings they saved.
+        """
         try:
-            rag_matches = self.vector_db.rag_query(
-                query_text=query_text, top_k=top_k, similarity_threshold=0.7
+            start = time.perf_counter()
+            deduplicator = self.vector_db.deduplicator
+            dedup_before = deduplicator.stats() if deduplicator else None
+
+            with self._sync_lock, self.vector_db.transaction():
+                scanned = {
+                    str(path): (path, size, mtime)
+                    for path, size, mtime in DocumentLoader.scan(documents_path)
+                }
+                manifest = self.vector_db.get_manifest()
+
+                deleted = [path for path in manifest if path not in scanned]
+                changed = [
+                    entry
+                    for path, entry in scanned.items()
+                    if path not in manifest or manifest[path][:2] != entry[1:]
+                ]
+
+                self.vector_db.remove_files(deleted)
+
+                if changed:
+                    # Files are streamed straight into the index; only their
+                    # hashes are kept for the manifest
+                    hashes: Dict[str, str] = {}
+                    self.vector_db.process_documents(
+                        self._record_hashes(DocumentLoader.stream_files(changed), hashes)
+                    )
+                    self.vector_db.create_embeddings()
+                    self.vector_db.update_manifest(
+                        [
+                            (str(path), size, mtime, hashes[str(path)])
+                            for path, size, mtime in changed
+                        ]
+                    )
+
+            stats = {
+                "scanned": len(scanned),
+                "changed": len(changed),
+                "deleted": len(deleted),
+            }
+            logger.info(
+                f"Synced {stats['scanned']} files in {time.perf_counter() - start:.2f}s "
+                f"({stats['changed']} changed, {stats['deleted']} deleted)"
             )
-            doc_ids = list(set(match["doc_id"] for match in rag_matches))
+            if deduplicator:
+                stats.update(deduplicator.savings(dedup_before))
+                logger.info(
+                    f"Deduplicated {stats['duplicate_chunks']} exact and "
+                    f"{stats['near_duplicate_chunks']} near-duplicate chunks, saving "
+                    f"{stats['embedding_bytes_saved'] / 1024:.0f} KiB of embeddings"
+                )
+            return stats
+
+        except Exception as e:
+            logger.error(f"Failed to sync documents: {e}")
+            raise
 
-            return self.vector_db.retrieve_rag_docs(doc_ids)
+    def query(
+        self,
+        query_text: str,
+        top_k: int = 5,
+        query_embedding: Optional[List[float]] = None,
+    ) -> List[dict]:
+        """Query the RAG system with a question, returning the matched chunks.
+
+        With reranking on, a larger candidate pool is retrieved and only the
+        reranker's ``top_k`` best chunks are returned. With MMR on, vector
+        retrieval picks its chunks for variety as well as relevance.
+        """
+        try:
+            top_k = self._retrieval_depth(top_k)
+
+            if self.retrieval == "hybrid":
+                matches = self.vector_db.hybrid_query(
+                    query_text=query_text,
+                    top_k=top_k,
+                    vector_weight=self.vector_weight,
+                    lexical_weight=self.lexical_weight,
+                    query_embedding=query_embedding,
+                )
+            else:
+                matches = self.vector_db.rag_query(
+                    query_text=query_text,
+                    top_k=top_k,
+                    similarity_threshold=SIMILARITY_THRESHOLD,
+                    query_embedding=query_embedding,
+                    mmr_lambda=self.mmr_lambda,
+                    mmr_candidates=self._mmr_pool(top_k),
+                    collapse=self.mmr_collapse,
+                )
+
+            if self.reranker:
+                return self.reranker.rerank(query_text, matches)
+            return matches
 
         except Exception as e:
             logger.error(f"Failed to query RAG system: {e}")
             raise
 
-    @staticmethod
-    def _load_documents(documents_path: str) -> List[Document]:
-        """Load documents from the specified path."""
+    def _retrieval_depth(self, top_k: int) -> int:
+        """Chunks to retrieve so that the reranker has its candidate pool"""
+        return max(top_k, self.reranker.candidates) if self.reranker else top_k
+
+    def _mmr_pool(self, depth: int) -> int:
+        """Chunks MMR picks ``depth`` from, so that it always has some to skip"""
+        # A reranker's candidate pool can be as deep as ``mmr_candidates``
+        return max(self.mmr_candidates, 2 * depth)
+
+    def query_batch(self, query_texts: List[str], top_k: int = 5) -> List[List[dict]]:
+        """Query several questions, embedding all of them in one model pass.
+
+        With the ``matrix`` search backend, vector retrieval also scores all
+        of them in one matrix product.
+        """
         try:
-            reader = SimpleDirectoryReader(
-                documents_path, required_exts=[".md"], recursive=True
-            )
-            return reader.load_data()
+            with metrics.span("query_embedding"):
+                embeddings = self.vector_db.embed_model.get_text_embedding_batch(
+                    list(query_texts)
+                )
+
+            if self.retrieval == "vector" and self.vector_db.matrix_index is not None:
+                batches = self.vector_db.rag_query_batch(
+                    query_texts,
+                    top_k=self._retrieval_depth(top_k),
+                    similarity_threshold=SIMILARITY_THRESHOLD,
+                    query_embeddings=embeddings,
+                    mmr_lambda=self.mmr_lambda,
+                    mmr_candidates=self._mmr_pool(self._retrieval_depth(top_k)),
+                    collapse=self.mmr_collapse,
+                )
+                if self.reranker:
+                    return [
+                        self.reranker.rerank(text, matches)
+                        for text, matches in zip(query_texts, batches)
+                    ]
+                return batches
+
+            return [
+                self.query(text, top_k=top_k, query_embedding=embedding)
+                for text, embedding in zip(query_texts, embeddings)
+            ]
+
         except Exception as e:
-            logger.error(f"Failed to load documents: {e}")
+            logger.error(f"Failed to batch query RAG system: {e}")
             raise
 
+    def cursor(self) -> "RAGService":
+        """A view of the service on its own database cursor.
+
+        Used to run queries, or a background sync, from another thread; the
+        view shares the embedding model, and closing it only closes its cursor.
+        """
+        view = copy.copy(self)
+        view.vector_db = self.vector_db.cursor()
+        view.ingest_pool = None
+        return view
+
+    def document_hashes(self) -> Dict[str, str]:
+        """Content hash of every indexed file, keyed by path"""
+        if self.in_memory:
+            return dict(self._document_hashes)
+        # Read on a cursor of its own: a sync may be writing on the main
+        # connection from another thread, inside an uncommitted transaction
+        view = self.vector_db.cursor()
+        try:
+            manifest = view.get_manifest()
+        finally:
+            view.close()
+        return {path: content_hash for path, (_, _, content_hash) in manifest.items()}
+
+    @staticmethod
+    def _record_hashes(
+        documents: Iterable[SourceDocument], hashes: Dict[str, str]
+    ) -> Iterator["Document"]:
+        """Convert streamed documents, noting each one's content hash on the way"""
+        for doc in documents:
+            hashes[str(doc.path)] = VectorDB._compute_hash(doc.content)
+            yield RAGService._to_llama_document(doc)
+
+    @staticmethod
+    def _to_llama_document(document: SourceDocument) -> "Document":
+        """Convert a loaded document into the form the node parser expects."""
+        from llama_index.core import Document
+
+        return Document(
+            text=document.content,
+            metadata={
+                "file_path": str(document.path),
+                "last_modified": datetime.fromtimestamp(document.metadata["modified"]),
+            },
+        )
+
     def close(self) -> None:
         """Close the vector database connection."""
         try:
             self.vector_db.close()
+            if self.ingest_pool:
+                self.ingest_pool.close()
         except Exception as e:
             logger.error(f"Failed to close RAG service: {e}")
             raise
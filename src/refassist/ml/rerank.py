@@ -0,0 +1,145 @@
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import threading
+import time
+
+from refassist.metrics import metrics
+from refassist.log import logger
+
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_CANDIDATES = 20
+RERANK_TOP_K = 3
+RERANK_BATCH_SIZE = 8
+RERANK_BUDGET = 0.3
+RERANK_CACHE_SIZE = 10_000
+
+
+class Reranker:
+    """Re-orders retrieved chunks with a cross-encoder and keeps the best few.
+
+    The bi-encoder search supplies a candidate pool; each (query, chunk) pair
+    is then scored jointly by a small CPU cross-encoder, in batches taken in
+    the pool's original order. Scores are cached per (query, chunk id), so a
+    repeated question costs no model time. When scoring runs past ``budget``
+    seconds the remaining candidates are left unscored and ranked after the
+    scored ones in their original order, so a loaded machine gets a partial
+    rerank rather than a slow answer.
+
+    Kept matches carry the raw cross-encoder logit as ``rerank_score`` and a
+    reciprocal-rank ``score``, which ``ContextBuilder`` ranks by.
+    """
+
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        top_k: int = RERANK_TOP_K,
+        candidates: int = RERANK_CANDIDATES,
+        batch_size: int = RERANK_BATCH_SIZE,
+        budget: float = RERANK_BUDGET,
+        cache_size: int = RERANK_CACHE_SIZE,
+    ) -> None:
+        if top_k < 1 or candidates < top_k:
+            raise ValueError("need 1 <= top_k <= candidates")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        self.model_name = model_name
+        self.top_k = top_k
+        self.candidates = candidates
+        self.batch_size = batch_size
+        self.budget = budget
+        self.cache_size = cache_size
+        self._model: Optional[Any] = None
+        self._cache: "OrderedDict[Tuple[str, int], float]" = OrderedDict()
+        # Server retrieval threads share one reranker
+        self._lock = threading.Lock()
+        self.scored = 0
+        self.cache_hits = 0
+        self.over_budget = 0
+
+    @property
+    def model(self) -> Any:
+        """Cross-encoder, loaded on first use"""
+        if self._model is None:
+            self._model = self._setup_model()
+        return self._model
+
+    def _setup_model(self) -> Any:
+        from sentence_transformers import CrossEncoder
+
+        logger.info(f"Loading reranking model {self.model_name}")
+        return CrossEncoder(self.model_name, device="cpu")
+
+    def _cached(self, key: Tuple[str, int]) -> Optional[float]:
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _store(self, keys: List[Tuple[str, int]], scores: List[float]) -> None:
+        with self._lock:
+            self._cache.update(zip(keys, scores))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def rerank(self, query: str, matches: List[dict]) -> List[dict]:
+        """The ``top_k`` best of ``matches``, ordered by cross-encoder score"""
+        if not matches:
+            return []
+
+        with metrics.span("rerank"):
+            start = time.perf_counter()
+            scores: Dict[int, float] = {}
+            pending: List[int] = []
+            for position, match in enumerate(matches):
+                score = self._cached((query, match["chunk_id"]))
+                if score is None:
+                    pending.append(position)
+                else:
+                    scores[position] = score
+            self.cache_hits += len(scores)
+
+            for offset in range(0, len(pending), self.batch_size):
+                if time.perf_counter() - start >= self.budget:
+                    self.over_budget += 1
+                    metrics.incr("rerank_over_budget")
+                    logger.warning(
+                        f"Reranking over budget, {len(pending) - offset} "
+                        "candidates left in retrieval order"
+                    )
+                    break
+
+                batch = pending[offset : offset + self.batch_size]
+                predicted = self.model.predict(
+                    [(query, matches[position]["chunk_text"]) for position in batch],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False,
+                )
+                predicted = [float(score) for score in predicted]
+                self._store(
+                    [(query, matches[position]["chunk_id"]) for position in batch],
+                    predicted,
+                )
+                scores.update(zip(batch, predicted))
+                self.scored += len(batch)
+
+            # Scored candidates first, best first; the rest keep their order
+            order = sorted(scores, key=scores.get, reverse=True) + [
+                position for position in range(len(matches)) if position not in scores
+            ]
+            return [
+                {
+                    **matches[position],
+                    "rerank_score": scores.get(position),
+                    "score": 1 / rank,
+                }
+                for rank, position in enumerate(order[: self.top_k], start=1)
+            ]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "scored": self.scored,
+            "cache_hits": self.cache_hits,
+            "over_budget": self.over_budget,
+        }
@@ -1,33 +1,146 @@
-from typing import Optional, List, Set
+from typing import (
+    Callable,
+    Optional,
+    List,
+    Set,
+    Tuple,
+    Dict,
+    Iterable,
+    Iterator,
+    TYPE_CHECKING,
+)
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from itertools import batched
+import copy
 import hashlib
-import torch
+import time
 import duckdb
+import numpy as np
+import pyarrow as pa
 from duckdb import DuckDBPyConnection
-from duckdb.typing import DuckDBPyType
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.core import Document
-from llama_index.core.node_parser import SentenceSplitter
-from sympy.integrals.meijerint_doc import doc
 
+from refassist.ml.embedding import (
+    EMBEDDING_BACKENDS,
+    cache_model_name,
+    load_embedding_model,
+)
+from refassist.ml.embedding_cache import EmbeddingCache, EMBED_CACHE_SIZE
+from refassist.ml.quantization import QuantizedIndex, QUANTIZATION_MODES, RESCORE_FACTOR
+from refassist.ml.lexical import LexicalIndex, reciprocal_rank_fusion, RRF_K
+from refassist.ml.dedup import ChunkDeduplicator, DEDUP_MODES
+from refassist.ml.diversity import mmr_select, MMR_CANDIDATES
+from refassist.ml.matrix_index import MatrixIndex, MATRIX_DTYPES, SEARCH_BACKENDS
+from refassist.metrics import metrics
 from refassist.log import logger
 
-ARRAY_TYPE = DuckDBPyType(list[float])
+# torch and llama_index take seconds to import, so they are only loaded
+# once a model or splitter is actually needed
+if TYPE_CHECKING:
+    from llama_index.core import Document
+    from llama_index.core.node_parser import SentenceSplitter
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+    from refassist.ml.workers import IngestPool
+
+EMBEDDING_DIM = 384
+ARRAY_TYPE = f"FLOAT[{EMBEDDING_DIM}]"
 CHUNK_SIZE = 1024
 CHUNK_OVERLAP = 200
 MODEL_NAME = "BAAI/bge-small-en-v1.5"
+EMBED_BATCH_SIZE = 64
+INGEST_BATCH_SIZE = 256
+HNSW_INDEX_NAME = "embeddings_hnsw_idx"
+HNSW_METRIC = "ip"
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 128
+HNSW_EF_SEARCH = 64
+HYBRID_CANDIDATES = 20
+# Other files holding a duplicate of chunk ``c``, for citing alongside it
+DUPLICATE_FILES_SQL = """(
+    SELECT list_sort(list_distinct(list(dd.file)))
+    FROM chunk_duplicates cd
+    JOIN chunks dc ON dc.id = cd.chunk_id
+    JOIN documents dd ON dd.id = dc.doc_id
+    WHERE cd.canonical_id = c.id AND dd.file != d.file
+)"""
 
 
 class VectorDB:
-    def __init__(self, db_path: Optional[str] = None):
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        embed_batch_size: int = EMBED_BATCH_SIZE,
+        hnsw_m: int = HNSW_M,
+        hnsw_ef_construction: int = HNSW_EF_CONSTRUCTION,
+        hnsw_ef_search: int = HNSW_EF_SEARCH,
+        embed_cache_size: int = EMBED_CACHE_SIZE,
+        ingest_pool: Optional["IngestPool"] = None,
+        quantization: str = "none",
+        rescore_factor: int = RESCORE_FACTOR,
+        embedding_backend: str = "torch",
+        dedup: str = "none",
+        search_backend: str = "duckdb",
+        matrix_dtype: str = "float32",
+    ):
+        if embed_batch_size < 1:
+            raise ValueError("embed_batch_size must be at least 1")
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(
+                f"quantization must be one of {', '.join(QUANTIZATION_MODES)}"
+            )
+        if embedding_backend not in EMBEDDING_BACKENDS:
+            raise ValueError(
+                f"embedding_backend must be one of {', '.join(EMBEDDING_BACKENDS)}"
+            )
+        if dedup not in DEDUP_MODES:
+            raise ValueError(f"dedup must be one of {', '.join(DEDUP_MODES)}")
+        if search_backend not in SEARCH_BACKENDS:
+            raise ValueError(
+                f"search_backend must be one of {', '.join(SEARCH_BACKENDS)}"
+            )
+        if matrix_dtype not in MATRIX_DTYPES:
+            raise ValueError(f"matrix_dtype must be one of {', '.join(MATRIX_DTYPES)}")
+
         self.db_path = db_path
+        self.embed_batch_size = embed_batch_size
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+        self.embed_cache_size = embed_cache_size
+        # Optional worker processes for chunking and embedding; this
+        # instance stays the only writer either way
+        self.ingest_pool = ingest_pool
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.embedding_backend = embedding_backend
+        self.dedup = dedup
+        self.search_backend = search_backend
+        self.matrix_dtype = matrix_dtype
         self.conn: Optional[DuckDBPyConnection] = None
-        self.device = "cpu"
-        if torch.cuda.is_available():
-            self.device = "cuda"  # Nvidia GPUs
-        elif torch.backends.mps.is_available():
-            self.device = "mps"  # Apple Silicon / MLX
-        self.embed_model = self._setup_embedding_model()
-        self.node_parser = self._setup_node_parser()
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        self.lexical_index: Optional[LexicalIndex] = None
+        self.quantized_index: Optional[QuantizedIndex] = None
+        self.deduplicator: Optional[ChunkDeduplicator] = None
+        self.matrix_index: Optional[MatrixIndex] = None
+        self._embed_model: Optional["HuggingFaceEmbedding"] = None
+        self._node_parser: Optional["SentenceSplitter"] = None
+        self._in_transaction = False
+        self._compact_pending = False
+
+    @property
+    def embed_model(self) -> "HuggingFaceEmbedding":
+        """Embedding model, loaded on first use"""
+        if self._embed_model is None:
+            self._embed_model = self._setup_embedding_model()
+        return self._embed_model
+
+    @property
+    def node_parser(self) -> "SentenceSplitter":
+        """Sentence splitter, built on first use"""
+        if self._node_parser is None:
+            self._node_parser = self._setup_node_parser()
+        return self._node_parser
 
     def connect(self, in_memory: bool = False) -> None:
         """Connect to DuckDB instance"""
@@ -39,15 +152,83 @@ class VectorDB:
 
             self._load_extension()
             self._initialize_schema()
+            self._create_vector_index()
+
+            self.embedding_cache = EmbeddingCache(
+                self.conn,
+                cache_model_name(MODEL_NAME, self.embedding_backend),
+                ARRAY_TYPE,
+                max_entries=self.embed_cache_size,
+            )
+            self.embedding_cache.initialize_schema()
+
+            self.lexical_index = LexicalIndex(self.conn)
+            self.lexical_index.initialize_schema()
+
+            if self.quantization != "none":
+                self.quantized_index = QuantizedIndex(
+                    self.conn, self.quantization, EMBEDDING_DIM
+                )
+                self.quantized_index.initialize_schema()
+
+            if self.dedup != "none":
+                self.deduplicator = ChunkDeduplicator(
+                    self.conn, self.dedup, EMBEDDING_DIM
+                )
+                self.deduplicator.initialize_schema()
+
+            if self.search_backend == "matrix":
+                # Snapshots of a persistent database are kept next to it
+                persistent = self.db_path is not None and not in_memory
+                self.matrix_index = MatrixIndex(
+                    self.conn,
+                    EMBEDDING_DIM,
+                    f"{self.db_path}.vectors" if persistent else None,
+                    self.matrix_dtype,
+                )
+                self.matrix_index.refresh()
         except Exception as e:
             logger.error(f"Failed to connect to database: {e}")
             raise
 
+    def cursor(self) -> "VectorDB":
+        """A view of this database on its own DuckDB cursor.
+
+        Views share the settings and the loaded embedding model but not the
+        connection, so each one can serve queries from a different thread.
+        Closing a view only closes its cursor.
+        """
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        view = copy.copy(self)
+        view._embed_model = self.embed_model
+        view.ingest_pool = None
+        view.conn = self.conn.cursor()
+        for helper in (
+            "embedding_cache",
+            "lexical_index",
+            "quantized_index",
+            "deduplicator",
+            "matrix_index",
+        ):
+            bound = getattr(self, helper)
+            if bound is not None:
+                bound = copy.copy(bound)
+                bound.conn = view.conn
+                setattr(view, helper, bound)
+        return view
+
     def close(self) -> None:
         """Close connection to DuckDB instance"""
         if self.conn:
             self.conn.close()
             self.conn = None
+            self.embedding_cache = None
+            self.lexical_index = None
+            self.quantized_index = None
+            self.deduplicator = None
+            self.matrix_index = None
 
     def _load_extension(self) -> None:
         """Load an extension into the DuckDB instance"""
@@ -74,6 +255,12 @@ class VectorDB:
             CREATE SEQUENCE IF NOT EXISTS chunk_id_seq START 1;
             CREATE SEQUENCE IF NOT EXISTS embed_id_seq START 1;""")
 
+            # DuckDB checks foreign keys against rows deleted earlier in the
+            # same transaction, which makes replacing a document atomically
+            # impossible. The removal code path keeps chunks and embeddings
+            # consistent instead, so older databases are rebuilt without them.
+            migrated = self._drop_foreign_keys()
+
             # Create documents table
             self.conn.execute("""
                 CREATE TABLE IF NOT EXISTS documents (
@@ -91,8 +278,7 @@ class VectorDB:
                     id INT PRIMARY KEY,
                     doc_id INT,
                     chunk_text TEXT,
-                    chunk_index INT,
-                    FOREIGN KEY(doc_id) REFERENCES documents(id)
+                    chunk_index INT
                 );
             """)
 
@@ -100,14 +286,149 @@ class VectorDB:
             self.conn.execute(f"""
                 CREATE TABLE IF NOT EXISTS embeddings (
                     chunk_id INT,
-                    embedding {ARRAY_TYPE},
-                    FOREIGN KEY (chunk_id) REFERENCES chunks(id)
+                    embedding {ARRAY_TYPE}
+                );
+            """)
+
+            for table in migrated:
+                self.conn.execute(f"""
+                    INSERT INTO {table} SELECT * FROM _{table}_migrating;
+                    DROP TABLE _{table}_migrating;""")
+
+            # Chunks that repeat another chunk, which holds their embedding
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_duplicates (
+                    chunk_id INT PRIMARY KEY,
+                    canonical_id INT
+                );
+            """)
+
+            # Bumped on every write to embeddings, so that exported matrix
+            # snapshots can tell whether they are current
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_version (
+                    snapshot_id TEXT,
+                    version BIGINT
+                );
+                INSERT INTO embedding_version
+                SELECT gen_random_uuid()::TEXT, 0
+                WHERE NOT EXISTS (SELECT 1 FROM embedding_version);
+            """)
+
+            # Create manifest table used by incremental syncs
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS manifest (
+                    path TEXT PRIMARY KEY,
+                    size BIGINT,
+                    mtime DOUBLE,
+                    content_hash TEXT
                 );
             """)
+
+            # Databases created before embeddings had a fixed size
+            # stored them as FLOAT[], which the HNSW index can't use
+            embedding_type = self.conn.execute("""
+                SELECT data_type FROM information_schema.columns
+                WHERE table_name = 'embeddings' AND column_name = 'embedding'
+            """).fetchone()
+            if embedding_type and embedding_type[0] != ARRAY_TYPE:
+                logger.info(f"Migrating embeddings column to {ARRAY_TYPE}")
+                self.conn.execute(
+                    f"ALTER TABLE embeddings ALTER COLUMN embedding SET DATA TYPE {ARRAY_TYPE}"
+                )
         except Exception as e:
             logger.error(f"Failed to initialize schema: {e}")
             raise
 
+    def _drop_foreign_keys(self) -> List[str]:
+        """Move chunks and embeddings aside if they were created with foreign keys.
+
+        Returns the tables moved; they are recreated by the schema and
+        refilled from ``_<table>_migrating``.
+        """
+        constrained = self.conn.execute("""
+            SELECT DISTINCT table_name FROM duckdb_constraints()
+            WHERE constraint_type = 'FOREIGN KEY'
+                AND table_name IN ('chunks', 'embeddings')""").fetchall()
+        if not constrained:
+            return []
+
+        logger.info("Rebuilding chunks and embeddings without foreign keys")
+        # Referencing tables are dropped before the tables they reference
+        tables = ["embeddings", "chunks"]
+        for table in tables:
+            self.conn.execute(f"""
+                CREATE TEMP TABLE _{table}_migrating AS SELECT * FROM {table}""")
+        for table in tables:
+            self.conn.execute(f"DROP TABLE {table}")
+        return tables[::-1]
+
+    def _create_vector_index(self) -> None:
+        """Create the HNSW index over embeddings and set its search depth"""
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        try:
+            # The index is maintained by DuckDB on every insert and delete,
+            # so it only has to be created once per database
+            self.conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS {HNSW_INDEX_NAME}
+                ON embeddings USING HNSW (embedding)
+                WITH (
+                    metric = '{HNSW_METRIC}',
+                    M = {int(self.hnsw_m)},
+                    ef_construction = {int(self.hnsw_ef_construction)}
+                )
+            """)
+            self.conn.execute(f"SET hnsw_ef_search = {int(self.hnsw_ef_search)}")
+        except Exception as e:
+            logger.error(f"Failed to create vector index: {e}")
+            raise
+
+    def compact_vector_index(self) -> None:
+        """Reclaim HNSW index space left behind by deleted embeddings"""
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+        if self._in_transaction:
+            self._compact_pending = True
+            return
+
+        try:
+            self.conn.execute(f"PRAGMA hnsw_compact_index('{HNSW_INDEX_NAME}')")
+        except Exception as e:
+            logger.error(f"Failed to compact vector index: {e}")
+            raise
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Apply the enclosed writes atomically.
+
+        Readers on other cursors keep seeing the previous state until the
+        transaction commits, so a document is never visible half-replaced.
+        Index compaction requested inside is run once, after the commit.
+        """
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        self.conn.begin()
+        self._in_transaction = True
+        try:
+            yield
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self._compact_pending = False
+            if self.deduplicator:
+                # Forget canonical chunks registered by the rolled back writes
+                self.deduplicator.load()
+            raise
+        finally:
+            self._in_transaction = False
+
+        if self._compact_pending:
+            self._compact_pending = False
+            self.compact_vector_index()
+
     @staticmethod
     def _compute_hash(text: str) -> str:
         """Compute hash of document content"""
@@ -130,41 +451,238 @@ class VectorDB:
             logger.error(f"Failed to get existing document hashes: {e}")
             raise
 
-    def _remove_old_data(self, doc_id: int) -> None:
-        """Delete chunks and embeddings of a document"""
+    def _get_existing_file_hashes(self) -> Dict[str, Optional[str]]:
+        """Get mapping of file path to stored content hash"""
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        try:
+            results = self.conn.execute(
+                "SELECT file, content_hash FROM documents"
+            ).fetchall()
+            return {row[0]: row[1] for row in results}
+
+        except Exception as e:
+            logger.error(f"Failed to get existing file hashes: {e}")
+            raise
+
+    def _get_existing_doc_ids(self) -> Dict[str, int]:
+        """Get mapping of file path to document id"""
         if not self.conn:
             raise RuntimeError("Database connection not established")
 
         try:
+            results = self.conn.execute("SELECT file, id FROM documents").fetchall()
+            return {row[0]: row[1] for row in results}
+
+        except Exception as e:
+            logger.error(f"Failed to get existing document ids: {e}")
+            raise
+
+    def _reserve_ids(self, sequence: str, count: int) -> List[int]:
+        """Draw a block of ids from a sequence in a single statement"""
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        rows = self.conn.execute(
+            f"SELECT nextval('{sequence}') FROM range(?)", [count]
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def _remove_old_data(self, doc_ids: List[int]) -> None:
+        """Delete chunks and embeddings of documents"""
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        try:
+            self._promote_duplicates(doc_ids)
+
+            self.lexical_index.remove_documents(doc_ids)
+            if self.quantized_index:
+                self.quantized_index.remove_documents(doc_ids)
+            if self.deduplicator:
+                self.deduplicator.remove_documents(doc_ids)
+
+            self.conn.execute(
+                """
+            DELETE FROM chunk_duplicates
+            WHERE chunk_id IN (
+            SELECT id FROM chunks WHERE doc_id IN (SELECT unnest(?))
+            )""",
+                [doc_ids],
+            )
+
             self.conn.execute(
                 """
             DELETE FROM embeddings
             WHERE chunk_id IN (
-            SELECT id FROM chunks WHERE doc_id = ?
+            SELECT id FROM chunks WHERE doc_id IN (SELECT unnest(?))
             )""",
-                [doc_id],
+                [doc_ids],
             )
+            self._bump_embedding_version()
 
             self.conn.execute(
-                """"
-            DELETE FROM chunks WHERE doc_id = ?""",
-                [doc_id],
+                """
+            DELETE FROM chunks WHERE doc_id IN (SELECT unnest(?))""",
+                [doc_ids],
             )
 
         except Exception as e:
             logger.error(f"Failed to remove old data: {e}")
             raise
 
-    def _setup_embedding_model(self) -> HuggingFaceEmbedding:
-        """Set up vector embedding model"""
-        return HuggingFaceEmbedding(
-            model_name=MODEL_NAME,
-            device=self.device,
+    def _promote_duplicates(self, doc_ids: List[int]) -> None:
+        """Keep duplicates of chunks about to be removed searchable.
+
+        For each canonical chunk of the removed documents that still has
+        duplicates elsewhere, the lowest-id survivor takes over its embedding,
+        quantized code, postings and signature, and the others point at it.
+        """
+        promotions = self.conn.execute(
+            """
+            SELECT cd.canonical_id AS old_id, MIN(cd.chunk_id) AS new_id
+            FROM chunk_duplicates cd
+            JOIN chunks c ON c.id = cd.chunk_id
+            WHERE c.doc_id NOT IN (SELECT unnest(?))
+                AND cd.canonical_id IN (
+                    SELECT id FROM chunks WHERE doc_id IN (SELECT unnest(?))
+                )
+            GROUP BY cd.canonical_id""",
+            [doc_ids, doc_ids],
+        ).fetch_arrow_table()
+        if not promotions.num_rows:
+            return
+
+        self.conn.register("_promotions", promotions)
+        try:
+            self.conn.execute("""
+                UPDATE chunk_duplicates SET canonical_id = p.new_id
+                FROM _promotions p
+                WHERE chunk_duplicates.canonical_id = p.old_id;
+                DELETE FROM chunk_duplicates
+                WHERE chunk_id IN (SELECT new_id FROM _promotions);""")
+            embeddings = self.conn.execute("""
+                SELECT p.new_id AS chunk_id, e.embedding
+                FROM embeddings e
+                JOIN _promotions p ON p.old_id = e.chunk_id""").fetch_arrow_table()
+            promoted = self.conn.execute("""
+                SELECT id, chunk_text FROM chunks
+                WHERE id IN (SELECT new_id FROM _promotions)""").fetchall()
+        finally:
+            self.conn.unregister("_promotions")
+
+        self._insert_arrow("embeddings", embeddings)
+        self._bump_embedding_version()
+        if self.quantized_index:
+            self.quantized_index.add(embeddings)
+        new_ids = [chunk_id for chunk_id, _ in promoted]
+        self.lexical_index.index_chunks(new_ids)
+        if self.deduplicator:
+            self.deduplicator.adopt(new_ids, [text for _, text in promoted])
+        logger.info(f"Promoted {len(new_ids)} duplicate chunks to canonical")
+
+    def get_manifest(self) -> Dict[str, Tuple[int, float, str]]:
+        """Get the recorded (size, mtime, hash) of every synced file"""
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        try:
+            results = self.conn.execute(
+                "SELECT path, size, mtime, content_hash FROM manifest"
+            ).fetchall()
+            return {row[0]: (row[1], row[2], row[3]) for row in results}
+
+        except Exception as e:
+            logger.error(f"Failed to get manifest: {e}")
+            raise
+
+    def update_manifest(self, entries: List[Tuple[str, int, float, str]]) -> None:
+        """Record the (path, size, mtime, hash) of synced files"""
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+        if not entries:
+            return
+
+        try:
+            paths, sizes, mtimes, hashes = zip(*entries)
+            self.conn.register(
+                "_manifest_entries",
+                pa.table(
+                    {
+                        "path": list(paths),
+                        "size": pa.array(sizes, type=pa.int64()),
+                        "mtime": pa.array(mtimes, type=pa.float64()),
+                        "content_hash": list(hashes),
+                    }
+                ),
+            )
+            self.conn.execute("""
+                INSERT OR REPLACE INTO manifest (path, size, mtime, content_hash)
+                SELECT path, size, mtime, content_hash FROM _manifest_entries""")
+
+        except Exception as e:
+            logger.error(f"Failed to update manifest: {e}")
+            raise
+        finally:
+            self.conn.unregister("_manifest_entries")
+
+    def remove_files(self, paths: List[str]) -> None:
+        """Garbage-collect documents, chunks and embeddings of deleted files"""
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+        if not paths:
+            return
+
+        try:
+            doc_ids = [
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT id FROM documents WHERE file IN (SELECT unnest(?))", [paths]
+                ).fetchall()
+            ]
+            if doc_ids:
+                self._remove_old_data(doc_ids)
+                self.conn.execute(
+                    "DELETE FROM documents WHERE id IN (SELECT unnest(?))", [doc_ids]
+                )
+                self.compact_vector_index()
+
+            self.conn.execute(
+                "DELETE FROM manifest WHERE path IN (SELECT unnest(?))", [paths]
+            )
+            logger.info(f"Removed {len(paths)} deleted files from the index")
+
+        except Exception as e:
+            logger.error(f"Failed to remove files: {e}")
+            raise
+
+    @staticmethod
+    def _detect_device() -> str:
+        """Pick the fastest available torch device"""
+        import torch
+
+        if torch.cuda.is_available():
+            return "cuda"  # Nvidia GPUs
+        elif torch.backends.mps.is_available():
+            return "mps"  # Apple Silicon / MLX
+        return "cpu"
+
+    def _setup_embedding_model(self) -> "HuggingFaceEmbedding":
+        """Set up vector embedding model on the configured backend"""
+        logger.info(f"Loading embedding model {MODEL_NAME} ({self.embedding_backend})")
+        return load_embedding_model(
+            self.embedding_backend,
+            MODEL_NAME,
+            self.embed_batch_size,
+            device=self._detect_device() if self.embedding_backend == "torch" else None,
         )
 
     @staticmethod
-    def _setup_node_parser() -> SentenceSplitter:
+    def _setup_node_parser() -> "SentenceSplitter":
         """Set up tokenizer"""
+        from llama_index.core.node_parser import SentenceSplitter
+
         return SentenceSplitter(
             chunk_size=CHUNK_SIZE,
             chunk_overlap=CHUNK_OVERLAP,
@@ -172,28 +690,27 @@ class VectorDB:
             paragraph_separator="\n\n",
         )
 
-    def process_documents_memory(self, documents: List[Document]) -> None:
+    def process_documents_memory(self, documents: Iterable["Document"]) -> None:
         """Process documents into chunks for in-memory database"""
         if not self.conn:
             raise RuntimeError("Database connection not established")
 
         try:
-            for i, doc in enumerate(documents):
-                self.conn.execute(
-                    "INSERT INTO documents (id, file, text) VALUES (?, ?, ?)",
-                    [i, str(doc.metadata.get("file_path", "")), doc.text],
+            for batch in batched(documents, INGEST_BATCH_SIZE):
+                doc_ids = self._reserve_ids("doc_id_seq", len(batch))
+                self._insert_arrow(
+                    "documents",
+                    pa.table(
+                        {
+                            "id": pa.array(doc_ids, type=pa.int32()),
+                            "file": [
+                                str(doc.metadata.get("file_path", "")) for doc in batch
+                            ],
+                            "text": [doc.text for doc in batch],
+                        }
+                    ),
                 )
-
-                nodes = self.node_parser.get_nodes_from_documents([doc])
-
-                for chunk_idx, node in enumerate(nodes):
-                    self.conn.execute(
-                        """
-                        INSERT INTO chunks (id, doc_id, chunk_text, chunk_index)
-                        VALUES (( SELECT COALESCE(MAX(id), -1) + 1 FROM chunks), ?, ?, ?)
-                    """,
-                        [i, node.text, chunk_idx],
-                    )
+                self._insert_chunks(list(zip(doc_ids, batch)))
 
         except Exception as e:
             logger.error(f"Failed to process documents: {e}")
@@ -205,75 +722,218 @@ class VectorDB:
             raise RuntimeError("Database connection not established")
 
         try:
-            chunks = self.conn.execute("SELECT id, chunk_text FROM chunks").fetchall()
-
-            for chunk_id, chunk_text in chunks:
-                embedding = self.embed_model.get_text_embedding(chunk_text)
-                self.conn.execute(
-                    "INSERT INTO embeddings (chunk_id, embedding) VALUES (?, ?)",
-                    [chunk_id, embedding],
-                )
+            chunks = self.conn.execute("""
+                SELECT id, chunk_text FROM chunks
+                WHERE id NOT IN (SELECT chunk_id FROM chunk_duplicates)""").fetchall()
+            self._embed_chunks(chunks)
         except Exception as e:
             logger.error(f"Failed to create embeddings: {e}")
             raise
 
-    def process_documents(self, documents: List[Document]) -> None:
+    def process_documents(self, documents: Iterable["Document"]) -> None:
         """Process documents for persistent database"""
         if not self.conn:
             raise RuntimeError("Database connection not established")
 
         try:
-            # This might be backwards, it may be more efficient
-            # to do this logic in the db
+            # Both lookups are loaded once up front so the per-document
+            # checks below never touch the database
             existing_hashes = self._get_existing_doc_hashes()
+            existing_ids = self._get_existing_doc_ids()
+            # With deduplication, copies of a document at other paths are
+            # ingested as well so that their paths can be cited; their chunks
+            # collapse onto the original's. Hashes are unique per document,
+            # so copies are stored without one.
+            file_hashes = self._get_existing_file_hashes() if self.deduplicator else {}
+            replaced_docs = 0
 
-            for doc in documents:
-                content_hash = self._compute_hash(doc.text)
-                file_path = str(doc.metadata.get("file_path", ""))
-                last_modified = doc.metadata.get("last_modified", None)
+            for batch in batched(documents, INGEST_BATCH_SIZE):
+                new_docs: List[Tuple["Document", Optional[str]]] = []
+                updated_docs: List[Tuple[int, "Document", Optional[str]]] = []
 
-                if content_hash in existing_hashes:
-                    logger.info(f"Document {doc.text} has already been processed")
-                    continue
+                for doc in batch:
+                    content_hash = self._compute_hash(doc.text)
+                    file_path = str(doc.metadata.get("file_path", ""))
 
-                existing_doc = self.conn.execute(
-                    """
-                    SELECT id FROM documents WHERE file = ?""",
-                    [file_path],
-                ).fetchone()
-
-                if existing_doc:
-                    doc_id = existing_doc[0]
-                    self._remove_old_data(doc.id)
-
-                    doc_id = self.conn.execute(
-                        """
-                    UPDATE documents SET text = ?, content_hash = ?, last_modified = ?
-                    WHERE id = ?
-                    RETURNING id""",
-                        [doc.text, content_hash, last_modified, doc_id],
-                    ).fetchone()
-                else:
-                    doc_id = self.conn.execute(
-                        """
-                    INSERT INTO documents (id, file, text, content_hash, last_modified)
-                    RETURNING id""",
-                        [file_path, doc.text, content_hash, last_modified],
-                    ).fetchone()
-
-                nodes = self.node_parser.get_nodes_from_documents([doc])
-
-                for chunk_idx, node in enumerate(nodes):
-                    self.conn.execute(
-                        """INSERT INTO chunks (id, doc_id, chunk_text, chunk_index)
-                        VALUES (nextval('chunk_id_seq'), ?, ?, ?)""",
-                        [doc_id, node.text, chunk_idx],
-                    )
+                    if content_hash in existing_hashes:
+                        if (
+                            not self.deduplicator
+                            or file_hashes.get(file_path) == content_hash
+                        ):
+                            logger.info(
+                                f"Document {file_path} has already been processed"
+                            )
+                            continue
+                        stored_hash = None
+                    else:
+                        existing_hashes.add(content_hash)
+                        file_hashes[file_path] = stored_hash = content_hash
+
+                    if file_path in existing_ids:
+                        updated_docs.append((existing_ids[file_path], doc, stored_hash))
+                    else:
+                        new_docs.append((doc, stored_hash))
+
+                if updated_docs:
+                    self._update_documents(updated_docs)
+                    replaced_docs += len(updated_docs)
+
+                new_ids = self._insert_documents(new_docs)
+                for doc_id, (doc, _) in zip(new_ids, new_docs):
+                    existing_ids[str(doc.metadata.get("file_path", ""))] = doc_id
+
+                self._insert_chunks(
+                    [(doc_id, doc) for doc_id, doc, _ in updated_docs]
+                    + list(zip(new_ids, (doc for doc, _ in new_docs)))
+                )
+
+            if replaced_docs:
+                self.compact_vector_index()
 
         except Exception as e:
             logger.error(f"Failed to process documents: {e}")
             raise
 
+    def _insert_documents(
+        self, documents: List[Tuple["Document", Optional[str]]]
+    ) -> List[int]:
+        """Bulk insert new documents, returning their assigned ids"""
+        if not documents:
+            return []
+
+        doc_ids = self._reserve_ids("doc_id_seq", len(documents))
+        self._insert_arrow(
+            "documents",
+            pa.table(
+                {
+                    "id": pa.array(doc_ids, type=pa.int32()),
+                    "file": [
+                        str(doc.metadata.get("file_path", "")) for doc, _ in documents
+                    ],
+                    "text": [doc.text for doc, _ in documents],
+                    "content_hash": [content_hash for _, content_hash in documents],
+                    "last_modified": [
+                        doc.metadata.get("last_modified", None) for doc, _ in documents
+                    ],
+                }
+            ),
+        )
+        return doc_ids
+
+    def _update_documents(
+        self, documents: List[Tuple[int, "Document", Optional[str]]]
+    ) -> None:
+        """Replace the content of changed documents in bulk"""
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        doc_ids = [doc_id for doc_id, _, _ in documents]
+        self._remove_old_data(doc_ids)
+
+        updates = pa.table(
+            {
+                "id": pa.array(doc_ids, type=pa.int32()),
+                "text": [doc.text for _, doc, _ in documents],
+                "content_hash": [content_hash for _, _, content_hash in documents],
+                "last_modified": [
+                    doc.metadata.get("last_modified", None) for _, doc, _ in documents
+                ],
+            }
+        )
+        self.conn.register("_document_updates", updates)
+        try:
+            self.conn.execute("""
+                UPDATE documents
+                SET text = u.text,
+                    content_hash = u.content_hash,
+                    last_modified = u.last_modified
+                FROM _document_updates u
+                WHERE documents.id = u.id""")
+        finally:
+            self.conn.unregister("_document_updates")
+
+    def _insert_chunks(self, documents: List[Tuple[int, "Document"]]) -> None:
+        """Split documents and bulk insert their chunks"""
+        doc_ids: List[int] = []
+        chunk_texts: List[str] = []
+        chunk_indexes: List[int] = []
+
+        for (doc_id, _), texts in zip(documents, self._split_documents(documents)):
+            for chunk_idx, text in enumerate(texts):
+                doc_ids.append(doc_id)
+                chunk_texts.append(text)
+                chunk_indexes.append(chunk_idx)
+
+        if not chunk_texts:
+            return
+
+        chunk_ids = self._reserve_ids("chunk_id_seq", len(chunk_texts))
+        self._insert_arrow(
+            "chunks",
+            pa.table(
+                {
+                    "id": pa.array(chunk_ids, type=pa.int32()),
+                    "doc_id": pa.array(doc_ids, type=pa.int32()),
+                    "chunk_text": chunk_texts,
+                    "chunk_index": pa.array(chunk_indexes, type=pa.int32()),
+                }
+            ),
+        )
+
+        if self.deduplicator:
+            # Duplicates are only recorded; their canonical chunk is what
+            # gets embedded and searched
+            canonical_ids = self.deduplicator.assign(chunk_ids, chunk_texts)
+            duplicates = [
+                (chunk_id, canonical_id)
+                for chunk_id, canonical_id in zip(chunk_ids, canonical_ids)
+                if canonical_id is not None
+            ]
+            if duplicates:
+                self._insert_arrow(
+                    "chunk_duplicates",
+                    pa.table(
+                        {
+                            "chunk_id": pa.array(
+                                [chunk_id for chunk_id, _ in duplicates], type=pa.int32()
+                            ),
+                            "canonical_id": pa.array(
+                                [canonical_id for _, canonical_id in duplicates],
+                                type=pa.int32(),
+                            ),
+                        }
+                    ),
+                )
+                chunk_ids = [
+                    chunk_id
+                    for chunk_id, canonical_id in zip(chunk_ids, canonical_ids)
+                    if canonical_id is None
+                ]
+        self.lexical_index.index_chunks(chunk_ids)
+
+    def _split_documents(
+        self, documents: List[Tuple[int, "Document"]]
+    ) -> List[List[str]]:
+        """Chunk texts for each document, on the worker pool when there is one"""
+        if self.ingest_pool and self.ingest_pool.chunks_in_parallel:
+            return self.ingest_pool.split(
+                [(doc.text, doc.metadata) for _, doc in documents]
+            )
+
+        return [
+            [node.text for node in self.node_parser.get_nodes_from_documents([doc])]
+            for _, doc in documents
+        ]
+
+    def _submit_embedding(self, texts: List[str]) -> "Future[List[List[float]]]":
+        """Embed a batch on the worker pool, or right away in this process"""
+        if self.ingest_pool and self.ingest_pool.embeds_in_parallel:
+            return self.ingest_pool.submit_embedding(texts)
+
+        future: Future = Future()
+        future.set_result(self.embed_model.get_text_embedding_batch(texts))
+        return future
+
     def create_embeddings(self) -> None:
         """Create embeddings for persistent database"""
         if not self.conn:
@@ -286,45 +946,192 @@ class VectorDB:
             SELECT c.id, c.chunk_text
             FROM chunks c
             LEFT JOIN embeddings e ON c.id = e.chunk_id
-            WHERE e.chunk_id IS NULL""").fetchall()
+            WHERE e.chunk_id IS NULL
+                AND c.id NOT IN (SELECT chunk_id FROM chunk_duplicates)""").fetchall()
 
             if not chunks:
-                logger.info(f"No chunks found for document {doc.text}")
+                logger.info("No chunks require embeddings")
                 return
 
             logger.info(f"Creating embeddings for {len(chunks)} chunks")
-
-            for chunk_id, chunk_text in chunks:
-                embedding = self.embed_model.get_text_embedding(chunk_text)
-                self.conn.execute(
-                    """
-                INSERT INTO embeddings (chunk_id, embedding) VALUES (?, ?)""",
-                    [chunk_id, embedding],
-                )
+            self._embed_chunks(chunks)
 
         except Exception as e:
             logger.error(f"Failed to create embeddings: {e}")
             raise
 
+    def _embed_chunks(self, chunks: List[Tuple[int, str]]) -> int:
+        """Embed chunks in batches, writing each batch with a single insert
+
+        Chunks whose text is already in the embedding cache reuse the cached
+        vector; only unseen texts go through the model.
+        """
+        if not chunks:
+            return 0
+        if not self.embedding_cache:
+            raise RuntimeError("Database connection not established")
+
+        start = time.perf_counter()
+        hits, misses = self.embedding_cache.hits, self.embedding_cache.misses
+
+        # With worker processes several batches are embedded at once while
+        # this thread, the single writer, stores finished ones in order
+        window = self.ingest_pool.embed_window if self.ingest_pool else 0
+        pending: deque = deque()
+
+        for offset in range(0, len(chunks), self.embed_batch_size):
+            batch = chunks[offset : offset + self.embed_batch_size]
+            chunk_ids = [chunk_id for chunk_id, _ in batch]
+            text_hashes = [EmbeddingCache.hash_text(text) for _, text in batch]
+
+            cached = self.embedding_cache.lookup(text_hashes)
+            uncached = {
+                text_hash: text
+                for text_hash, (_, text) in zip(text_hashes, batch)
+                if text_hash not in cached
+            }
+            future = self._submit_embedding(list(uncached.values())) if uncached else None
+            pending.append((chunk_ids, text_hashes, list(uncached.keys()), future))
+
+            while len(pending) > window:
+                self._write_embeddings(*pending.popleft())
+
+        while pending:
+            self._write_embeddings(*pending.popleft())
+
+        self.embedding_cache.evict()
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Embedded {len(chunks)} chunks in {elapsed:.2f}s "
+            f"({len(chunks) / max(elapsed, 1e-9):.1f} chunks/sec, "
+            f"batch size {self.embed_batch_size}, "
+            f"cache hits {self.embedding_cache.hits - hits}, "
+            f"misses {self.embedding_cache.misses - misses})"
+        )
+        return len(chunks)
+
+    def _write_embeddings(
+        self,
+        chunk_ids: List[int],
+        text_hashes: List[str],
+        uncached_hashes: List[str],
+        future: Optional[Future],
+    ) -> None:
+        """Cache a batch's new embeddings and insert vectors for all its chunks"""
+        if future is not None:
+            self.embedding_cache.store(uncached_hashes, future.result())
+
+        embeddings = self.embedding_cache.embeddings_for(chunk_ids, text_hashes)
+        self._insert_arrow("embeddings", embeddings)
+        self._bump_embedding_version()
+        if self.quantized_index:
+            self.quantized_index.add(embeddings)
+
+    def _bump_embedding_version(self) -> None:
+        """Mark exported matrix snapshots of the embeddings as stale"""
+        self.conn.execute("UPDATE embedding_version SET version = version + 1")
+
+    def _insert_arrow(self, table_name: str, data: pa.Table) -> None:
+        """Append an Arrow table to a DuckDB table in one statement"""
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        view_name = f"_{table_name}_batch"
+        columns = ", ".join(data.column_names)
+        self.conn.register(view_name, data)
+        try:
+            self.conn.execute(
+                f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {view_name}"
+            )
+        finally:
+            self.conn.unregister(view_name)
+
     def rag_query(
-        self, query_text: str, top_k: int = 5, similarity_threshold: float = 0.0
+        self,
+        query_text: str,
+        top_k: int = 5,
+        similarity_threshold: float = 0.0,
+        exact: bool = False,
+        query_embedding: Optional[List[float]] = None,
+        mmr_lambda: Optional[float] = None,
+        mmr_candidates: int = MMR_CANDIDATES,
+        collapse: str = "none",
     ) -> List[dict]:
-        """ "Embed the prompt and return vector similarity matches"""
+        """Embed the prompt and return vector similarity matches
+
+        By default the top-k search is answered by the HNSW index, or, when
+        quantization is on, by shortlisting ``rescore_factor * top_k`` chunks
+        on their compact codes and re-scoring those with the float vectors.
+        Passing ``exact=True`` scores every stored embedding instead, which is
+        slower but gives the ground truth for checking recall. A
+        ``query_embedding`` computed ahead of time, e.g. in a batch, skips
+        embedding the prompt again.
+
+        With ``mmr_lambda`` set, the ``mmr_candidates`` nearest chunks are
+        fetched along with their vectors and the ``top_k`` are chosen from
+        them by maximal marginal relevance, optionally collapsing chunks of
+        the same document or neighbouring chunks (see ``mmr_select``).
+
+        With the ``matrix`` search backend, approximate searches score the
+        memory-mapped matrix instead (see ``MatrixIndex``); SQL is then only
+        used to load the matched chunks.
+        """
         if not self.conn:
             raise RuntimeError("Database connection not established")
 
         try:
-            query_embedding = self.embed_model.get_text_embedding(query_text)
+            if query_embedding is None:
+                with metrics.span("query_embedding"):
+                    query_embedding = self.embed_model.get_text_embedding(query_text)
 
-            results = self.conn.execute(
-                """
-                WITH top_matches AS (
+            limit = top_k if mmr_lambda is None else max(top_k, mmr_candidates)
+
+            if self.matrix_index is not None and not exact:
+                with metrics.span("similarity_search"):
+                    matches = self._matrix_query(
+                        [query_embedding], limit, similarity_threshold
+                    )[0]
+                return self._diversify(
+                    matches, top_k, mmr_lambda, collapse, self.matrix_index.vectors_for
+                )
+
+            # The vector and limit are inlined rather than bound so that the
+            # optimizer sees constants and can swap the sort for an index scan
+            vector = self._vector_literal(query_embedding)
+            if exact:
+                top_matches = f"""
                     SELECT
                         chunk_id,
-                        array_inner_product(embedding::FLOAT[384], ?::FLOAT[384]) as similarity
+                        array_inner_product(embedding, {vector}) AS similarity
                     FROM embeddings
                     ORDER BY similarity DESC
-                    LIMIT ?
+                    LIMIT {int(limit)}"""
+            elif self.quantized_index:
+                candidates = self.quantized_index.candidates_sql(
+                    query_embedding, limit * self.rescore_factor
+                )
+                top_matches = f"""
+                    SELECT
+                        chunk_id,
+                        array_inner_product(embedding, {vector}) AS similarity
+                    FROM embeddings
+                    WHERE chunk_id IN ({candidates})
+                    ORDER BY similarity DESC
+                    LIMIT {int(limit)}"""
+            else:
+                top_matches = f"""
+                    SELECT
+                        chunk_id,
+                        -array_negative_inner_product(embedding, {vector}) AS similarity
+                    FROM embeddings
+                    ORDER BY array_negative_inner_product(embedding, {vector})
+                    LIMIT {int(limit)}"""
+
+            with metrics.span("similarity_search"):
+                results = self.conn.execute(
+                    f"""
+                WITH top_matches AS ({top_matches}
                 )
                 SELECT
                     c.id as chunk_id,
@@ -332,45 +1139,255 @@ class VectorDB:
                     c.chunk_index,
                     c.doc_id,
                     d.file,
-                    d.text as full_doc_text,
-                    m.similarity
+                    m.similarity,
+                    {DUPLICATE_FILES_SQL} AS duplicate_files
                 FROM top_matches m
                 JOIN chunks c ON c.id = m.chunk_id
                 JOIN documents d ON d.id = c.doc_id
                 WHERE m.similarity >= ?
                 ORDER BY m.similarity DESC
             """,
-                [query_embedding, top_k, similarity_threshold],
-            ).fetchall()
+                    [similarity_threshold],
+                ).fetchall()
 
-            return [
+            matches = [
                 {
                     "chunk_id": row[0],
                     "chunk_text": row[1],
                     "chunk_index": row[2],
                     "doc_id": row[3],
                     "file": row[4],
-                    "document_text": row[5],
-                    "similarity": row[6],
+                    "similarity": row[5],
+                    "duplicate_files": row[6] or [],
                 }
                 for row in results
             ]
+            return self._diversify(matches, top_k, mmr_lambda, collapse)
 
         except Exception as e:
             logger.error(f"Failed to query database: {e}")
             raise
 
+    def rag_query_batch(
+        self,
+        query_texts: List[str],
+        top_k: int = 5,
+        similarity_threshold: float = 0.0,
+        query_embeddings: Optional[List[List[float]]] = None,
+        mmr_lambda: Optional[float] = None,
+        mmr_candidates: int = MMR_CANDIDATES,
+        collapse: str = "none",
+    ) -> List[List[dict]]:
+        """``rag_query`` for several prompts, in order.
+
+        With the ``matrix`` search backend every prompt is scored in the same
+        matrix product and the matched chunks are loaded in one query;
+        otherwise the prompts are searched one after another.
+        """
+        if not self.conn:
+            raise RuntimeError("Database connection not established")
+
+        try:
+            if query_embeddings is None:
+                with metrics.span("query_embedding"):
+                    query_embeddings = self.embed_model.get_text_embedding_batch(
+                        list(query_texts)
+                    )
+
+            if self.matrix_index is None:
+                return [
+                    self.rag_query(
+                        text,
+                        top_k=top_k,
+                        similarity_threshold=similarity_threshold,
+                        query_embedding=embedding,
+                        mmr_lambda=mmr_lambda,
+                        mmr_candidates=mmr_candidates,
+                        collapse=collapse,
+                    )
+                    for text, embedding in zip(query_texts, query_embeddings)
+                ]
+
+            limit = top_k if mmr_lambda is None else max(top_k, mmr_candidates)
+            with metrics.span("similarity_search"):
+                batches = self._matrix_query(
+                    query_embeddings, limit, similarity_threshold
+                )
+            return [
+                self._diversify(
+                    matches, top_k, mmr_lambda, collapse, self.matrix_index.vectors_for
+                )
+                for matches in batches
+            ]
+
+        except Exception as e:
+            logger.error(f"Failed to batch query database: {e}")
+            raise
+
+    def _matrix_query(
+        self,
+        query_embeddings: List[List[float]],
+        limit: int,
+        similarity_threshold: float,
+    ) -> List[List[dict]]:
+        """Search the matrix snapshot and load the matched chunks"""
+        hits = self.matrix_index.search(
+            np.asarray(query_embeddings, dtype=np.float32), limit
+        )
+        chunks = {
+            match["chunk_id"]: match
+            for match in self._fetch_chunks(
+                list({chunk_id for found in hits for chunk_id, _ in found})
+            )
+        }
+        # Chunks removed since the snapshot was loaded are skipped
+        return [
+            [
+                {**chunks[chunk_id], "similarity": similarity}
+                for chunk_id, similarity in found
+                if similarity >= similarity_threshold and chunk_id in chunks
+            ]
+            for found in hits
+        ]
+
+    def _diversify(
+        self,
+        matches: List[dict],
+        top_k: int,
+        mmr_lambda: Optional[float],
+        collapse: str,
+        vectors_for: Optional[Callable[[List[int]], np.ndarray]] = None,
+    ) -> List[dict]:
+        """Narrow a candidate pool to ``top_k`` by MMR, when it is on.
+
+        ``vectors_for`` loads the candidates' vectors, from the database
+        unless given.
+        """
+        if mmr_lambda is None or not matches:
+            return matches
+
+        vectors_for = vectors_for or self._fetch_embeddings
+        with metrics.span("mmr"):
+            selected = mmr_select(
+                np.array([m["similarity"] for m in matches], dtype=np.float32),
+                vectors_for([m["chunk_id"] for m in matches]),
+                top_k,
+                mmr_lambda,
+                doc_ids=np.array([m["doc_id"] for m in matches]),
+                chunk_indexes=np.array([m["chunk_index"] for m in matches]),
+                collapse=collapse,
+            )
+        return [matches[i] for i in selected]
+
+    def hybrid_query(
+        self,
+        query_text: str,
+        top_k: int = 5,
+        candidate_k: int = HYBRID_CANDIDATES,
+        vector_weight: float = 1.0,
+        lexical_weight: float = 1.0,
+        rrf_k: int = RRF_K,
+        query_embedding: Optional[List[float]] = None,
+    ) -> List[dict]:
+        """Fuse vector and BM25 matches with weighted reciprocal rank fusion
+
+        Each retriever contributes its top ``candidate_k`` chunks; the fused
+        score is returned as ``score`` alongside the vector ``similarity``
+        (None for chunks only the lexical search found).
+        """
+        if not self.conn or not self.lexical_index:
+            raise RuntimeError("Database connection not established")
+
+        try:
+            vector_matches = self.rag_query(
+                query_text, top_k=candidate_k, query_embedding=query_embedding
+            )
+            with metrics.span("lexical_search"):
+                lexical_matches = self.lexical_index.search(query_text, top_k=candidate_k)
+
+            fused = reciprocal_rank_fusion(
+                [
+                    [match["chunk_id"] for match in vector_matches],
+                    [chunk_id for chunk_id, _ in lexical_matches],
+                ],
+                [vector_weight, lexical_weight],
+                k=rrf_k,
+            )[:top_k]
+
+            by_id = {match["chunk_id"]: match for match in vector_matches}
+            missing = [chunk_id for chunk_id, _ in fused if chunk_id not in by_id]
+            by_id.update(
+                {match["chunk_id"]: match for match in self._fetch_chunks(missing)}
+            )
+
+            return [{**by_id[chunk_id], "score": score} for chunk_id, score in fused]
+
+        except Exception as e:
+            logger.error(f"Failed to run hybrid query: {e}")
+            raise
+
+    def _fetch_chunks(self, chunk_ids: List[int]) -> List[dict]:
+        """Load chunk rows in the same shape rag_query returns"""
+        if not chunk_ids:
+            return []
+
+        results = self.conn.execute(
+            f"""
+            SELECT
+                c.id, c.chunk_text, c.chunk_index, c.doc_id, d.file,
+                {DUPLICATE_FILES_SQL}
+            FROM chunks c
+            JOIN documents d ON d.id = c.doc_id
+            WHERE c.id IN (SELECT unnest(?))""",
+            [chunk_ids],
+        ).fetchall()
+
+        return [
+            {
+                "chunk_id": row[0],
+                "chunk_text": row[1],
+                "chunk_index": row[2],
+                "doc_id": row[3],
+                "file": row[4],
+                "similarity": None,
+                "duplicate_files": row[5] or [],
+            }
+            for row in results
+        ]
+
+    def _fetch_embeddings(self, chunk_ids: List[int]) -> np.ndarray:
+        """Stored vectors of the given chunks, one row per id, in order"""
+        table = self.conn.execute(
+            """
+            SELECT chunk_id, embedding FROM embeddings
+            WHERE chunk_id IN (SELECT unnest(?))""",
+            [chunk_ids],
+        ).fetch_arrow_table()
+        vectors = np.asarray(
+            table.column("embedding").combine_chunks().flatten(), dtype=np.float32
+        ).reshape(-1, EMBEDDING_DIM)
+        rows = {
+            chunk_id: i for i, chunk_id in enumerate(table.column("chunk_id").to_pylist())
+        }
+        return vectors[[rows[chunk_id] for chunk_id in chunk_ids]]
+
+    @staticmethod
+    def _vector_literal(embedding: List[float]) -> str:
+        """Render an embedding as a FLOAT array literal"""
+        return f"[{', '.join(repr(float(v)) for v in embedding)}]::{ARRAY_TYPE}"
+
     def retrieve_rag_docs(self, doc_ids: List[str]) -> List[dict]:
         """Retrieve original documents to include in LLM query"""
         if not self.conn:
             raise RuntimeError("Database connection not established")
 
         try:
-            results = self.conn.execute(
-                """
-                SELECT id, file, text FROM documents WHERE id IN ?""",
-                [doc_ids],
-            ).fetchall()
+            with metrics.span("retrieve_rag_docs"):
+                results = self.conn.execute(
+                    """
+                    SELECT id, file, text FROM documents WHERE id IN ?""",
+                    [doc_ids],
+                ).fetchall()
 
             return results
 
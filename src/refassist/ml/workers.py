@@ -0,0 +1,153 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+import multiprocessing
+import os
+
+from refassist.ml.embedding import load_embedding_model
+from refassist.ml.vectordb import EMBED_BATCH_SIZE, MODEL_NAME, VectorDB
+from refassist.log import logger
+
+CPU_COUNT = os.cpu_count() or 1
+EMBED_WORKERS = max(1, CPU_COUNT // 4)
+
+# Per-process state, set up once by each worker's initializer
+_node_parser = None
+_embed_model = None
+
+
+def load_cpu_embedding_model(
+    embed_batch_size: int, backend: str = "torch", threads: Optional[int] = None
+) -> Any:
+    """Default worker model: the embedding model pinned to the CPU"""
+    return load_embedding_model(
+        backend, MODEL_NAME, embed_batch_size, device="cpu", threads=threads
+    )
+
+
+def _init_chunk_worker() -> None:
+    global _node_parser
+    _node_parser = VectorDB._setup_node_parser()
+
+
+def _split(document: Tuple[str, Dict[str, Any]]) -> List[str]:
+    from llama_index.core import Document
+
+    text, metadata = document
+    nodes = _node_parser.get_nodes_from_documents(
+        [Document(text=text, metadata=metadata)]
+    )
+    return [node.text for node in nodes]
+
+
+def _init_embed_worker(model_factory: Callable[[], Any], torch_threads: int) -> None:
+    global _embed_model
+    # Set before torch is first imported so its thread pools are sized to match
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = str(torch_threads)
+    try:
+        import torch
+
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+
+    _embed_model = model_factory()
+
+
+def _embed(texts: List[str]) -> List[List[float]]:
+    return _embed_model.get_text_embedding_batch(texts)
+
+
+class IngestPool:
+    """Process pools that take chunking and embedding off the ingest thread.
+
+    Sentence splitting and embedding are CPU bound and hold the GIL, so on a
+    machine without a GPU they only scale across processes. Each embedding
+    worker loads its own copy of the model and is limited to ``torch_threads``
+    threads so that workers don't oversubscribe the cores. Results are
+    returned to the caller, which remains the only writer to DuckDB.
+    """
+
+    def __init__(
+        self,
+        chunk_workers: int = CPU_COUNT,
+        embed_workers: int = EMBED_WORKERS,
+        torch_threads: Optional[int] = None,
+        model_factory: Optional[Callable[[], Any]] = None,
+        embed_batch_size: int = EMBED_BATCH_SIZE,
+        embedding_backend: str = "torch",
+    ) -> None:
+        if chunk_workers < 0 or embed_workers < 0:
+            raise ValueError("worker counts cannot be negative")
+
+        self.chunk_workers = chunk_workers
+        self.embed_workers = embed_workers
+        self.torch_threads = torch_threads or max(1, CPU_COUNT // max(embed_workers, 1))
+        self.model_factory = model_factory or partial(
+            load_cpu_embedding_model,
+            embed_batch_size,
+            embedding_backend,
+            self.torch_threads,
+        )
+        self._chunk_pool: Optional[ProcessPoolExecutor] = None
+        self._embed_pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def chunks_in_parallel(self) -> bool:
+        return self.chunk_workers > 0
+
+    @property
+    def embeds_in_parallel(self) -> bool:
+        return self.embed_workers > 0
+
+    @property
+    def embed_window(self) -> int:
+        """Embedding batches to keep in flight so no worker sits idle"""
+        return 2 * self.embed_workers
+
+    @staticmethod
+    def _context():
+        # Forking a process that has already loaded torch can deadlock
+        return multiprocessing.get_context("spawn")
+
+    def split(self, documents: List[Tuple[str, Dict[str, Any]]]) -> List[List[str]]:
+        """Split (text, metadata) pairs into chunk texts, preserving order"""
+        if self._chunk_pool is None:
+            logger.info(f"Starting {self.chunk_workers} chunking workers")
+            self._chunk_pool = ProcessPoolExecutor(
+                max_workers=self.chunk_workers,
+                mp_context=self._context(),
+                initializer=_init_chunk_worker,
+            )
+        chunksize = max(1, len(documents) // (self.chunk_workers * 4))
+        return list(self._chunk_pool.map(_split, documents, chunksize=chunksize))
+
+    def submit_embedding(self, texts: List[str]) -> "Future[List[List[float]]]":
+        """Embed one batch of texts on the next free worker"""
+        if self._embed_pool is None:
+            logger.info(
+                f"Starting {self.embed_workers} embedding workers "
+                f"with {self.torch_threads} torch threads each"
+            )
+            self._embed_pool = ProcessPoolExecutor(
+                max_workers=self.embed_workers,
+                mp_context=self._context(),
+                initializer=_init_embed_worker,
+                initargs=(self.model_factory, self.torch_threads),
+            )
+        return self._embed_pool.submit(_embed, texts)
+
+    def close(self) -> None:
+        """Shut down any worker processes that were started"""
+        for pool in (self._chunk_pool, self._embed_pool):
+            if pool:
+                pool.shutdown(cancel_futures=True)
+        self._chunk_pool = None
+        self._embed_pool = None
+
+    def __enter__(self) -> "IngestPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
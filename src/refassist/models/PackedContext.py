@@ -0,0 +1,13 @@
+from dataclasses import dataclass, field
+from typing import List
+
+
+@dataclass
+class PackedContext:
+    """Prompt context assembled under a token budget."""
+
+    text: str
+    tokens_used: int
+    token_budget: int
+    files: List[str] = field(default_factory=list)
+    chunk_ids: List[int] = field(default_factory=list)
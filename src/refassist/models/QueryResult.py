@@ -1,5 +1,7 @@
-from typing import List
-from dataclasses import dataclass
+from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+
+from .SourceMatch import SourceMatch
 
 
 @dataclass
@@ -7,3 +9,9 @@ class QueryResult:
     answer: str
     sources: List[str]
     code_examples: List[str]
+    timings: Dict[str, float] = field(default_factory=dict)
+    context_tokens: int = 0
+    token_budget: int = 0
+    cache_hit: Optional[str] = None
+    usage: Dict[str, int] = field(default_factory=dict)
+    citations: List[SourceMatch] = field(default_factory=list)
@@ -0,0 +1,17 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class SourceMatch:
+    """A citation traced back to a document used as context.
+
+    ``offset`` is where the citation text occurs in the chunk (or, in basic
+    mode, the whole document); it is None when the citation names the
+    document's path or URL rather than quoting it.
+    """
+
+    citation: str
+    file: str
+    chunk_id: Optional[int] = None
+    offset: Optional[int] = None
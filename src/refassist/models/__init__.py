@@ -1,9 +1,13 @@
 from .Document import Document
+from .PackedContext import PackedContext
 from .PerplexityResponse import PerplexityResponse
 from .QueryResult import QueryResult
+from .SourceMatch import SourceMatch
 
 __all__ = [
     "Document",
+    "PackedContext",
     "PerplexityResponse",
     "QueryResult",
+    "SourceMatch",
 ]
@@ -1,8 +1,23 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Callable, Tuple
 import asyncio
-from refassist.models import QueryResult, Document
-from refassist.client import PerplexityClient
+import hashlib
+import threading
+import time
+from refassist.models import QueryResult, Document, PerplexityResponse
+from refassist.client import PerplexityClient, TEMPERATURE
+from refassist.context import ContextBuilder, TOKEN_BUDGET
+from refassist.citations import Section, SourceIndex, match_citations
+from refassist.response_cache import (
+    ResponseCache,
+    RESPONSE_CACHE_TTL,
+    SEMANTIC_THRESHOLD,
+)
 from refassist.ml.rag import RAGService
+from refassist.metrics import metrics
+from refassist.ml.vectordb import EMBED_BATCH_SIZE
+from refassist.ml.rerank import RERANK_BUDGET, RERANK_CANDIDATES, RERANK_TOP_K
+from refassist.ml.diversity import MMR_CANDIDATES, MMR_LAMBDA
+from refassist.watcher import DocsWatcher, WATCH_INTERVAL, WATCH_DEBOUNCE
 from refassist.log import logger
 
 
@@ -11,23 +26,142 @@ class QueryHandler:
         self,
         client: PerplexityClient,
         documents: List[Document],
+        documents_path: Optional[str] = None,
         db_path: Optional[str] = None,
         in_memory: bool = True,
         store_docs: bool = False,
+        embed_batch_size: int = EMBED_BATCH_SIZE,
+        token_budget: int = TOKEN_BUDGET,
+        cache_responses: bool = False,
+        cache_path: Optional[str] = None,
+        semantic_cache_threshold: Optional[float] = None,
+        cache_ttl: float = RESPONSE_CACHE_TTL,
+        temperature: float = TEMPERATURE,
+        retrieval: str = "vector",
+        vector_weight: float = 1.0,
+        lexical_weight: float = 1.0,
+        chunk_workers: int = 0,
+        embed_workers: int = 0,
+        torch_threads: Optional[int] = None,
+        quantization: str = "none",
+        embedding_backend: str = "torch",
+        dedup: str = "none",
+        rerank: bool = False,
+        rerank_top_k: int = RERANK_TOP_K,
+        rerank_candidates: int = RERANK_CANDIDATES,
+        rerank_budget: float = RERANK_BUDGET,
+        mmr: bool = False,
+        mmr_lambda: float = MMR_LAMBDA,
+        mmr_candidates: int = MMR_CANDIDATES,
+        mmr_collapse: str = "none",
+        search_backend: str = "duckdb",
+        matrix_dtype: str = "float32",
+        watch: bool = False,
+        watch_interval: float = WATCH_INTERVAL,
+        watch_debounce: float = WATCH_DEBOUNCE,
     ) -> None:
+        if watch and (not store_docs or in_memory):
+            raise ValueError("Watching needs a persistent RAG index")
+
         self.client = client
         self.documents = documents
-        self.rag_service = RAGService(db_path)
+        self.documents_path = documents_path
+        # Basic mode cites from the loaded documents, so index them once
+        self.source_index = SourceIndex(str(doc.path) for doc in documents)
+        self._documents_by_path = {str(doc.path): doc for doc in documents}
+        self.rag_service = RAGService(
+            db_path,
+            embed_batch_size=embed_batch_size,
+            retrieval=retrieval,
+            vector_weight=vector_weight,
+            lexical_weight=lexical_weight,
+            chunk_workers=chunk_workers,
+            embed_workers=embed_workers,
+            torch_threads=torch_threads,
+            quantization=quantization,
+            embedding_backend=embedding_backend,
+            dedup=dedup,
+            rerank=rerank,
+            rerank_top_k=rerank_top_k,
+            rerank_candidates=rerank_candidates,
+            rerank_budget=rerank_budget,
+            mmr=mmr,
+            mmr_lambda=mmr_lambda,
+            mmr_candidates=mmr_candidates,
+            mmr_collapse=mmr_collapse,
+            search_backend=search_backend,
+            matrix_dtype=matrix_dtype,
+        )
         self.in_memory = in_memory
         self.store_docs = store_docs
+        self.context_builder = ContextBuilder(token_budget)
+        self.temperature = temperature
+        self.document_hashes: Dict[str, str] = {}
+
+        self.watcher: Optional[DocsWatcher] = None
+        self._watched_generation = 0
+        if watch:
+            self.watcher = DocsWatcher(
+                self.rag_service,
+                documents_path,
+                interval=watch_interval,
+                debounce=watch_debounce,
+            )
 
-    async def initialize(self, documents_path: str) -> None:
+        self.response_cache: Optional[ResponseCache] = None
+        # Cache calls run on worker threads but share one DuckDB connection
+        self._cache_lock = threading.Lock()
+        if cache_responses:
+            # Only a database file the user chose is shared with the cache;
+            # otherwise answers are kept in memory
+            if cache_path is None and store_docs and not in_memory:
+                cache_path = db_path
+            self.response_cache = ResponseCache(
+                cache_path,
+                embed=self._embed_query if semantic_cache_threshold else None,
+                ttl=cache_ttl,
+                similarity_threshold=semantic_cache_threshold or SEMANTIC_THRESHOLD,
+            )
+            self.response_cache.connect()
+            if not self.store_docs:
+                self._refresh_document_hashes()
+
+    async def initialize(self) -> None:
         try:
-            self.rag_service.initialize(documents_path, in_memory=self.in_memory)
+            self.rag_service.initialize(self.documents_path, in_memory=self.in_memory)
+            if self.response_cache:
+                self._refresh_document_hashes()
+            if self.watcher:
+                self.watcher.start()
         except Exception as e:
             logger.error(f"Failed to initialize rag service: {e}")
             raise
 
+    def _embed_query(self, text: str) -> List[float]:
+        return self.rag_service.vector_db.embed_model.get_text_embedding(text)
+
+    def _refresh_document_hashes(self) -> None:
+        """Record current document hashes and drop cached answers built on stale ones"""
+        if self.store_docs:
+            self.document_hashes = self.rag_service.document_hashes()
+        else:
+            self.document_hashes = {
+                str(doc.path): hashlib.sha256(doc.content.encode("utf-8")).hexdigest()
+                for doc in self.documents
+            }
+
+        if self.response_cache:
+            with self._cache_lock:
+                self.response_cache.invalidate(set(self.document_hashes.values()))
+
+    def _cache_get(self, *args) -> Tuple[Optional[PerplexityResponse], Optional[str]]:
+        with self._cache_lock:
+            return self.response_cache.get(*args)
+
+    def _cache_put(self, *args, **kwargs) -> None:
+        with self._cache_lock:
+            self.response_cache.put(*args, **kwargs)
+
     def _extract_code_examples(self, text: str) -> List[str]:
         code_blocks = []
         lines = text.splitlines()
@@ -48,42 +182,179 @@ class QueryHandler:
 
         return code_blocks
 
+    def retrieve_batch(self, queries: List[str]) -> List[Optional[List[dict]]]:
+        """Retrieve matches for several queries with one query embedding pass.
+
+        The results can be handed to ``process_query`` as ``matches``. Basic
+        mode retrieves nothing, so every entry is None.
+        """
+        if not self.store_docs:
+            return [None] * len(queries)
+        return self.rag_service.query_batch(queries)
+
     async def process_query(
-        self, query: str, *, code_examples: bool = False
+        self,
+        query: str,
+        *,
+        code_examples: bool = False,
+        on_token: Optional[Callable[[str], None]] = None,
+        matches: Optional[List[dict]] = None,
     ) -> QueryResult:
+        """Answer a query against the loaded documentation.
+
+        When ``on_token`` is given the answer is streamed through it as it is
+        generated; code blocks and sources are still extracted from the full
+        answer once the stream has finished. In RAG mode, ``matches`` already
+        retrieved for the query (see ``retrieve_batch``) skip retrieval.
+
+        ``sources`` and ``citations`` only ever point at documents that were
+        sent as context; see ``match_citations``.
+
+        ``timings`` on the result breaks the latency down by stage: retrieval,
+        context assembly, cache lookup, generation and post-processing.
+
+        Cache lookups and stores embed the question and query DuckDB, so they
+        run on a worker thread rather than the event loop.
+        """
         try:
+            start = time.perf_counter()
+            timings: Dict[str, float] = {}
+
+            if self.watcher and self.watcher.generation != self._watched_generation:
+                # The watcher re-indexed files since the last query
+                self._watched_generation = self.watcher.generation
+                if self.response_cache:
+                    await asyncio.to_thread(self._refresh_document_hashes)
+
             if self.store_docs:
-                # RAG mode
-                rag_results = self.rag_service.query(query)
-                context = "\n\n".join(result["text"] for result in rag_results)
+                # RAG mode - pack the best matching chunks
+                if matches is None:
+                    matches = self.rag_service.query(query)
+                    timings["retrieval"] = time.perf_counter() - start
+                context_start = time.perf_counter()
+                packed = self.context_builder.from_matches(matches)
+                packed_ids = set(packed.chunk_ids)
+                sections: List[Section] = [
+                    (match["file"], match["chunk_id"], match["chunk_text"])
+                    for match in matches
+                    if match["chunk_id"] in packed_ids
+                ]
+                # Files holding deduplicated copies of a chunk can be cited too
+                context_files = list(
+                    dict.fromkeys(
+                        packed.files
+                        + [
+                            file
+                            for match in matches
+                            if match["chunk_id"] in packed_ids
+                            for file in match.get("duplicate_files", ())
+                        ]
+                    )
+                )
+                source_index = SourceIndex(context_files)
             else:
-                # Basic mode - use all documents as context
-                context = "\n\n".join(doc.content for doc in self.documents)
+                # Basic mode - pack documents in order
+                context_start = time.perf_counter()
+                packed = self.context_builder.from_documents(self.documents)
+                sections = [
+                    (file, None, self._documents_by_path[file].content)
+                    for file in packed.files
+                ]
+                source_index = self.source_index
+                context_files = packed.files
+            context = packed.text
+            timings["context"] = time.perf_counter() - context_start
 
             if code_examples:
                 query = f"Please provide code examples for {query}"
 
-            response = await self.client.query_document(query=query, context=context)
+            def emit(token: str) -> None:
+                if "time_to_first_token" not in timings:
+                    timings["time_to_first_token"] = time.perf_counter() - start
+                on_token(token)
+
+            response, cache_hit = None, None
+            if self.response_cache:
+                lookup_start = time.perf_counter()
+                context_hash = ResponseCache.hash_text(context)
+                response, cache_hit = await asyncio.to_thread(
+                    self._cache_get,
+                    query,
+                    context_hash,
+                    self.client.model,
+                    self.temperature,
+                )
+                timings["cache_lookup"] = time.perf_counter() - lookup_start
+                if response and on_token:
+                    emit(response.content)
 
+            if response is None:
+                generation_start = time.perf_counter()
+                if on_token:
+                    response = await self.client.stream_document(
+                        query=query,
+                        context=context,
+                        on_token=emit,
+                        temperature=self.temperature,
+                    )
+                else:
+                    response = await self.client.query_document(
+                        query=query, context=context, temperature=self.temperature
+                    )
+                timings["generation"] = time.perf_counter() - generation_start
+
+                if self.response_cache:
+                    await asyncio.to_thread(
+                        self._cache_put,
+                        query,
+                        context_hash,
+                        self.client.model,
+                        self.temperature,
+                        response,
+                        doc_hashes=[
+                            self.document_hashes[file]
+                            for file in packed.files
+                            if file in self.document_hashes
+                        ],
+                    )
+
+            post_start = time.perf_counter()
             code_examples = self._extract_code_examples(response.content)
 
-            sources = [
-                str(doc.path)
-                for doc in self.documents
-                if any(citation in doc.content for citation in response.citations)
-            ]
+            citations = match_citations(
+                response.citations, sections, source_index, context_files
+            )
+            sources = list(dict.fromkeys(match.file for match in citations))
+
+            timings["post_processing"] = time.perf_counter() - post_start
+            timings["total"] = time.perf_counter() - start
 
-            return QueryResult(
+            result = QueryResult(
                 answer=response.content,
                 sources=sources,
                 code_examples=code_examples,
+                timings=timings,
+                context_tokens=packed.tokens_used,
+                token_budget=packed.token_budget,
+                cache_hit=cache_hit,
+                # Answers served from the cache cost no tokens
+                usage=response.usage if cache_hit is None else {},
+                citations=citations,
+            )
+            metrics.record_query(
+                timings, result.usage, cache_hit, len(matches) if matches else 0
             )
+            return result
         except Exception as e:
             logger.error(f"Error processing query: {query}: {e}")
             raise
 
     def close(self) -> None:
         try:
+            if self.watcher:
+                self.watcher.stop()
+            if self.response_cache:
+                self.response_cache.close()
             self.rag_service.close()
         except Exception as e:
             logger.error(f"Failed to close RAG service: {e}")
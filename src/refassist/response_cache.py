@@ -0,0 +1,250 @@
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import hashlib
+import json
+import re
+
+import duckdb
+from duckdb import DuckDBPyConnection
+
+from refassist.models import PerplexityResponse
+from refassist.ml.vectordb import ARRAY_TYPE
+from refassist.log import logger
+
+RESPONSE_CACHE_SIZE = 1000
+RESPONSE_CACHE_TTL = 7 * 24 * 60 * 60
+SEMANTIC_THRESHOLD = 0.95
+
+
+class ResponseCache:
+    """Cache of LLM answers kept in a DuckDB file, or in memory without one.
+
+    The exact layer is keyed on (normalized query, context hash, model,
+    temperature). When an ``embed`` function is supplied, a semantic layer
+    also returns the answer of the most similar cached query asked against
+    the same context, provided the similarity clears ``similarity_threshold``.
+    Entries expire after ``ttl`` seconds, are capped at ``max_entries`` by
+    least recent use, and are dropped once any document they were answered
+    from changes.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        embed: Optional[Callable[[str], List[float]]] = None,
+        ttl: float = RESPONSE_CACHE_TTL,
+        max_entries: int = RESPONSE_CACHE_SIZE,
+        similarity_threshold: float = SEMANTIC_THRESHOLD,
+    ) -> None:
+        self.db_path = db_path
+        self.embed = embed
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.conn: Optional[DuckDBPyConnection] = None
+        self._last_embedding: Optional[Tuple[str, List[float]]] = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def connect(self) -> None:
+        """Connect to the DuckDB file and create the cache table"""
+        try:
+            self.conn = duckdb.connect(str(self.db_path) if self.db_path else ":memory:")
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    query TEXT,
+                    query_embedding {ARRAY_TYPE},
+                    context_hash TEXT,
+                    model TEXT,
+                    temperature DOUBLE,
+                    doc_hashes TEXT[],
+                    content TEXT,
+                    citations TEXT[],
+                    usage TEXT,
+                    created_at TIMESTAMP,
+                    last_used TIMESTAMP
+                );
+            """)
+        except Exception as e:
+            logger.error(f"Failed to connect response cache: {e}")
+            raise
+
+    def close(self) -> None:
+        """Close the cache's connection"""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Case-fold, collapse whitespace and drop trailing punctuation"""
+        return re.sub(r"\s+", " ", query).strip().rstrip("?!. ").lower()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing the result between a miss and the following put"""
+        if not self._last_embedding or self._last_embedding[0] != query:
+            self._last_embedding = (query, self.embed(query))
+        return self._last_embedding[1]
+
+    def _key(self, query: str, context_hash: str, model: str, temperature: float) -> str:
+        return self.hash_text(
+            "\x1f".join(
+                [self.normalize_query(query), context_hash, model, repr(temperature)]
+            )
+        )
+
+    def get(
+        self, query: str, context_hash: str, model: str, temperature: float
+    ) -> Tuple[Optional[PerplexityResponse], Optional[str]]:
+        """Look up a cached answer, returning it with the layer that matched"""
+        if not self.conn:
+            raise RuntimeError("Response cache not connected")
+
+        try:
+            row = self.conn.execute(
+                """
+                UPDATE response_cache SET last_used = now()
+                WHERE key = ? AND created_at > now() - to_seconds(?::DOUBLE)
+                RETURNING content, citations, usage""",
+                [self._key(query, context_hash, model, temperature), self.ttl],
+            ).fetchone()
+            if row:
+                self.exact_hits += 1
+                return self._response(row), "exact"
+
+            if self.embed:
+                row = self.conn.execute(
+                    f"""
+                    SELECT key, content, citations, usage,
+                        array_inner_product(query_embedding, ?::{ARRAY_TYPE}) AS sim
+                    FROM response_cache
+                    WHERE context_hash = ? AND model = ? AND temperature = ?
+                        AND query_embedding IS NOT NULL
+                        AND created_at > now() - to_seconds(?::DOUBLE)
+                    ORDER BY sim DESC
+                    LIMIT 1""",
+                    [
+                        self._embed_query(query),
+                        context_hash,
+                        model,
+                        temperature,
+                        self.ttl,
+                    ],
+                ).fetchone()
+                if row and row[4] >= self.similarity_threshold:
+                    self.conn.execute(
+                        "UPDATE response_cache SET last_used = now() WHERE key = ?",
+                        [row[0]],
+                    )
+                    self.semantic_hits += 1
+                    return self._response(row[1:4]), "semantic"
+
+            self.misses += 1
+            return None, None
+
+        except Exception as e:
+            logger.error(f"Failed to read response cache: {e}")
+            raise
+
+    def put(
+        self,
+        query: str,
+        context_hash: str,
+        model: str,
+        temperature: float,
+        response: PerplexityResponse,
+        doc_hashes: List[str],
+    ) -> None:
+        """Store an answer and evict anything beyond the size cap"""
+        if not self.conn:
+            raise RuntimeError("Response cache not connected")
+
+        try:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO response_cache VALUES
+                (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, now(), now())""",
+                [
+                    self._key(query, context_hash, model, temperature),
+                    query,
+                    self._embed_query(query) if self.embed else None,
+                    context_hash,
+                    model,
+                    temperature,
+                    doc_hashes,
+                    response.content,
+                    response.citations,
+                    json.dumps(response.usage),
+                ],
+            )
+            self.evict()
+
+        except Exception as e:
+            logger.error(f"Failed to write response cache: {e}")
+            raise
+
+    def invalidate(self, current_doc_hashes: Set[str]) -> int:
+        """Drop answers built from documents whose content has since changed"""
+        if not self.conn:
+            raise RuntimeError("Response cache not connected")
+
+        try:
+            removed = self.conn.execute(
+                """
+                DELETE FROM response_cache
+                WHERE NOT list_has_all(?::TEXT[], doc_hashes)
+                RETURNING key""",
+                [sorted(current_doc_hashes)],
+            ).fetchall()
+            if removed:
+                logger.info(f"Invalidated {len(removed)} cached responses")
+            return len(removed)
+
+        except Exception as e:
+            logger.error(f"Failed to invalidate response cache: {e}")
+            raise
+
+    def evict(self) -> int:
+        """Remove expired entries and the least recently used beyond the cap"""
+        if not self.conn:
+            raise RuntimeError("Response cache not connected")
+
+        expired = self.conn.execute(
+            """
+            DELETE FROM response_cache
+            WHERE created_at <= now() - to_seconds(?::DOUBLE)
+            RETURNING key""",
+            [self.ttl],
+        ).fetchall()
+
+        count = self.conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        excess = max(count - self.max_entries, 0)
+        if excess:
+            self.conn.execute(
+                """
+                DELETE FROM response_cache WHERE key IN (
+                    SELECT key FROM response_cache ORDER BY last_used LIMIT ?
+                )""",
+                [excess],
+            )
+        return len(expired) + excess
+
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss counters since this cache was connected"""
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
+
+    @staticmethod
+    def _response(row) -> PerplexityResponse:
+        content, citations, usage = row
+        return PerplexityResponse(
+            content=content, citations=list(citations or []), usage=json.loads(usage)
+        )
@@ -0,0 +1,284 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+import asyncio
+import json
+import queue
+import time
+
+from refassist.ml.rag import RAGService
+from refassist.metrics import metrics
+from refassist.query import QueryHandler
+from refassist.log import logger
+
+HOST = "127.0.0.1"
+PORT = 8000
+POOL_SIZE = 4
+MAX_BODY_BYTES = 1 << 20
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[dict]]
+Send = Callable[[dict], Awaitable[None]]
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class CursorPool:
+    """Fixed set of RAGService views, each on its own DuckDB cursor.
+
+    A DuckDB connection must not be used from two threads at once, so every
+    retrieval checks a view out for its duration. Waiting for a free view
+    happens on the worker thread, never on the event loop.
+    """
+
+    def __init__(self, rag_service: RAGService, size: int = POOL_SIZE) -> None:
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self._views: "queue.Queue[RAGService]" = queue.Queue()
+        for _ in range(size):
+            self._views.put(rag_service.cursor())
+        self.size = size
+
+    def query(self, query_text: str, top_k: int) -> List[dict]:
+        view = self._views.get()
+        try:
+            return view.query(query_text, top_k=top_k)
+        finally:
+            self._views.put(view)
+
+    def close(self) -> None:
+        for _ in range(self.size):
+            self._views.get().vector_db.close()
+
+
+class RefAssistServer:
+    """ASGI app that answers queries from a warm QueryHandler.
+
+    The documents, embedding model, DuckDB connection and pooled Perplexity
+    client are loaded once at startup and shared by every request. Retrieval
+    (query embedding plus the similarity search) runs on a thread pool with a
+    cursor per request, so the event loop only ever waits on the LLM. Ingests
+    are serialized on their own thread, on the main connection, as the index
+    has a single writer.
+
+    Routes, all taking and returning JSON except for ``/metrics``:
+
+    - ``GET /health``
+    - ``POST /query`` ``{"question", "code_examples"?}`` returns a QueryResult
+    - ``POST /retrieve`` ``{"question", "top_k"?}`` returns the matched chunks
+    - ``POST /ingest`` ``{"path"?}`` syncs the index with the files under the
+      configured documents path; another ``path`` is refused, as a sync drops
+      every indexed file missing from the scanned tree
+    - ``GET /metrics`` stage latencies and counters in Prometheus text format,
+      when metrics are enabled
+    """
+
+    def __init__(self, query_handler: QueryHandler, pool_size: int = POOL_SIZE) -> None:
+        self.query_handler = query_handler
+        self.pool_size = pool_size
+        self.pool: Optional[CursorPool] = None
+        self._retrieval_executor: Optional[ThreadPoolExecutor] = None
+        self._ingest_executor: Optional[ThreadPoolExecutor] = None
+        self._ingest_lock = asyncio.Lock()
+        self.routes = {
+            ("GET", "/health"): self.health,
+            ("POST", "/query"): self.query,
+            ("POST", "/retrieve"): self.retrieve,
+            ("POST", "/ingest"): self.ingest,
+            ("GET", "/metrics"): self.export_metrics,
+        }
+
+    @property
+    def rag_mode(self) -> bool:
+        return self.query_handler.store_docs
+
+    async def startup(self) -> None:
+        """Load the index and the embedding model before taking requests"""
+        start = time.perf_counter()
+        if self.rag_mode:
+            await self.query_handler.initialize()
+            rag_service = self.query_handler.rag_service
+            # Loaded here so that the first request does not pay for it
+            await asyncio.to_thread(lambda: rag_service.vector_db.embed_model)
+            self.pool = CursorPool(rag_service, self.pool_size)
+            self._retrieval_executor = ThreadPoolExecutor(
+                self.pool_size, thread_name_prefix="retrieval"
+            )
+            self._ingest_executor = ThreadPoolExecutor(1, thread_name_prefix="ingest")
+        logger.info(f"Server ready in {time.perf_counter() - start:.2f}s")
+
+    async def shutdown(self) -> None:
+        for executor in (self._retrieval_executor, self._ingest_executor):
+            if executor:
+                executor.shutdown(wait=True)
+        if self.pool:
+            self.pool.close()
+            self.pool = None
+        await self.query_handler.client.aclose()
+        self.query_handler.close()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        handler = self.routes.get((scope["method"], scope["path"]))
+        try:
+            if handler is None:
+                if any(path == scope["path"] for _, path in self.routes):
+                    raise HTTPError(405, "Method not allowed")
+                raise HTTPError(404, "Not found")
+            status, payload = 200, await handler(await self._read_json(receive))
+        except HTTPError as e:
+            status, payload = e.status, {"error": str(e)}
+        except Exception as e:
+            logger.error(f"Failed to handle {scope['method']} {scope['path']}: {e}")
+            status, payload = 500, {"error": "Internal server error"}
+
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), b"text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode("utf-8"), b"application/json"
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", content_type),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.error(f"Server failed to start: {e}")
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _read_json(receive: Receive) -> dict:
+        chunks: List[bytes] = []
+        size = 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise HTTPError(413, "Request body too large")
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+
+        raw = b"".join(chunks)
+        if not raw:
+            return {}
+        try:
+            body = json.loads(raw)
+        except json.JSONDecodeError:
+            raise HTTPError(400, "Request body is not valid JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        return body
+
+    @staticmethod
+    def _question(body: dict) -> str:
+        question = body.get("question")
+        if not isinstance(question, str) or not question.strip():
+            raise HTTPError(400, "'question' is required")
+        return question
+
+    async def _retrieve(self, question: str, top_k: int = 5) -> List[dict]:
+        if not self.pool:
+            raise HTTPError(400, "Retrieval needs a RAG index (--store-files)")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._retrieval_executor, self.pool.query, question, top_k
+        )
+
+    async def health(self, body: dict) -> dict:
+        return {"status": "ok", "rag": self.rag_mode}
+
+    async def export_metrics(self, body: dict) -> str:
+        if not metrics.enabled:
+            raise HTTPError(404, "Metrics are disabled")
+        return metrics.render_prometheus()
+
+    async def query(self, body: dict) -> dict:
+        question = self._question(body)
+        matches, retrieval_time = None, None
+        if self.rag_mode:
+            start = time.perf_counter()
+            matches = await self._retrieve(question)
+            retrieval_time = time.perf_counter() - start
+
+        result = await self.query_handler.process_query(
+            question, code_examples=bool(body.get("code_examples")), matches=matches
+        )
+        if retrieval_time is not None:
+            result.timings["retrieval"] = retrieval_time
+        return asdict(result)
+
+    async def retrieve(self, body: dict) -> dict:
+        top_k = body.get("top_k", 5)
+        if not isinstance(top_k, int) or top_k < 1:
+            raise HTTPError(400, "'top_k' must be a positive integer")
+        return {"matches": await self._retrieve(self._question(body), top_k)}
+
+    async def ingest(self, body: dict) -> dict:
+        if not self.rag_mode or self.query_handler.in_memory:
+            raise HTTPError(400, "Ingest needs a persistent RAG index")
+        path = self.query_handler.documents_path
+        if not path:
+            raise HTTPError(400, "Ingest needs a documents path")
+        requested = body.get("path")
+        if requested is not None and (
+            not isinstance(requested, str)
+            or Path(requested).resolve() != Path(path).resolve()
+        ):
+            raise HTTPError(400, "'path' must be the configured documents path")
+
+        loop = asyncio.get_running_loop()
+        async with self._ingest_lock:
+            stats = await loop.run_in_executor(
+                self._ingest_executor, self.query_handler.rag_service.sync, str(path)
+            )
+            await loop.run_in_executor(
+                self._ingest_executor, self.query_handler._refresh_document_hashes
+            )
+        return stats
+
+
+def serve(
+    query_handler: QueryHandler,
+    host: str = HOST,
+    port: int = PORT,
+    pool_size: int = POOL_SIZE,
+) -> None:
+    """Run the server with uvicorn until interrupted"""
+    try:
+        import uvicorn
+    except ImportError as e:
+        raise RuntimeError(
+            "Server mode needs uvicorn: install refassist with the 'server' extra"
+        ) from e
+
+    uvicorn.run(RefAssistServer(query_handler, pool_size), host=host, port=port)
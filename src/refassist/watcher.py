@@ -0,0 +1,108 @@
+from typing import Callable, Dict, Optional, Tuple
+import threading
+
+from refassist.loader import DocumentLoader
+from refassist.ml.rag import RAGService
+from refassist.log import logger
+
+WATCH_INTERVAL = 1.0
+WATCH_DEBOUNCE = 0.5
+
+Snapshot = Dict[str, Tuple[int, float]]
+
+
+class DocsWatcher:
+    """Background thread that keeps the persistent index in sync with the docs.
+
+    The tree is polled every ``interval`` seconds with the same pruned scan
+    the loader uses, comparing each file's size and mtime. Once a change is
+    seen the watcher waits until the tree has been quiet for ``debounce``
+    seconds, so a burst of saves or a checkout becomes one sync, and then
+    re-indexes only the files that changed. Updates are written through their
+    own DuckDB cursor inside a single transaction, so queries keep being served
+    from the previous state until the update commits.
+    """
+
+    def __init__(
+        self,
+        rag_service: RAGService,
+        documents_path: str,
+        interval: float = WATCH_INTERVAL,
+        debounce: float = WATCH_DEBOUNCE,
+        on_sync: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> None:
+        self.rag_service = rag_service
+        self.documents_path = documents_path
+        self.interval = interval
+        self.debounce = debounce
+        self.on_sync = on_sync
+        self.generation = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._writer: Optional[RAGService] = None
+
+    def start(self) -> None:
+        if self._thread:
+            return
+        self._writer = self.rag_service.cursor()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="docs-watcher", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Watching {self.documents_path} for changes")
+
+    def stop(self) -> None:
+        """Stop polling, waiting for a sync in progress to finish"""
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._writer.vector_db.close()
+        self._writer = None
+
+    def _scan(self) -> Snapshot:
+        return {
+            str(path): (size, mtime)
+            for path, size, mtime in DocumentLoader.scan(self.documents_path)
+        }
+
+    def _run(self) -> None:
+        # Starting from the manifest means changes made before the watcher
+        # started are picked up too
+        snapshot: Snapshot = {
+            path: (size, mtime)
+            for path, (size, mtime, _) in self._writer.vector_db.get_manifest().items()
+        }
+
+        while not self._stop.wait(self.interval):
+            try:
+                current = self._scan()
+                if current == snapshot:
+                    continue
+
+                while not self._stop.wait(self.debounce):
+                    settled = self._scan()
+                    if settled == current:
+                        break
+                    current = settled
+                else:
+                    return
+
+                stats = self._writer.sync(self.documents_path)
+                snapshot = current
+                self.generation += 1
+                if self.on_sync:
+                    self.on_sync(stats)
+
+            except Exception as e:
+                # Leave the snapshot alone so that the next poll retries
+                logger.error(f"Failed to apply watched changes: {e}")
+
+    def __enter__(self) -> "DocsWatcher":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
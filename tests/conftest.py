@@ -1,4 +1,10 @@
+import json
+import re
+import threading
+import time
+import zlib
 import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from typing import List
 from unittest.mock import Mock
@@ -29,3 +35,174 @@ def mock_perplexity_response() -> PerplexityResponse:
         citations=["citation 1", "citation 2"],
         usage={"prompt_tokens": 10, "completion_tokens": 10},
     )
+
+
+class FakeEmbedding:
+    """Deterministic stand-in for the HuggingFace embedding model.
+
+    Tokens are hashed with crc32 rather than ``hash`` so that worker processes
+    produce the same vectors as the test process.
+    """
+
+    def __init__(self, dim: int = 384) -> None:
+        self.dim = dim
+        self.batches: List[int] = []
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(token.encode()) % self.dim] += 1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        self.batches.append(1)
+        return self._embed(text)
+
+    def get_text_embedding_batch(self, texts: List[str], **kwargs) -> List[List[float]]:
+        self.batches.append(len(texts))
+        return [self._embed(text) for text in texts]
+
+
+@pytest.fixture
+def fake_embedding() -> FakeEmbedding:
+    return FakeEmbedding()
+
+
+@pytest.fixture
+def vector_db(monkeypatch, fake_embedding):
+    from refassist.ml.vectordb import VectorDB
+
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+    db = VectorDB(None, embed_batch_size=4)
+    db.connect(in_memory=True)
+    yield db
+    db.close()
+
+
+class StandInPerplexity(ThreadingHTTPServer):
+    """Local OpenAI-compatible chat completions endpoint.
+
+    ``failures`` is a list of status codes returned, in order, before the
+    server starts answering successfully; ``delay`` simulates model latency.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.0) -> None:
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.delay = delay
+        self.failures: List[int] = []
+        self.requests: List[dict] = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StandInPerplexity
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests.append(body)
+            status = self.server.failures.pop(0) if self.server.failures else 200
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+
+        try:
+            time.sleep(self.server.delay)
+            question = body["messages"][-1]["content"].rsplit("Question: ", 1)[-1]
+            if status == 200 and body.get("stream"):
+                self._stream(body, f"Answer: {question}")
+                return
+            if status == 200:
+                payload = {
+                    "id": "stand-in",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {
+                                "role": "assistant",
+                                "content": f"Answer: {question}",
+                            },
+                        }
+                    ],
+                    "citations": ["test.md"],
+                    "usage": {
+                        "prompt_tokens": 10,
+                        "completion_tokens": 5,
+                        "total_tokens": 15,
+                    },
+                }
+            else:
+                payload = {"error": {"message": "stand-in failure"}}
+
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:
+                self.send_header("Retry-After", "0")
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def _stream(self, body: dict, answer: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        tokens = [f"{word} " for word in answer.split()]
+        for i, token in enumerate(tokens):
+            last = i == len(tokens) - 1
+            chunk = {
+                "id": "stand-in",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"role": "assistant", "content": token},
+                        "finish_reason": "stop" if last else None,
+                    }
+                ],
+                "citations": ["test.md"],
+            }
+            if last:
+                chunk["usage"] = {
+                    "prompt_tokens": 10,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": 10 + len(tokens),
+                }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+@pytest.fixture
+def perplexity_server():
+    server = StandInPerplexity()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+from refassist.batch import percentiles, read_questions, run_batch
+from refassist.client import PerplexityClient
+from refassist.query import QueryHandler
+
+
+def test_read_questions_from_jsonl_and_csv(tmp_path) -> None:
+    jsonl = tmp_path / "questions.jsonl"
+    jsonl.write_text('"What is it?"\n{"id": "q2", "query": "How?"}\n\n')
+    assert read_questions(jsonl) == [
+        {"id": "0", "question": "What is it?"},
+        {"id": "q2", "question": "How?"},
+    ]
+
+    table = tmp_path / "questions.csv"
+    table.write_text("id,question\na,Why?\nb,When?\n")
+    assert [q["id"] for q in read_questions(table)] == ["a", "b"]
+
+
+def test_run_batch_bounds_concurrency_and_reports_usage(
+    perplexity_server, sample_documents, tmp_path
+) -> None:
+    perplexity_server.delay = 0.05
+    questions = [{"id": str(i), "question": f"Question {i}?"} for i in range(8)]
+    output = tmp_path / "results.jsonl"
+
+    async def run():
+        async with PerplexityClient(
+            "test-key", base_url=perplexity_server.base_url
+        ) as client:
+            handler = QueryHandler(client=client, documents=sample_documents)
+            return await run_batch(handler, questions, output, concurrency=3)
+
+    summary = asyncio.run(run())
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+
+    assert sorted(r["id"] for r in records) == [str(i) for i in range(8)]
+    assert all(r["answer"] == f"Answer: {r['question']}" for r in records)
+    assert 1 < perplexity_server.max_active <= 3
+    assert summary["failed"] == 0
+    assert summary["usage"]["total_tokens"] == 8 * 15
+    assert set(summary["latency_s"]) == {
+        "context",
+        "generation",
+        "post_processing",
+        "total",
+    }
+
+
+def test_percentiles_use_nearest_rank() -> None:
+    summary = percentiles([float(v) for v in range(1, 101)])
+    assert (summary["p50"], summary["p90"], summary["p99"]) == (50.0, 90.0, 99.0)
+    assert percentiles([]) == {}
@@ -0,0 +1,48 @@
+import asyncio
+
+from refassist.citations import SourceIndex, match_citations
+from refassist.client import PerplexityClient
+from refassist.models import SourceMatch
+from refassist.query import QueryHandler
+
+
+def test_source_index_resolves_paths_and_urls() -> None:
+    index = SourceIndex(["/repo/docs/guide/install.md", "/repo/docs/index.md"])
+
+    assert index.lookup("https://example.com/docs/guide/install") == [
+        "/repo/docs/guide/install.md"
+    ]
+    assert index.lookup("guide/Install.md") == ["/repo/docs/guide/install.md"]
+    assert index.lookup("docs/index.html") == ["/repo/docs/index.md"]
+    assert index.lookup("https://other.org/3/library/index.html") == []
+    assert index.lookup("https://example.com/") == []
+
+
+def test_match_citations_only_considers_context() -> None:
+    index = SourceIndex(["a.md", "b.md", "c.md"])
+    sections = [("a.md", 1, "run --store-files first"), ("b.md", 2, "see c.md")]
+
+    found = match_citations(
+        ["--store-files", "c.md", "b.md", ""], sections, index, ["a.md", "b.md"]
+    )
+
+    assert found == [
+        SourceMatch("--store-files", "a.md", chunk_id=1, offset=4),
+        SourceMatch("c.md", "b.md", chunk_id=2, offset=4),
+        SourceMatch("b.md", "b.md"),
+    ]
+
+
+def test_process_query_maps_citations_to_sources(
+    perplexity_server, sample_documents
+) -> None:
+    async def run():
+        async with PerplexityClient(
+            "test-key", base_url=perplexity_server.base_url
+        ) as client:
+            handler = QueryHandler(client=client, documents=sample_documents)
+            return await handler.process_query("What?")
+
+    result = asyncio.run(run())
+    assert result.sources == ["test.md"]
+    assert result.citations == [SourceMatch("test.md", "test.md")]
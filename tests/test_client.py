@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from openai import APIConnectionError, BadRequestError, RateLimitError
+
+from refassist.client import MAX_RETRY_DELAY, PerplexityClient
+
+
+def _client(server, **kwargs) -> PerplexityClient:
+    return PerplexityClient(
+        "test-key", base_url=server.base_url, retry_backoff=0.01, **kwargs
+    )
+
+
+def test_query_document_parses_response(perplexity_server) -> None:
+    async def run():
+        async with _client(perplexity_server) as client:
+            return await client.query_document("What is it?", context="docs")
+
+    response = asyncio.run(run())
+    assert response.content == "Answer: What is it?"
+    assert response.citations == ["test.md"]
+    assert response.usage["total_tokens"] == 15
+
+
+def test_query_document_retries_rate_limits_and_server_errors(perplexity_server) -> None:
+    perplexity_server.failures = [429, 503]
+
+    async def run():
+        async with _client(perplexity_server) as client:
+            return await client.query_document("Retry?", context="docs")
+
+    assert asyncio.run(run()).content == "Answer: Retry?"
+    assert len(perplexity_server.requests) == 3
+
+
+def test_query_document_does_not_retry_client_errors(perplexity_server) -> None:
+    perplexity_server.failures = [400]
+
+    async def run():
+        async with _client(perplexity_server) as client:
+            await client.query_document("Bad?", context="docs")
+
+    with pytest.raises(BadRequestError):
+        asyncio.run(run())
+    assert len(perplexity_server.requests) == 1
+
+
+def test_retry_delays_are_capped(perplexity_server) -> None:
+    request = httpx.Request("POST", perplexity_server.base_url)
+    rate_limited = RateLimitError(
+        "Too many requests",
+        response=httpx.Response(429, headers={"Retry-After": "86400"}, request=request),
+        body=None,
+    )
+
+    async def run():
+        async with _client(perplexity_server, max_retries=20) as client:
+            return (
+                client._retry_delay(0, rate_limited),
+                client._retry_delay(19, APIConnectionError(request=request)),
+            )
+
+    assert asyncio.run(run()) == (MAX_RETRY_DELAY, MAX_RETRY_DELAY)
+
+
+def test_queries_run_concurrently_up_to_the_limit(perplexity_server) -> None:
+    perplexity_server.delay = 0.2
+
+    async def run():
+        async with _client(perplexity_server, max_concurrency=4) as client:
+            return await asyncio.gather(
+                *(client.query_document(f"q{i}", context="docs") for i in range(8))
+            )
+
+    start = time.perf_counter()
+    responses = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    assert len(responses) == 8
+    assert perplexity_server.max_active == 4
+    assert elapsed < 8 * 0.2
+
+
+def test_stream_document_emits_tokens_and_assembles_response(perplexity_server) -> None:
+    tokens = []
+
+    async def run():
+        async with _client(perplexity_server) as client:
+            return await client.stream_document(
+                "Stream me", context="docs", on_token=tokens.append
+            )
+
+    response = asyncio.run(run())
+    assert tokens == ["Answer: ", "Stream ", "me "]
+    assert response.content == "Answer: Stream me "
+    assert response.citations == ["test.md"]
+    assert response.usage["completion_tokens"] == 3
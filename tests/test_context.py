@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from refassist.context import ContextBuilder, estimate_tokens, merge_overlap
+from refassist.models import Document
+
+
+def _match(chunk_id, doc_id, chunk_index, text, similarity, file="a.md") -> dict:
+    return {
+        "chunk_id": chunk_id,
+        "doc_id": doc_id,
+        "chunk_index": chunk_index,
+        "chunk_text": text,
+        "similarity": similarity,
+        "file": file,
+    }
+
+
+def test_merge_overlap_removes_shared_text() -> None:
+    first = "alpha beta gamma delta epsilon zeta"
+    second = "delta epsilon zeta eta theta"
+    assert merge_overlap(first, second) == "alpha beta gamma delta epsilon zeta eta theta"
+
+
+def test_from_matches_merges_neighbours_and_ranks_spans() -> None:
+    matches = [
+        _match(1, 1, 0, "one two three", 0.80),
+        _match(2, 1, 1, "two three four", 0.90),
+        _match(3, 2, 4, "unrelated chunk", 0.95, file="b.md"),
+        _match(4, 3, 0, "one two three", 0.70, file="c.md"),
+    ]
+
+    packed = ContextBuilder(token_budget=1000).from_matches(matches)
+
+    assert (
+        packed.text == "Source: b.md\nunrelated chunk\n\nSource: a.md\none two three four"
+    )
+    assert packed.files == ["b.md", "a.md"]
+    assert packed.chunk_ids == [3, 1, 2]
+    assert packed.tokens_used == estimate_tokens(packed.text)
+
+
+def test_packing_stops_at_the_budget() -> None:
+    documents = [
+        Document(content="x" * 400, path=Path(f"{i}.md"), metadata={}) for i in range(10)
+    ]
+
+    packed = ContextBuilder(token_budget=250).from_documents(documents)
+
+    assert packed.tokens_used <= 250
+    assert estimate_tokens(packed.text) <= packed.tokens_used
+    assert packed.files == ["0.md", "1.md", "2.md"]
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+from llama_index.core import Document as LlamaDocument
+
+from refassist.ml.rag import RAGService
+from refassist.ml.vectordb import VectorDB
+
+WORDS = (
+    "the index stores each chunk with its vector and file path for later search".split()
+)
+
+
+@pytest.fixture
+def dedup_db(monkeypatch, fake_embedding, request):
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+    db = VectorDB(None, embed_batch_size=4, dedup=getattr(request, "param", "exact"))
+    db.connect(in_memory=True)
+    yield db
+    db.close()
+
+
+def _versions(text: str, count: int = 3) -> list:
+    return [
+        LlamaDocument(text=text, metadata={"file_path": f"v{i}/guide.md"})
+        for i in range(count)
+    ]
+
+
+def _count(db: VectorDB, table: str) -> int:
+    return db.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_exact_duplicates_share_one_embedding(dedup_db) -> None:
+    dedup_db.process_documents(_versions("Install with pip install refassist."))
+    dedup_db.create_embeddings()
+
+    assert _count(dedup_db, "chunks") == 3
+    assert _count(dedup_db, "embeddings") == 1
+    assert _count(dedup_db, "chunk_lengths") == 1
+
+    matches = dedup_db.rag_query("pip install", top_k=5)
+    assert [m["file"] for m in matches] == ["v0/guide.md"]
+    assert matches[0]["duplicate_files"] == ["v1/guide.md", "v2/guide.md"]
+
+
+@pytest.mark.parametrize("dedup_db", ["near"], indirect=True)
+def test_near_duplicates_are_detected(dedup_db) -> None:
+    words = random.Random(0).choices(WORDS, k=400)
+    edited = words.copy()
+    edited[200] = "changed"
+    dedup_db.process_documents(
+        [
+            LlamaDocument(text=" ".join(words), metadata={"file_path": "v1/a.md"}),
+            LlamaDocument(text=" ".join(edited), metadata={"file_path": "v2/a.md"}),
+            LlamaDocument(text="Unrelated page.", metadata={"file_path": "v2/b.md"}),
+        ]
+    )
+    dedup_db.create_embeddings()
+
+    assert dedup_db.deduplicator.stats() == {"exact_duplicates": 0, "near_duplicates": 1}
+    assert _count(dedup_db, "embeddings") == 2
+
+
+def test_removing_the_canonical_chunk_promotes_a_duplicate(dedup_db) -> None:
+    dedup_db.process_documents(_versions("Install with pip install refassist."))
+    dedup_db.create_embeddings()
+
+    dedup_db.remove_files(["v0/guide.md"])
+
+    assert _count(dedup_db, "embeddings") == 1
+    matches = dedup_db.rag_query("pip install", top_k=5)
+    assert [m["file"] for m in matches] == ["v1/guide.md"]
+    assert matches[0]["duplicate_files"] == ["v2/guide.md"]
+
+    # The promoted chunk is canonical for later ingests as well
+    dedup_db.process_documents(_versions("Install with pip install refassist.", 4)[3:])
+    assert _count(dedup_db, "chunk_duplicates") == 2
+
+
+def test_sync_reports_dedup_savings(monkeypatch, tmp_path, fake_embedding) -> None:
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+    for version in ("v1", "v2"):
+        (tmp_path / "docs" / version).mkdir(parents=True)
+        (tmp_path / "docs" / version / "guide.md").write_text("# Guide\n\nSame text.")
+
+    service = RAGService(str(tmp_path / "rag.db"), dedup="exact")
+    service.vector_db.connect()
+    stats = service.sync(str(tmp_path / "docs"))
+    service.close()
+
+    assert stats["duplicate_chunks"] == 1
+    assert stats["embeddings_saved"] == 1
+    assert stats["embedding_bytes_saved"] == 384 * 4
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+from llama_index.core import Document as LlamaDocument
+
+from refassist.ml.diversity import mmr_select
+from refassist.ml import rag
+from refassist.ml.rag import RAGService
+from refassist.ml.rerank import Reranker
+from refassist.ml.vectordb import VectorDB
+
+
+def _unit(*rows) -> np.ndarray:
+    vectors = np.array(rows, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_mmr_skips_near_copies_of_picked_candidates() -> None:
+    vectors = _unit([1, 0, 0], [1, 0.01, 0], [0.6, 0.8, 0])
+    relevance = np.array([0.9, 0.89, 0.6], dtype=np.float32)
+
+    assert mmr_select(relevance, vectors, 2, mmr_lambda=1.0) == [0, 1]
+    assert mmr_select(relevance, vectors, 2, mmr_lambda=0.5) == [0, 2]
+
+
+def test_mmr_collapses_documents_and_neighbours() -> None:
+    vectors = _unit([1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 1])
+    relevance = np.array([0.9, 0.8, 0.7, 0.6], dtype=np.float32)
+    doc_ids = np.array([1, 1, 1, 2])
+    chunk_indexes = np.array([0, 1, 2, 0])
+
+    assert mmr_select(
+        relevance, vectors, 3, 1.0, doc_ids, chunk_indexes, collapse="doc"
+    ) == [0, 3]
+    assert mmr_select(
+        relevance, vectors, 3, 1.0, doc_ids, chunk_indexes, collapse="neighbours"
+    ) == [0, 2, 3]
+
+    with pytest.raises(ValueError):
+        mmr_select(relevance, vectors, 3, collapse="neighbours", doc_ids=doc_ids)
+
+
+def test_rag_query_diversifies_repeated_text(vector_db) -> None:
+    text = "Configure the cache with cache_size and cache_ttl options."
+    vector_db.process_documents_memory(
+        [
+            LlamaDocument(
+                text=f"Version {i}: {text}", metadata={"file_path": f"v{i}/cache.md"}
+            )
+            for i in range(3)
+        ]
+        + [
+            LlamaDocument(
+                text="The cache is cleared on restart.",
+                metadata={"file_path": "faq.md"},
+            )
+        ]
+    )
+    vector_db.create_embeddings_memory()
+
+    plain = vector_db.rag_query("cache options", top_k=2)
+    assert all(m["file"].endswith("/cache.md") for m in plain)
+
+    diverse = vector_db.rag_query("cache options", top_k=2, mmr_lambda=0.5)
+    assert diverse[0]["file"].endswith("/cache.md")
+    assert diverse[1]["file"] == "faq.md"
+
+
+def test_mmr_still_diversifies_the_reranker_pool(
+    monkeypatch, fake_embedding, tmp_path
+) -> None:
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+    # The fake embeddings score well below the service's threshold
+    monkeypatch.setattr(rag, "SIMILARITY_THRESHOLD", 0.0)
+    pools = []
+    monkeypatch.setattr(
+        Reranker,
+        "rerank",
+        lambda self, query, matches: pools.append(matches) or matches[: self.top_k],
+    )
+    service = RAGService(
+        str(tmp_path / "rag.db"),
+        rerank=True,
+        rerank_top_k=2,
+        rerank_candidates=4,
+        mmr=True,
+        mmr_candidates=4,
+    )
+    service.vector_db.connect(in_memory=True)
+    text = "Configure the cache with cache_size and cache_ttl options."
+    service.vector_db.process_documents_memory(
+        [
+            LlamaDocument(
+                text=f"Version {i}: {text}", metadata={"file_path": f"v{i}/cache.md"}
+            )
+            for i in range(6)
+        ]
+        + [
+            LlamaDocument(
+                text="The cache is cleared on restart.",
+                metadata={"file_path": "faq.md"},
+            )
+        ]
+    )
+    service.vector_db.create_embeddings_memory()
+
+    # The reranker's four candidates are picked from more than four chunks
+    service.query("cache options", top_k=2)
+    assert len(pools[0]) == 4
+    assert "faq.md" in {m["file"] for m in pools[0]}
+    service.close()
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from refassist.ml.embedding import OnnxEmbedding, cache_model_name
+from refassist.ml.vectordb import MODEL_NAME, VectorDB
+
+
+class FakeTokenizer:
+    def __call__(self, texts, **kwargs) -> dict:
+        lengths = [len(text.split()) for text in texts]
+        width = max(lengths)
+        ids = np.array([[i + 1] * width for i in range(len(texts))])
+        mask = np.array([[1] * n + [0] * (width - n) for n in lengths])
+        return {"input_ids": ids, "attention_mask": mask, "token_type_ids": 0 * ids}
+
+
+class FakeSession:
+    """Hidden states whose CLS row is (3 * id, 4 * id, ...) for each sequence"""
+
+    def __init__(self) -> None:
+        self.batches = []
+
+    def run(self, outputs, feeds) -> list:
+        ids = feeds["input_ids"]
+        self.batches.append(len(ids))
+        hidden = np.zeros((*ids.shape, 4), dtype=np.float32)
+        hidden[:, :, 0] = 3 * ids
+        hidden[:, :, 1] = 4 * ids
+        return [hidden]
+
+
+def test_onnx_embedding_pools_cls_and_normalizes() -> None:
+    model = OnnxEmbedding.__new__(OnnxEmbedding)
+    model.tokenizer = FakeTokenizer()
+    model.session = FakeSession()
+    model.input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    model.max_length = 512
+    model.embed_batch_size = 2
+
+    vectors = model.get_text_embedding_batch(["a b", "c", "d e f"])
+    assert model.session.batches == [2, 1]
+    assert np.allclose(vectors, [[0.6, 0.8, 0.0, 0.0]] * 3)
+    assert np.allclose(model.get_text_embedding("g"), [0.6, 0.8, 0.0, 0.0])
+
+
+def test_embedding_backend_selects_cache_namespace() -> None:
+    assert cache_model_name(MODEL_NAME, "onnx") == cache_model_name(MODEL_NAME, "torch")
+    assert cache_model_name(MODEL_NAME, "onnx-int8") != MODEL_NAME
+
+    with pytest.raises(ValueError):
+        VectorDB(None, embedding_backend="tensorrt")
@@ -0,0 +1,20 @@
+from refassist.ml.lexical import reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_identifiers_whole() -> None:
+    assert tokenize("Use get_text_embedding() with --embed-batch-size=64") == [
+        "use",
+        "get_text_embedding",
+        "with",
+        "embed",
+        "batch",
+        "size",
+        "64",
+    ]
+
+
+def test_reciprocal_rank_fusion_applies_weights() -> None:
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4]], [1.0, 2.0], k=1)
+
+    assert [item for item, _ in fused] == [3, 4, 1, 2]
+    assert fused[0][1] == 1.0 / 4 + 2.0 / 2
@@ -0,0 +1,60 @@
+import pytest
+
+from refassist.loader import DocumentLoader
+
+
+@pytest.fixture
+def docs_tree(tmp_path):
+    root = tmp_path / "docs"
+    (root / "guide").mkdir(parents=True)
+    (root / "node_modules" / "pkg").mkdir(parents=True)
+    (root / ".git").mkdir()
+
+    for i in range(20):
+        (root / "guide" / f"page_{i}.md").write_text(f"Page {i}")
+    (root / "index.rst").write_text("Index")
+    (root / "image.png").write_bytes(b"\x89PNG")
+    (root / "node_modules" / "pkg" / "README.md").write_text("vendored")
+    (root / ".git" / "HEAD.txt").write_text("ref")
+    return root
+
+
+def test_scan_skips_ignored_directories(docs_tree) -> None:
+    paths = {
+        path.relative_to(docs_tree).as_posix()
+        for path, _, _ in DocumentLoader.scan(docs_tree)
+    }
+
+    assert "index.rst" in paths
+    assert len(paths) == 21
+    assert not any(p.startswith(("node_modules", ".git")) for p in paths)
+
+
+def test_stream_preserves_scan_order_and_metadata(docs_tree) -> None:
+    entries = list(DocumentLoader.scan(docs_tree))
+    documents = list(DocumentLoader.stream_files(entries, workers=4, prefetch=3))
+
+    assert [doc.path for doc in documents] == [path for path, _, _ in entries]
+    for doc, (path, size, mtime) in zip(documents, entries):
+        assert doc.content == path.read_text()
+        assert doc.metadata == {"size": size, "modified": mtime}
+
+
+def test_stream_reads_lazily(docs_tree) -> None:
+    stream = DocumentLoader.stream_documentation(docs_tree, workers=2, prefetch=2)
+
+    first = next(stream)
+    stream.close()
+
+    assert first.content
+
+
+def test_load_documentation_errors(tmp_path) -> None:
+    with pytest.raises(FileNotFoundError):
+        DocumentLoader.load_documentation(tmp_path / "missing")
+
+    (tmp_path / "notes.pdf").write_bytes(b"%PDF")
+    with pytest.raises(ValueError):
+        DocumentLoader.load_documentation(tmp_path / "notes.pdf")
+    with pytest.raises(ValueError):
+        DocumentLoader.load_documentation(tmp_path)
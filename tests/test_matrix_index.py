@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from llama_index.core import Document as LlamaDocument
+
+from refassist.ml import matrix_index
+from refassist.ml.matrix_index import MatrixIndex
+from refassist.ml.vectordb import VectorDB
+
+
+def _documents(count: int, prefix: str = "docs") -> list:
+    return [
+        LlamaDocument(
+            text=f"Topic {i % 7} note {i}: setting_{i} controls option {i % 5}.",
+            metadata={"file_path": f"{prefix}/doc_{i}.md"},
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def matrix_db(monkeypatch, fake_embedding, tmp_path):
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+    db = VectorDB(str(tmp_path / "rag.db"), embed_batch_size=8, search_backend="matrix")
+    db.connect()
+    yield db
+    db.close()
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_matrix_search_matches_exact_scan(monkeypatch, fake_embedding, dtype) -> None:
+    # Small blocks exercise merging the running top-k across blocks
+    monkeypatch.setattr(matrix_index, "MATRIX_BLOCK_ROWS", 7)
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+    db = VectorDB(None, search_backend="matrix", matrix_dtype=dtype)
+    db.connect(in_memory=True)
+    db.process_documents_memory(_documents(40))
+    db.create_embeddings_memory()
+
+    queries = ["setting_12 controls", "topic 3 option 1", "note 41"]
+    exact = [db.rag_query(q, top_k=5, exact=True) for q in queries]
+    searches = []
+    search = MatrixIndex.search
+    monkeypatch.setattr(
+        MatrixIndex,
+        "search",
+        lambda self, *args: searches.append(1) or search(self, *args),
+    )
+    # Tied chunks may come back in either order, so compare scores
+    found = [db.rag_query(q, top_k=5) for q in queries]
+    assert [
+        pytest.approx([m["similarity"] for m in matches], abs=1e-2) for matches in found
+    ] == [[m["similarity"] for m in matches] for matches in exact]
+    # Only chunk 13 holds setting_12, so it leads both
+    assert found[0][0]["chunk_id"] == exact[0][0]["chunk_id"] == 13
+
+    batched = db.rag_query_batch(queries, top_k=5)
+    assert [
+        pytest.approx([m["similarity"] for m in matches], abs=1e-5) for matches in batched
+    ] == [[m["similarity"] for m in db.rag_query(q, top_k=5)] for q in queries]
+    # Every query but the exact ones went through the matrix
+    assert len(searches) == 2 * len(queries) + 1
+    assert len(db.matrix_index) == 40
+    db.close()
+
+
+def test_snapshot_is_mapped_and_follows_writes(matrix_db, monkeypatch, tmp_path) -> None:
+    matrix_db.process_documents(_documents(10))
+    matrix_db.create_embeddings()
+
+    found = matrix_db.rag_query("setting_3 controls", top_k=1)
+    assert found[0]["file"] == "docs/doc_3.md"
+    vectors, _ = matrix_db.matrix_index._snapshot
+    assert isinstance(vectors, np.memmap)
+    assert len(list((tmp_path / "rag.db.vectors").glob("vectors-*.npy"))) == 1
+
+    matrix_db.remove_files(["docs/doc_3.md"])
+    assert len(matrix_db.matrix_index) == 10
+    matrix_db.rag_query("setting_3 controls", top_k=1)
+    assert len(matrix_db.matrix_index) == 9
+    # The superseded snapshot is removed
+    assert len(list((tmp_path / "rag.db.vectors").glob("vectors-*.npy"))) == 1
+
+    # A second process maps the current snapshot instead of exporting again
+    exports = []
+    monkeypatch.setattr(MatrixIndex, "_export", lambda self: exports.append(1))
+    other = VectorDB(str(tmp_path / "rag.db"), search_backend="matrix")
+    matrix_db.close()
+    other.connect()
+    assert len(other.matrix_index) == 9
+    assert exports == []
+    other.close()
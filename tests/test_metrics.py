@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from refassist.client import PerplexityClient
+from refassist.metrics import Metrics, metrics
+from refassist.query import QueryHandler
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+    metrics.reset()
+
+
+def test_disabled_metrics_record_nothing() -> None:
+    local = Metrics()
+    with local.span("llm"):
+        pass
+    local.incr("queries")
+    local.record_query({"total": 0.1}, {"prompt_tokens": 5}, "exact", 3)
+
+    assert local.span("llm") is local.span("retrieval")
+    assert local.snapshot() == {"stages": {}, "counters": {}}
+    assert local.render_prometheus() == "\n"
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    local = Metrics(buckets=(0.1, 1.0))
+    local.enable()
+    for seconds in (0.05, 0.1, 0.5, 2.0):
+        local.observe("llm", seconds)
+
+    text = local.render_prometheus()
+    assert 'refassist_stage_seconds_bucket{stage="llm",le="0.1"} 2' in text
+    assert 'refassist_stage_seconds_bucket{stage="llm",le="1.0"} 3' in text
+    assert 'refassist_stage_seconds_bucket{stage="llm",le="+Inf"} 4' in text
+    assert 'refassist_stage_seconds_count{stage="llm"} 4' in text
+
+
+def test_counters_are_exported_exactly() -> None:
+    local = Metrics()
+    local.enable()
+    local.incr("tokens", 1234567, kind="prompt")
+    local.incr("retrieval_seconds", 0.1)
+    local.incr("retrieval_seconds", 0.2)
+
+    text = local.render_prometheus()
+    assert 'refassist_tokens_total{kind="prompt"} 1234567\n' in text
+    assert f"refassist_retrieval_seconds_total {0.1 + 0.2!r}\n" in text
+
+
+def test_process_query_exports_stages_and_tokens(
+    enabled_metrics, perplexity_server, sample_documents
+) -> None:
+    async def run():
+        async with PerplexityClient(
+            "test-key", base_url=perplexity_server.base_url
+        ) as client:
+            handler = QueryHandler(client=client, documents=sample_documents)
+            await handler.process_query("What?")
+            await handler.process_query("Why?")
+
+    asyncio.run(run())
+    snapshot = enabled_metrics.snapshot()
+
+    for stage in ("context", "generation", "post_processing", "total"):
+        assert snapshot["stages"][stage]["count"] == 2
+    assert snapshot["counters"]["queries_total"] == 2
+    assert snapshot["counters"]['tokens_total{kind="prompt"}'] == 20
+    assert snapshot["counters"]['tokens_total{kind="completion"}'] == 10
+    assert (
+        'refassist_tokens_total{kind="prompt"} 20' in enabled_metrics.render_prometheus()
+    )
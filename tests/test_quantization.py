@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from llama_index.core import Document as LlamaDocument
+
+from refassist.ml.quantization import QuantizedIndex
+from refassist.ml.vectordb import VectorDB
+
+
+def _documents(count: int) -> list:
+    return [
+        LlamaDocument(
+            text=f"Topic {i % 7} note {i}: setting_{i} controls option {i % 5}.",
+            metadata={"file_path": f"docs/doc_{i}.md"},
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture(params=["int8", "binary"])
+def quantized_db(request, monkeypatch, fake_embedding):
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+    db = VectorDB(None, embed_batch_size=8, quantization=request.param)
+    db.connect(in_memory=True)
+    yield db
+    db.close()
+
+
+def test_quantized_search_recalls_exact_matches(quantized_db) -> None:
+    quantized_db.process_documents_memory(_documents(60))
+    quantized_db.create_embeddings_memory()
+
+    footprint = quantized_db.quantized_index.footprint()
+    assert footprint["vectors"] == 60
+    assert footprint["code_bytes"] * 4 <= footprint["float32_bytes"]
+
+    for query in ("setting_12 controls", "topic 3 option 1", "note 41"):
+        exact = quantized_db.rag_query(query, top_k=5, exact=True)
+        quantized = quantized_db.rag_query(query, top_k=5)
+        assert quantized[0]["chunk_id"] == exact[0]["chunk_id"]
+        # Re-scoring uses the float vectors, so shared hits score identically
+        scores = {m["chunk_id"]: m["similarity"] for m in exact}
+        for match in quantized:
+            if match["chunk_id"] in scores:
+                assert match["similarity"] == pytest.approx(scores[match["chunk_id"]])
+
+
+def test_codes_follow_document_removal(quantized_db) -> None:
+    quantized_db.process_documents_memory(_documents(4))
+    quantized_db.create_embeddings_memory()
+
+    doc_id = quantized_db.conn.execute(
+        "SELECT id FROM documents WHERE file = 'docs/doc_0.md'"
+    ).fetchone()[0]
+    quantized_db._remove_old_data([doc_id])
+
+    assert quantized_db.quantized_index.footprint()["vectors"] == 3
+
+
+def test_int8_codes_are_calibrated_once(vector_db) -> None:
+    index = QuantizedIndex(vector_db.conn, "int8", 4)
+    index.initialize_schema()
+    index.scale = None
+    index._calibrate(np.array([[0.5, -0.25, 0.0, 0.1]], dtype=np.float32))
+
+    codes = index.quantize_int8(np.array([[0.5, -0.25, 1.0, 0.0]], dtype=np.float32))
+    assert codes.tolist() == [[127, -64, 127, 0]]
+    assert QuantizedIndex.sign_bits(np.array([[0.3, -0.1, 0.0, 2.0]])) == ["1001"]
@@ -0,0 +1,73 @@
+import asyncio
+
+from refassist.client import PerplexityClient
+from refassist.query import QueryHandler
+
+
+def test_process_query_streams_and_reports_timings(
+    perplexity_server, sample_documents
+) -> None:
+    tokens = []
+
+    async def run():
+        async with PerplexityClient(
+            "test-key", base_url=perplexity_server.base_url
+        ) as client:
+            handler = QueryHandler(client=client, documents=sample_documents)
+            return await handler.process_query("What?", on_token=tokens.append)
+
+    result = asyncio.run(run())
+    assert "".join(tokens) == result.answer
+    assert 0 < result.timings["time_to_first_token"] <= result.timings["total"]
+
+
+def test_repeated_query_is_answered_from_cache(
+    perplexity_server, sample_documents, tmp_path
+) -> None:
+    async def run():
+        async with PerplexityClient(
+            "test-key", base_url=perplexity_server.base_url
+        ) as client:
+            handler = QueryHandler(
+                client=client,
+                documents=sample_documents,
+                db_path=str(tmp_path / "cache.db"),
+                cache_responses=True,
+            )
+            first = await handler.process_query("What?")
+            second = await handler.process_query("what")
+            handler.close()
+            return first, second
+
+    first, second = asyncio.run(run())
+    assert len(perplexity_server.requests) == 1
+    assert first.cache_hit is None
+    assert second.cache_hit == "exact"
+    assert second.answer == first.answer
+
+
+def test_response_cache_only_uses_files_it_is_given(
+    perplexity_server, sample_documents, tmp_path
+) -> None:
+    cache_path = tmp_path / "answers.db"
+
+    async def run():
+        async with PerplexityClient(
+            "test-key", base_url=perplexity_server.base_url
+        ) as client:
+            handlers = [
+                QueryHandler(client=client, documents=sample_documents, **options)
+                for options in (
+                    {"cache_responses": True},
+                    {"cache_responses": True, "cache_path": str(cache_path)},
+                )
+            ]
+            for handler in handlers:
+                handler.close()
+            return handlers
+
+    basic, configured = asyncio.run(run())
+    # Without a database file of its own, basic mode caches in memory
+    assert basic.response_cache.db_path is None
+    assert configured.response_cache.db_path == str(cache_path)
+    assert cache_path.exists()
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from refassist.ml.rag import RAGService
+from refassist.ml.vectordb import VectorDB
+
+
+@pytest.fixture
+def rag_service(monkeypatch, tmp_path, fake_embedding):
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+    service = RAGService(str(tmp_path / "rag.db"))
+    service.vector_db.connect()
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def docs_dir(tmp_path):
+    root = tmp_path / "docs"
+    root.mkdir()
+    for i in range(5):
+        (root / f"page_{i}.md").write_text(f"# Page {i}\n\nDetails for page {i}.")
+    return root
+
+
+def test_sync_only_processes_changed_files(rag_service, docs_dir) -> None:
+    assert rag_service.sync(str(docs_dir)) == {"scanned": 5, "changed": 5, "deleted": 0}
+    assert rag_service.sync(str(docs_dir)) == {"scanned": 5, "changed": 0, "deleted": 0}
+
+    (docs_dir / "page_0.md").unlink()
+    (docs_dir / "page_1.md").write_text("# Page 1\n\nRewritten.")
+    touched = (docs_dir / "page_2.md").stat().st_mtime + 10
+    os.utime(docs_dir / "page_2.md", (touched, touched))
+
+    assert rag_service.sync(str(docs_dir)) == {"scanned": 4, "changed": 2, "deleted": 1}
+
+    conn = rag_service.vector_db.conn
+    files = {row[0] for row in conn.execute("SELECT file FROM documents").fetchall()}
+    assert str(docs_dir / "page_0.md") not in files
+    assert conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] == 4
+    assert conn.execute("SELECT COUNT(*) FROM manifest").fetchone()[0] == 4
+
+
+def test_document_hashes_skip_uncommitted_syncs(rag_service, docs_dir) -> None:
+    rag_service.sync(str(docs_dir))
+    before = rag_service.document_hashes()
+
+    with rag_service.vector_db.transaction():
+        rag_service.vector_db.update_manifest([("pending.md", 1, 0.0, "hash")])
+        assert rag_service.document_hashes() == before
+    assert rag_service.document_hashes()["pending.md"] == "hash"
+
+
+def test_in_memory_initialize_streams_and_records_hashes(
+    monkeypatch, tmp_path, fake_embedding, docs_dir
+) -> None:
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+    service = RAGService(str(tmp_path / "unused.db"))
+    service.initialize(str(docs_dir), in_memory=True)
+
+    hashes = service.document_hashes()
+    assert len(hashes) == 5
+    assert hashes[str(docs_dir / "page_3.md")] == VectorDB._compute_hash(
+        (docs_dir / "page_3.md").read_text()
+    )
+    assert service.query("Details for page 3", top_k=1)
+    service.close()
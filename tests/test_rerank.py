@@ -0,0 +1,63 @@
+import pytest
+
+from refassist.ml.rerank import Reranker
+
+
+class OverlapCrossEncoder:
+    """Scores a pair by how many query words the chunk contains"""
+
+    def __init__(self) -> None:
+        self.pairs = []
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        self.pairs.extend(pairs)
+        return [
+            sum(word in chunk.split() for word in query.split()) for query, chunk in pairs
+        ]
+
+
+@pytest.fixture
+def cross_encoder(monkeypatch):
+    model = OverlapCrossEncoder()
+    monkeypatch.setattr(Reranker, "_setup_model", lambda self: model)
+    return model
+
+
+def candidates(*texts):
+    return [
+        {"chunk_id": i, "chunk_text": text, "similarity": 0.9 - i / 100}
+        for i, text in enumerate(texts)
+    ]
+
+
+def test_rerank_keeps_the_best_scored_chunks(cross_encoder) -> None:
+    reranker = Reranker(top_k=2, candidates=4, batch_size=3)
+    matches = candidates("nothing here", "duckdb index", "duckdb", "duckdb hnsw index")
+
+    kept = reranker.rerank("duckdb hnsw index", matches)
+
+    assert [m["chunk_id"] for m in kept] == [3, 1]
+    assert [m["rerank_score"] for m in kept] == [3.0, 2.0]
+    assert kept[0]["score"] > kept[1]["score"]
+
+
+def test_rerank_reuses_cached_scores(cross_encoder) -> None:
+    reranker = Reranker(top_k=1, candidates=3)
+    matches = candidates("a", "b query", "c")
+
+    reranker.rerank("query", matches)
+    kept = reranker.rerank("query", matches)
+
+    assert len(cross_encoder.pairs) == 3
+    assert reranker.stats()["cache_hits"] == 3
+    assert kept[0]["chunk_id"] == 1
+
+
+def test_rerank_over_budget_falls_back_to_retrieval_order(cross_encoder) -> None:
+    reranker = Reranker(top_k=2, candidates=3, budget=0.0)
+    kept = reranker.rerank("query", candidates("a", "b", "c query"))
+
+    assert cross_encoder.pairs == []
+    assert [m["chunk_id"] for m in kept] == [0, 1]
+    assert kept[0]["rerank_score"] is None
+    assert reranker.stats()["over_budget"] == 1
@@ -0,0 +1,64 @@
+import pytest
+
+from refassist.models import PerplexityResponse
+from refassist.response_cache import ResponseCache
+
+
+@pytest.fixture
+def response_cache(tmp_path, fake_embedding):
+    cache = ResponseCache(
+        str(tmp_path / "cache.db"),
+        embed=fake_embedding.get_text_embedding,
+        similarity_threshold=0.8,
+    )
+    cache.connect()
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def response() -> PerplexityResponse:
+    return PerplexityResponse(
+        content="Use --store-files.", citations=["a.md"], usage={"total_tokens": 3}
+    )
+
+
+def test_exact_hit_ignores_case_and_whitespace(response_cache, response) -> None:
+    response_cache.put("How do I enable RAG?", "ctx", "sonar-pro", 0.2, response, ["h1"])
+
+    cached, layer = response_cache.get("  how do I   enable rag", "ctx", "sonar-pro", 0.2)
+    assert layer == "exact"
+    assert cached == response
+
+    assert response_cache.get("How do I enable RAG?", "other", "sonar-pro", 0.2) == (
+        None,
+        None,
+    )
+    assert response_cache.get("How do I enable RAG?", "ctx", "sonar-pro", 0.7)[0] is None
+
+
+def test_semantic_hit_above_threshold(response_cache, response) -> None:
+    response_cache.put(
+        "how do i enable rag storage", "ctx", "sonar-pro", 0.2, response, []
+    )
+
+    cached, layer = response_cache.get(
+        "enable rag storage how do i", "ctx", "sonar-pro", 0.2
+    )
+    assert layer == "semantic"
+    assert cached.content == response.content
+
+    assert response_cache.get("what is a vector", "ctx", "sonar-pro", 0.2)[0] is None
+    assert response_cache.stats() == {"exact_hits": 0, "semantic_hits": 1, "misses": 1}
+
+
+def test_invalidate_and_evict(response_cache, response) -> None:
+    response_cache.max_entries = 2
+    response_cache.put("q1", "ctx", "sonar-pro", 0.2, response, ["h1"])
+    response_cache.put("q2", "ctx", "sonar-pro", 0.2, response, ["h2"])
+    response_cache.put("q3", "ctx", "sonar-pro", 0.2, response, ["h1", "h3"])
+
+    assert response_cache.get("q1", "ctx", "sonar-pro", 0.2)[0] is None
+    assert response_cache.invalidate({"h1", "h2"}) == 1
+    assert response_cache.get("q2", "ctx", "sonar-pro", 0.2)[1] == "exact"
+    assert response_cache.get("q3", "ctx", "sonar-pro", 0.2)[0] is None
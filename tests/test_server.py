@@ -0,0 +1,95 @@
+import asyncio
+
+import httpx
+import pytest
+
+from refassist.client import PerplexityClient
+from refassist.ml.vectordb import VectorDB
+from refassist.query import QueryHandler
+from refassist.server import RefAssistServer
+
+
+@pytest.fixture
+def docs_dir(tmp_path):
+    root = tmp_path / "docs"
+    root.mkdir()
+    for i in range(5):
+        (root / f"page_{i}.md").write_text(f"# Page {i}\n\nDetails for page {i}.")
+    return root
+
+
+def _run(perplexity_server, tmp_path, docs_dir, requests):
+    async def run():
+        client = PerplexityClient("test-key", base_url=perplexity_server.base_url)
+        handler = QueryHandler(
+            client=client,
+            documents=[],
+            documents_path=str(docs_dir),
+            db_path=str(tmp_path / "server.db"),
+            in_memory=False,
+            store_docs=True,
+        )
+        app = RefAssistServer(handler, pool_size=2)
+        await app.startup()
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://app"
+            ) as http:
+                return await requests(http)
+        finally:
+            await app.shutdown()
+
+    return asyncio.run(run())
+
+
+def test_concurrent_retrieval_and_queries(
+    monkeypatch, fake_embedding, perplexity_server, tmp_path, docs_dir
+) -> None:
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+
+    async def requests(http):
+        retrieved = await asyncio.gather(
+            *(
+                http.post(
+                    "/retrieve", json={"question": f"Details for page {i}", "top_k": 1}
+                )
+                for i in range(5)
+            )
+        )
+        answered = await http.post("/query", json={"question": "Details for page 2"})
+        invalid = await http.post("/retrieve", json={})
+        missing = await http.get("/nowhere")
+        return retrieved, answered, invalid, missing
+
+    retrieved, answered, invalid, missing = _run(
+        perplexity_server, tmp_path, docs_dir, requests
+    )
+
+    for i, response in enumerate(retrieved):
+        assert response.status_code == 200
+        assert response.json()["matches"][0]["file"] == str(docs_dir / f"page_{i}.md")
+    assert answered.json()["answer"] == "Answer: Details for page 2"
+    assert "retrieval" in answered.json()["timings"]
+    assert invalid.status_code == 400
+    assert missing.status_code == 404
+
+
+def test_ingest_syncs_changed_files(
+    monkeypatch, fake_embedding, perplexity_server, tmp_path, docs_dir
+) -> None:
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+
+    async def requests(http):
+        (docs_dir / "page_5.md").write_text("# Page 5\n\nA brand new page.")
+        elsewhere = await http.post("/ingest", json={"path": str(tmp_path)})
+        ingested = await http.post("/ingest", json={})
+        retrieved = await http.post(
+            "/retrieve", json={"question": "A brand new page", "top_k": 1}
+        )
+        return elsewhere, ingested.json(), retrieved.json()
+
+    elsewhere, stats, retrieved = _run(perplexity_server, tmp_path, docs_dir, requests)
+    assert elsewhere.status_code == 400
+    assert stats == {"scanned": 6, "changed": 1, "deleted": 0}
+    assert retrieved["matches"][0]["file"] == str(docs_dir / "page_5.md")
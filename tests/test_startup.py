@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+PROBE = """
+import json, sys
+import refassist.main
+from refassist.client import PerplexityClient
+from refassist.query import QueryHandler
+QueryHandler(PerplexityClient(api_key="test"), documents=[])
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def test_basic_mode_startup_skips_ml_stack():
+    """The CLI must not import torch or llama_index until an embedding is needed"""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": str(SRC)},
+    )
+    modules = json.loads(result.stdout.strip().splitlines()[-1])
+
+    for heavy in ("torch", "transformers", "llama_index", "sympy"):
+        assert not any(m == heavy or m.startswith(f"{heavy}.") for m in modules), heavy
+
+
+def test_vector_db_defers_model_loading(tmp_path, monkeypatch):
+    from refassist.ml.vectordb import VectorDB
+
+    loads = []
+    monkeypatch.setattr(
+        VectorDB, "_setup_embedding_model", lambda self: loads.append(1) or object()
+    )
+
+    db = VectorDB(tmp_path / "test.db")
+    assert loads == []
+
+    assert db.embed_model is db.embed_model
+    assert loads == [1]
@@ -0,0 +1,187 @@
+from llama_index.core import Document as LlamaDocument
+
+
+def _documents(count: int) -> list:
+    return [
+        LlamaDocument(
+            text=f"Document {i} explains the option number {i}.",
+            metadata={"file_path": f"docs/doc_{i}.md"},
+        )
+        for i in range(count)
+    ]
+
+
+def test_create_embeddings_memory_batches(vector_db, fake_embedding) -> None:
+    vector_db.process_documents_memory(_documents(10))
+    vector_db.create_embeddings_memory()
+
+    count = vector_db.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    assert count == 10
+    assert fake_embedding.batches == [4, 4, 2]
+
+
+def test_process_documents_memory_assigns_unique_ids(vector_db) -> None:
+    vector_db.process_documents_memory(_documents(300))
+
+    total, distinct = vector_db.conn.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT id) FROM chunks"
+    ).fetchone()
+    assert total == distinct == 300
+
+
+def test_process_documents_replaces_changed_documents(vector_db) -> None:
+    documents = _documents(3)
+    vector_db.process_documents(documents)
+    vector_db.create_embeddings()
+
+    documents[1] = LlamaDocument(
+        text="Rewritten content.", metadata={"file_path": "docs/doc_1.md"}
+    )
+    vector_db.process_documents(documents)
+    vector_db.create_embeddings()
+
+    rows = vector_db.conn.execute(
+        "SELECT c.chunk_text FROM chunks c JOIN documents d ON d.id = c.doc_id "
+        "WHERE d.file = 'docs/doc_1.md'"
+    ).fetchall()
+    assert rows == [("Rewritten content.",)]
+    assert vector_db.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] == 3
+
+
+def test_rag_query_index_matches_exact_scan(vector_db) -> None:
+    vector_db.process_documents_memory(_documents(20))
+    vector_db.create_embeddings_memory()
+
+    column_type = vector_db.conn.execute(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_name = 'embeddings' AND column_name = 'embedding'"
+    ).fetchone()[0]
+    assert column_type == "FLOAT[384]"
+
+    indexed = vector_db.rag_query("option number 7", top_k=3)
+    exact = vector_db.rag_query("option number 7", top_k=3, exact=True)
+    assert [m["chunk_id"] for m in indexed] == [m["chunk_id"] for m in exact]
+    assert indexed[0]["file"] == "docs/doc_7.md"
+
+
+def test_identical_chunks_are_embedded_once(vector_db, fake_embedding) -> None:
+    documents = [
+        LlamaDocument(text="Shared paragraph.", metadata={"file_path": f"v{i}/a.md"})
+        for i in range(3)
+    ]
+    vector_db.process_documents_memory(documents)
+    vector_db.create_embeddings_memory()
+
+    assert vector_db.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] == 3
+    assert fake_embedding.batches == [1]
+    assert vector_db.embedding_cache.stats() == {"hits": 0, "misses": 3}
+
+
+def test_embedding_cache_evicts_least_recently_used(vector_db) -> None:
+    cache = vector_db.embedding_cache
+    cache.max_entries = 2
+    cache.store(["a", "b", "c"], [[0.0] * 384] * 3)
+    cache.lookup(["a", "c"])
+
+    assert cache.evict() == 1
+    remaining = vector_db.conn.execute(
+        "SELECT text_hash FROM embedding_cache ORDER BY text_hash"
+    ).fetchall()
+    assert remaining == [("a",), ("c",)]
+
+
+def test_embedding_cache_orders_uses_within_a_transaction(vector_db) -> None:
+    cache = vector_db.embedding_cache
+    cache.max_entries = 2
+    with vector_db.transaction():
+        cache.store(["a", "b", "c", "d"], [[0.0] * 384] * 4)
+        cache.lookup(["a", "b"])
+        last_used = dict(
+            vector_db.conn.execute(
+                "SELECT text_hash, last_used FROM embedding_cache"
+            ).fetchall()
+        )
+        assert last_used["a"] == last_used["b"] > last_used["c"] == last_used["d"]
+        assert cache.evict() == 2
+
+    remaining = vector_db.conn.execute(
+        "SELECT text_hash FROM embedding_cache ORDER BY text_hash"
+    ).fetchall()
+    assert remaining == [("a",), ("b",)]
+
+
+def test_lexical_index_follows_chunk_changes(vector_db) -> None:
+    documents = _documents(3) + [
+        LlamaDocument(
+            text="Call get_text_embedding_batch to embed many texts.",
+            metadata={"file_path": "docs/api.md"},
+        )
+    ]
+    vector_db.process_documents(documents)
+    vector_db.create_embeddings()
+
+    matches = vector_db.lexical_index.search("get_text_embedding_batch")
+    assert len(matches) == 1
+
+    documents[-1] = LlamaDocument(
+        text="This page moved.", metadata={"file_path": "docs/api.md"}
+    )
+    vector_db.process_documents(documents)
+    assert vector_db.lexical_index.search("get_text_embedding_batch") == []
+    assert len(vector_db.lexical_index.search("moved")) == 1
+
+
+def test_hybrid_query_surfaces_exact_identifier_matches(vector_db) -> None:
+    documents = _documents(20) + [
+        LlamaDocument(
+            text="The --store-files flag enables persistent_storage mode.",
+            metadata={"file_path": "docs/flags.md"},
+        )
+    ]
+    vector_db.process_documents_memory(documents)
+    vector_db.create_embeddings_memory()
+
+    results = vector_db.hybrid_query("persistent_storage", top_k=3, candidate_k=5)
+
+    assert results[0]["file"] == "docs/flags.md"
+    assert [r["score"] for r in results] == sorted(
+        (r["score"] for r in results), reverse=True
+    )
+
+
+def test_foreign_keys_are_dropped_from_older_databases(
+    monkeypatch, fake_embedding, tmp_path
+) -> None:
+    import duckdb
+
+    from refassist.ml.vectordb import VectorDB
+
+    conn = duckdb.connect(str(tmp_path / "old.db"))
+    conn.execute("""
+        CREATE TABLE documents (id INT PRIMARY KEY, file TEXT, text TEXT,
+            content_hash TEXT UNIQUE, last_modified TIMESTAMP);
+        CREATE TABLE chunks (id INT PRIMARY KEY, doc_id INT, chunk_text TEXT,
+            chunk_index INT, FOREIGN KEY(doc_id) REFERENCES documents(id));
+        CREATE TABLE embeddings (chunk_id INT, embedding FLOAT[384],
+            FOREIGN KEY (chunk_id) REFERENCES chunks(id));
+        INSERT INTO documents VALUES (1, 'docs/a.md', 'Old text.', 'hash', NULL);
+        INSERT INTO chunks VALUES (1, 1, 'Old text.', 0);
+        INSERT INTO embeddings SELECT 1, list_transform(range(384), i -> 0.0);""")
+    conn.close()
+
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+    db = VectorDB(str(tmp_path / "old.db"))
+    db.connect()
+    try:
+        assert db.conn.execute(
+            "SELECT COUNT(*) FROM duckdb_constraints() "
+            "WHERE constraint_type = 'FOREIGN KEY'"
+        ).fetchone() == (0,)
+        assert db.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone() == (1,)
+
+        # Replacing the document in one transaction is now possible
+        with db.transaction():
+            db.remove_files(["docs/a.md"])
+        assert db.conn.execute("SELECT COUNT(*) FROM chunks").fetchone() == (0,)
+    finally:
+        db.close()
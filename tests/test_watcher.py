@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from refassist.ml.rag import RAGService
+from refassist.ml.vectordb import VectorDB
+from refassist.watcher import DocsWatcher
+
+
+@pytest.fixture
+def rag_service(monkeypatch, tmp_path, fake_embedding):
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+    service = RAGService(str(tmp_path / "watch.db"))
+    service.vector_db.connect()
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def docs_dir(tmp_path):
+    root = tmp_path / "docs"
+    root.mkdir()
+    for i in range(3):
+        (root / f"page_{i}.md").write_text(f"# Page {i}\n\nDetails for page {i}.")
+    return root
+
+
+def _chunks(service: RAGService, path) -> list:
+    return service.vector_db.conn.execute(
+        "SELECT c.chunk_text FROM chunks c JOIN documents d ON d.id = c.doc_id "
+        "WHERE d.file = ?",
+        [str(path)],
+    ).fetchall()
+
+
+def test_watcher_reindexes_a_burst_of_changes_once(rag_service, docs_dir) -> None:
+    rag_service.sync(str(docs_dir))
+
+    with DocsWatcher(rag_service, str(docs_dir), interval=0.05, debounce=0.2) as watcher:
+        for i in range(3):
+            (docs_dir / "page_1.md").write_text(f"# Page 1\n\nRevision {i} of the page.")
+            time.sleep(0.05)
+        (docs_dir / "page_2.md").unlink()
+
+        deadline = time.monotonic() + 10
+        while watcher.generation == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        # Queries on the main connection keep working while the watcher runs
+        assert rag_service.query("Details for page 0", top_k=1)
+
+    assert watcher.generation == 1
+    assert _chunks(rag_service, docs_dir / "page_1.md") == [
+        ("# Page 1\n\nRevision 2 of the page.",)
+    ]
+    assert _chunks(rag_service, docs_dir / "page_2.md") == []
+
+
+def test_failed_sync_leaves_the_old_document_in_place(
+    rag_service, docs_dir, monkeypatch
+) -> None:
+    rag_service.sync(str(docs_dir))
+    (docs_dir / "page_0.md").write_text("# Page 0\n\nRewritten.")
+
+    def fail(chunks):
+        raise RuntimeError("embedding failed")
+
+    monkeypatch.setattr(rag_service.vector_db, "_embed_chunks", fail)
+    with pytest.raises(RuntimeError):
+        rag_service.sync(str(docs_dir))
+
+    assert _chunks(rag_service, docs_dir / "page_0.md") == [
+        ("# Page 0\n\nDetails for page 0.",)
+    ]
+    conn = rag_service.vector_db.conn
+    assert conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] == 3
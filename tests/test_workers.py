@@ -0,0 +1,47 @@
+from llama_index.core import Document as LlamaDocument
+
+from refassist.ml.vectordb import VectorDB
+from refassist.ml.workers import IngestPool
+
+
+def _documents(count: int) -> list:
+    return [
+        LlamaDocument(
+            text=" ".join(
+                f"Section {j} of document {i} covers flag_{j}." for j in range(400)
+            ),
+            metadata={"file_path": f"docs/doc_{i}.md"},
+        )
+        for i in range(count)
+    ]
+
+
+def _ingest(db: VectorDB) -> list:
+    db.connect(in_memory=True)
+    db.process_documents_memory(_documents(6))
+    db.create_embeddings_memory()
+    rows = db.conn.execute("""
+        SELECT d.file, c.chunk_index, c.chunk_text, e.embedding
+        FROM chunks c
+        JOIN documents d ON d.id = c.doc_id
+        JOIN embeddings e ON e.chunk_id = c.id
+        ORDER BY d.file, c.chunk_index""").fetchall()
+    db.close()
+    return rows
+
+
+def test_worker_pool_matches_in_process_ingest(monkeypatch, fake_embedding) -> None:
+    monkeypatch.setattr(VectorDB, "_setup_embedding_model", lambda self: fake_embedding)
+    expected = _ingest(VectorDB(None, embed_batch_size=4))
+
+    # Workers build their own copy of the fake from its class
+    with IngestPool(
+        chunk_workers=2,
+        embed_workers=2,
+        torch_threads=1,
+        model_factory=type(fake_embedding),
+    ) as pool:
+        actual = _ingest(VectorDB(None, embed_batch_size=4, ingest_pool=pool))
+
+    assert len(expected) > 6
+    assert actual == expected